@@ -0,0 +1,88 @@
+"""Latency of organisation-filtered retrieval as the shared collection grows.
+
+Fills a throwaway `organisation_embeddings_bench` collection with --chunks chunks for each of up to
+--organisations organisations (FakeOpenAIEmbeddings, no API key), then times the MMR retriever used by
+ChatBot with the containment filter (`cmetadata @> {"id": ...}`, served by ix_cmetadata_gin) against
+PGVector's stock `{"id": {"$eq": ...}}` filter, which compiles to a per-row jsonb_path_match.
+Needs the usual DB* env vars and the migrations applied.
+
+    python -m benchmarks.bench_org_filter_retrieval --scales 1000 10000 100000 --chunks 5
+"""
+import time
+import argparse
+import statistics
+from typing import List
+from langchain_postgres import PGVector
+from benchmarks.fake_models import FakeOpenAIEmbeddings
+from src.database.connection_pool import get_engine
+from src.database.organisation_vector_database import OrganisationPGVector, _batches, chunk_id, organisation_filter
+
+COLLECTION_NAME = "organisation_embeddings_bench"
+
+
+def populate(vector_db: PGVector, embeddings: FakeOpenAIEmbeddings, start: int, stop: int, chunks: int) -> None:
+    rows = [
+        (organisation_id, f"Organisation {organisation_id} fact {index}: opening hours, services and contact details.")
+        for organisation_id in range(start, stop)
+        for index in range(chunks)
+    ]
+    for batch in _batches(rows, 1000):
+        texts = [text for _, text in batch]
+        vector_db.add_embeddings(
+            texts=texts,
+            embeddings=embeddings.embed_documents(texts),
+            metadatas=[{"id": str(organisation_id)} for organisation_id, _ in batch],
+            ids=[chunk_id(str(organisation_id), text) for organisation_id, text in batch],
+        )
+
+
+def time_retrieval(vector_db: PGVector, organisations: int, filter_for, iterations: int) -> List[float]:
+    timings = []
+    for index in range(iterations):
+        organisation_id = (index * 7919) % organisations
+        retriever = vector_db.as_retriever(search_type="mmr", search_kwargs={"filter": filter_for(organisation_id)})
+        started = time.perf_counter()
+        retriever.invoke("What are your opening hours?")
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--chunks", type=int, default=5, help="Chunks per organisation")
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="Keep the bench collection after the run")
+    args = parser.parse_args()
+
+    embeddings = FakeOpenAIEmbeddings(dimensions=args.dimension)
+    vector_db = OrganisationPGVector(
+                    embeddings=embeddings,
+                    collection_name=COLLECTION_NAME,
+                    connection=get_engine(),
+                    use_jsonb=True,
+                    create_extension=True,
+                    pre_delete_collection=True,
+                )
+
+    populated = 0
+    for organisations in sorted(args.scales):
+        started = time.perf_counter()
+        populate(vector_db, embeddings, populated, organisations, args.chunks)
+        populated = organisations
+        print(f"{organisations} organisations ({organisations * args.chunks} chunks) ready in {time.perf_counter() - started:.1f}s")
+
+        containment = time_retrieval(vector_db, organisations, organisation_filter, args.iterations)
+        path_match = time_retrieval(
+            vector_db, organisations, lambda organisation_id: {"id": {"$eq": str(organisation_id)}}, args.iterations
+        )
+        for label, timings in (("containment", containment), ("path_match", path_match)):
+            print(f"  {label:<12} median={statistics.median(timings):9.3f}ms  max={max(timings):9.3f}ms")
+
+    if not args.keep:
+        vector_db.delete_collection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Per-request construction overhead: building ChatBot / CreateDataEmbedding for every request versus reusing
+the process-wide instances created in the FastAPI lifespan.
+
+No network calls are made unless --with-db is given, in which case the PGVector setup
+(CREATE EXTENSION / collection lookup) is included against the configured Postgres.
+
+    python -m benchmarks.bench_per_request_overhead --iterations 200
+    python -m benchmarks.bench_per_request_overhead --iterations 50 --with-db
+"""
+import os
+import time
+import argparse
+import statistics
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("OPENAI_MODEL_NAME", "gpt-4o-mini")
+
+from src.rag_folder.question_answer import ChatBot
+from src.organisation_embedding_creation.embedding_generation import CreateDataEmbedding
+
+
+def per_request(with_db: bool) -> None:
+    chatbot = ChatBot()
+    embedding_creator = CreateDataEmbedding()
+    if with_db:
+        chatbot.vector_store.get_or_create_collection()
+        embedding_creator.vector_store.get_or_create_collection()
+
+
+def reused(chatbot: ChatBot, embedding_creator: CreateDataEmbedding, with_db: bool) -> None:
+    if with_db:
+        chatbot.vector_store.get_or_create_collection()
+        embedding_creator.vector_store.get_or_create_collection()
+
+
+def measure(fn, iterations: int) -> list:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(label: str, timings: list) -> None:
+    print(f"{label:<12} mean={statistics.mean(timings):8.3f}ms  p95={sorted(timings)[int(len(timings) * 0.95) - 1]:8.3f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--with-db", action="store_true")
+    args = parser.parse_args()
+
+    before = measure(lambda: per_request(args.with_db), args.iterations)
+
+    chatbot = ChatBot()
+    embedding_creator = CreateDataEmbedding()
+    after = measure(lambda: reused(chatbot, embedding_creator, args.with_db), args.iterations)
+
+    report("before", before)
+    report("after", after)
+
+
+if __name__ == "__main__":
+    main()
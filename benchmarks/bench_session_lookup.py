@@ -0,0 +1,84 @@
+"""Latency of the message_store session lookup: the old `session_id::TEXT LIKE '%uuid%'` scan versus the
+indexed equality lookup used by OrganiationHistoryManager.check_organisation_in_session.
+
+Builds a throwaway `message_store_bench` table with the message_store schema and --rows rows spread over
+--sessions sessions, then times both queries. Needs the usual DB* env vars.
+
+    python -m benchmarks.bench_session_lookup --rows 3000000 --sessions 20000
+"""
+import time
+import uuid
+import argparse
+import statistics
+import psycopg
+from src.database.connection_pool import CONNINFO
+
+LIKE_QUERY = "SELECT EXISTS (SELECT 1 FROM message_store_bench WHERE session_id::TEXT LIKE %s)"
+EQUALITY_QUERY = "SELECT EXISTS (SELECT 1 FROM message_store_bench WHERE session_id = %s)"
+
+
+def session_uuid(organisation_id: int) -> uuid.UUID:
+    return uuid.UUID(str(organisation_id).ljust(32, '0'))
+
+
+def build_table(conn: psycopg.Connection, rows: int, sessions: int) -> None:
+    conn.execute("DROP TABLE IF EXISTS message_store_bench")
+    conn.execute(
+        """
+        CREATE TABLE message_store_bench (
+            id SERIAL PRIMARY KEY,
+            session_id UUID NOT NULL,
+            message JSONB NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO message_store_bench (session_id, message)
+        SELECT rpad(((i %% %s) + 1)::TEXT, 32, '0')::UUID,
+               jsonb_build_object('type', 'human', 'data', jsonb_build_object('content', 'message ' || i))
+        FROM generate_series(1, %s) AS i
+        """,
+        (sessions, rows),
+    )
+    conn.execute("CREATE INDEX idx_message_store_bench_session_id ON message_store_bench (session_id)")
+    conn.execute("ANALYZE message_store_bench")
+
+
+def time_query(conn: psycopg.Connection, query: str, params_for, iterations: int, sessions: int) -> list:
+    timings = []
+    for index in range(iterations):
+        # Alternate between present and missing sessions, the missing case is the worst one for LIKE.
+        organisation_id = (index % sessions) + 1 if index % 2 == 0 else sessions + index + 1
+        started = time.perf_counter()
+        conn.execute(query, params_for(session_uuid(organisation_id))).fetchone()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=3000000)
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--keep", action="store_true", help="Keep message_store_bench after the run")
+    args = parser.parse_args()
+
+    with psycopg.connect(CONNINFO, autocommit=True) as conn:
+        started = time.perf_counter()
+        build_table(conn, args.rows, args.sessions)
+        print(f"built {args.rows} rows over {args.sessions} sessions in {time.perf_counter() - started:.1f}s")
+
+        like = time_query(conn, LIKE_QUERY, lambda session: (f"%{session}%",), args.iterations, args.sessions)
+        equality = time_query(conn, EQUALITY_QUERY, lambda session: (session,), args.iterations, args.sessions)
+
+        for label, timings in (("LIKE scan", like), ("equality", equality)):
+            print(f"{label:<10} median={statistics.median(timings):9.3f}ms  max={max(timings):9.3f}ms")
+
+        if not args.keep:
+            conn.execute("DROP TABLE message_store_bench")
+
+
+if __name__ == "__main__":
+    main()
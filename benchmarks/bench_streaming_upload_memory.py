@@ -0,0 +1,100 @@
+"""Peak RSS of turning a large organisation payload into chunks: the upload_file path versus the streaming
+upload pipeline of src.organisation_ingestion.streaming_ingestion.
+
+Each mode runs in its own subprocess so ru_maxrss only covers that mode. Embedding and the database are
+left out; both paths hand the same kind of chunks to the vector store.
+
+    python -m benchmarks.bench_streaming_upload_memory --size-mb 200
+"""
+import sys
+import json
+import asyncio
+import resource
+import argparse
+import subprocess
+from typing import AsyncIterator, Iterator
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from src.organisation_embedding_creation.embedding_generation import CHUNK_OVERLAP, CHUNK_SIZE, CreateDataEmbedding
+from src.organisation_ingestion.streaming_ingestion import STREAM_WINDOW, aiter_clean_lines, aiter_doc_batches, aiter_lines
+
+READ_SIZE = 64 * 1024
+LINE = "Service {index}: opening hours are 9am to 5pm, call us or visit the front desk for bookings and prices.\n"
+
+
+def payload_parts(size_mb: int) -> Iterator[str]:
+    written, index = 0, 0
+    while written < size_mb * 1024 * 1024:
+        line = LINE.format(index=index)
+        written += len(line)
+        index += 1
+        yield line
+
+
+def text_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=len,
+        is_separator_regex=False,
+    )
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_legacy(size_mb: int) -> int:
+    # What upload_file does: the whole body, the parsed dict, its json.dumps, then split/clean/join.
+    body = json.dumps({"description": "".join(payload_parts(size_mb))}).encode("utf-8")
+    organisation_data = json.loads(body)
+    creator = object.__new__(CreateDataEmbedding)
+    creator.text_splitter = text_splitter()
+    return len(creator._get_docs_split(json.dumps(organisation_data)))
+
+
+async def body_chunks(size_mb: int) -> AsyncIterator[bytes]:
+    buffer = []
+    buffered = 0
+    for part in payload_parts(size_mb):
+        buffer.append(part)
+        buffered += len(part)
+        if buffered >= READ_SIZE:
+            yield "".join(buffer).encode("utf-8")
+            buffer, buffered = [], 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+async def run_streaming(size_mb: int) -> int:
+    lines = aiter_clean_lines(aiter_lines(body_chunks(size_mb), STREAM_WINDOW))
+    chunks = 0
+    async for batch in aiter_doc_batches(lines, text_splitter(), STREAM_WINDOW):
+        chunks += len(batch)
+    return chunks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=200)
+    parser.add_argument("--mode", choices=["legacy", "streaming"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        baseline = peak_rss_mb()
+        chunks = run_legacy(args.size_mb) if args.mode == "legacy" else asyncio.run(run_streaming(args.size_mb))
+        print(json.dumps({"mode": args.mode, "chunks": chunks, "baseline_mb": round(baseline, 1), "peak_rss_mb": round(peak_rss_mb(), 1)}))
+        return
+
+    print(f"payload {args.size_mb}MB, chunk_size={CHUNK_SIZE}, window={STREAM_WINDOW} chars")
+    for mode in ("legacy", "streaming"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_streaming_upload_memory", "--size-mb", str(args.size_mb), "--mode", mode],
+            check=True, capture_output=True, text=True,
+        ).stdout.strip().splitlines()[-1]
+        result = json.loads(output)
+        print(f"{mode:<10} chunks={result['chunks']:<8} baseline={result['baseline_mb']:7.1f}MB  peak_rss={result['peak_rss_mb']:7.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
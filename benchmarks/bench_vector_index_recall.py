@@ -0,0 +1,103 @@
+"""Recall versus latency of the ANN index configured in src.database.vector_index.
+
+Builds a throwaway `vector_index_bench` table with --rows random vectors of --dimension, computes the exact
+top-k of --queries random query vectors with index scans disabled, then builds the configured index
+(VECTOR_INDEX_TYPE, HNSW_M / HNSW_EF_CONSTRUCTION or IVFFLAT_LISTS) and reports recall@k and latency for
+every ef_search (hnsw) or probes (ivfflat) value given. Needs the usual DB* env vars.
+
+    python -m benchmarks.bench_vector_index_recall --rows 100000 --search-values 20 40 100 200
+    VECTOR_INDEX_TYPE=ivfflat IVFFLAT_LISTS=300 python -m benchmarks.bench_vector_index_recall --search-values 1 10 30
+"""
+import time
+import argparse
+import statistics
+from typing import List, Tuple
+import psycopg
+from src.database.connection_pool import CONNINFO
+from src.database import vector_index
+
+NEAREST_QUERY = "SELECT id FROM vector_index_bench ORDER BY embedding <=> %s::vector LIMIT %s"
+
+
+def build_table(conn: psycopg.Connection, rows: int, dimension: int) -> None:
+    conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    conn.execute("DROP TABLE IF EXISTS vector_index_bench")
+    conn.execute(f"CREATE TABLE vector_index_bench (id INTEGER PRIMARY KEY, embedding vector({dimension}) NOT NULL)")
+    conn.execute(
+        """
+        INSERT INTO vector_index_bench (id, embedding)
+        SELECT i, (SELECT array_agg(random() - 0.5 + i * 0) FROM generate_series(1, %s))::vector
+        FROM generate_series(1, %s) AS i
+        """,
+        (dimension, rows),
+    )
+    conn.execute("ANALYZE vector_index_bench")
+
+
+def random_queries(conn: psycopg.Connection, count: int, dimension: int) -> List[str]:
+    cursor = conn.execute(
+        """
+        SELECT (SELECT array_agg(random() - 0.5 + q * 0) FROM generate_series(1, %s))::vector::TEXT
+        FROM generate_series(1, %s) AS q
+        """,
+        (dimension, count),
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def nearest(conn: psycopg.Connection, queries: List[str], k: int) -> Tuple[List[set], List[float]]:
+    results, timings = [], []
+    for query in queries:
+        started = time.perf_counter()
+        rows = conn.execute(NEAREST_QUERY, (query, k)).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+        results.append({row[0] for row in rows})
+    return results, timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dimension", type=int, default=vector_index.DIMENSION)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=20, help="Matches the MMR fetch_k used by the retriever")
+    parser.add_argument("--search-values", type=int, nargs="+", default=[20, 40, 100, 200])
+    parser.add_argument("--keep", action="store_true", help="Keep vector_index_bench after the run")
+    args = parser.parse_args()
+
+    setting = "hnsw.ef_search" if vector_index.VECTOR_INDEX_TYPE == "hnsw" else "ivfflat.probes"
+    options = ", ".join(f"{name} = {value}" for name, value in vector_index.index_options().items())
+
+    with psycopg.connect(CONNINFO, autocommit=True) as conn:
+        started = time.perf_counter()
+        build_table(conn, args.rows, args.dimension)
+        print(f"built {args.rows} vectors of dimension {args.dimension} in {time.perf_counter() - started:.1f}s")
+        queries = random_queries(conn, args.queries, args.dimension)
+
+        conn.execute("SET enable_indexscan = off")
+        exact, exact_timings = nearest(conn, queries, args.k)
+        conn.execute("RESET enable_indexscan")
+        print(f"exact scan       recall=1.000  median={statistics.median(exact_timings):9.3f}ms")
+
+        started = time.perf_counter()
+        conn.execute(
+            f"CREATE INDEX ON vector_index_bench USING {vector_index.VECTOR_INDEX_TYPE} "
+            f"(embedding vector_cosine_ops) WITH ({options})"
+        )
+        print(f"{vector_index.VECTOR_INDEX_TYPE} ({options}) built in {time.perf_counter() - started:.1f}s")
+
+        for value in args.search_values:
+            conn.execute("SELECT set_config(%s, %s, false)", (setting, str(value)))
+            approximate, timings = nearest(conn, queries, args.k)
+            recall = statistics.mean(len(found & truth) / args.k for found, truth in zip(approximate, exact))
+            print(
+                f"{setting}={value:<5} recall={recall:.3f}  median={statistics.median(timings):9.3f}ms  "
+                f"p95={sorted(timings)[int(len(timings) * 0.95) - 1]:9.3f}ms"
+            )
+
+        if not args.keep:
+            conn.execute("DROP TABLE vector_index_bench")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Requests per second of /api/organisation_chatbot/ with 1 to N gunicorn workers.
+
+Starts ``gunicorn benchmarks.fake_app:app -c gunicorn.conf.py`` once per worker count against the
+pgvector Postgres configured through the usual DB* env vars, drives it over HTTP for a fixed
+duration and reports throughput, latency and the speedup over a single worker. Run it on a
+multi-core machine; the LLM is faked, so the numbers measure the API's own CPU and I/O cost.
+
+    python -m benchmarks.bench_worker_scaling --workers 1 2 4 8 --concurrency 64 --duration 20
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import subprocess
+import multiprocessing
+from typing import Any, Dict, List, Optional
+import httpx
+from benchmarks.harness import QUESTIONS, organisation_corpus, summarise, wait_for_embeddings
+
+
+def start_server(workers: int, port: int, args: argparse.Namespace) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(workers),
+        "BIND": f"127.0.0.1:{port}",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_TOKEN_RATE": str(args.token_rate),
+    }
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "benchmarks.fake_app:app", "-c", "gunicorn.conf.py"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL if not args.verbose else None,
+    )
+
+
+async def wait_until_ready(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float = 120) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {server.returncode}")
+        try:
+            if (await client.get("/api/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise TimeoutError("gunicorn did not start in time")
+
+
+async def seed_organisation(client: httpx.AsyncClient, corpus_chunks: int) -> int:
+    response = await client.post(
+        "/api/organisation_database/",
+        json={"organisation_data": organisation_corpus(0, corpus_chunks, 1000)},
+    )
+    response.raise_for_status()
+    organisation_id = response.json()["organisation_id"]
+    await wait_for_embeddings(client, organisation_id, timeout=300)
+    return organisation_id
+
+
+async def drive(client: httpx.AsyncClient, organisation_id: int, concurrency: int, duration: float) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def user(index: int) -> None:
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.post(
+                "/api/organisation_chatbot/",
+                params={"organisation_id": organisation_id},
+                json={"user_query": QUESTIONS[index % len(QUESTIONS)]},
+            )
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(index) for index in range(concurrency)))
+    summary = summarise(latencies, time.perf_counter() - started)
+    summary["errors"] = errors
+    return summary
+
+
+async def bench(workers: int, organisation_id: Optional[int], args: argparse.Namespace) -> Dict[str, Any]:
+    server = start_server(workers, args.port, args)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None, limits=limits) as client:
+            await wait_until_ready(client, server)
+            if organisation_id is None:
+                organisation_id = await seed_organisation(client, args.corpus_chunks)
+            await drive(client, organisation_id, args.concurrency, args.warmup)
+            result = await drive(client, organisation_id, args.concurrency, args.duration)
+            result["organisation_id"] = organisation_id
+            return result
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+
+async def run(args: argparse.Namespace) -> None:
+    print(f"cpus={multiprocessing.cpu_count()} concurrency={args.concurrency} duration={args.duration}s llm_latency={args.llm_latency}s")
+    print(f"{'workers':>8} {'rps':>9} {'speedup':>8} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'errors':>7}")
+    organisation_id = args.organisation_id
+    baseline_rps = None
+    for workers in args.workers:
+        result = await bench(workers, organisation_id, args)
+        organisation_id = result["organisation_id"]
+        baseline_rps = baseline_rps or result["rps"]
+        speedup = result["rps"] / baseline_rps if baseline_rps else 0.0
+        print(
+            f"{workers:>8} {result['rps']:>9.1f} {speedup:>7.2f}x {result['p50_ms']:>8.1f} "
+            f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>7}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, multiprocessing.cpu_count()])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds per worker count")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds before each measurement")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--token-rate", type=float, default=0.0)
+    parser.add_argument("--corpus-chunks", type=int, default=50)
+    parser.add_argument("--organisation-id", type=int, help="Reuse an already embedded organisation")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--verbose", action="store_true", help="Show gunicorn logs")
+    args = parser.parse_args()
+    args.workers = sorted(set(args.workers))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
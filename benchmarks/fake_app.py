@@ -0,0 +1,24 @@
+"""chat_model_api.app with OpenAI replaced by the fakes, for benchmarks that start real server processes.
+
+    gunicorn benchmarks.fake_app:app -c gunicorn.conf.py
+
+FAKE_LLM_LATENCY, FAKE_TOKEN_RATE and FAKE_EMBEDDING_LATENCY configure the fakes.
+"""
+import os
+
+# Fake vectors must never land in the shared embedding_cache table.
+os.environ["EMBEDDING_CACHE_BACKEND"] = "memory"
+# Every request must reach the LLM, otherwise the benchmark measures the answer cache.
+os.environ["ANSWER_CACHE_ENABLED"] = "false"
+# Concurrent identical questions would otherwise share one computation (see tests/test_request_coalescing.py).
+os.environ["REQUEST_COALESCING_ENABLED"] = "false"
+
+from benchmarks.fake_models import install_fakes
+
+install_fakes(
+    float(os.getenv("FAKE_LLM_LATENCY", 0.05)),
+    float(os.getenv("FAKE_TOKEN_RATE", 0)),
+    float(os.getenv("FAKE_EMBEDDING_LATENCY", 0)),
+)
+
+from chat_model_api import app  # noqa: E402
@@ -0,0 +1,154 @@
+import json
+import time
+import random
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, List, Optional
+from langchain_core.embeddings import Embeddings
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.language_models.chat_models import BaseChatModel
+
+
+class FakeChatOpenAI(BaseChatModel):
+    """Deterministic stand-in for ChatOpenAI that answers in the JSON mode format.
+
+    A call takes ``latency`` seconds before the first token, then emits the answer at ``token_rate``
+    tokens per second (0 means instantly). Tokens are approximated as 4 characters, and usage is
+    reported in ``usage_metadata`` like the real client does. ``calls`` counts the model calls.
+    """
+
+    latency: float = 0.5
+    token_rate: float = 0.0
+    answer: str = "This is a stubbed answer."
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-openai"
+
+    def _pieces(self) -> List[str]:
+        content = json.dumps({"answer": self.answer})
+        return [content[index:index + 4] for index in range(0, len(content), 4)]
+
+    def _usage(self, messages: List[Any]) -> dict:
+        input_tokens = sum(len(str(message.content)) for message in messages) // 4
+        output_tokens = len(self._pieces())
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _generation_time(self) -> float:
+        return self.latency + (len(self._pieces()) / self.token_rate if self.token_rate else 0.0)
+
+    def _result(self, messages: List[Any]) -> ChatResult:
+        message = AIMessage(
+            content="".join(self._pieces()),
+            usage_metadata=self._usage(messages),
+            response_metadata={"model_name": self._llm_type},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        time.sleep(self._generation_time())
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        await asyncio.sleep(self._generation_time())
+        return self._result(messages)
+
+    async def _astream(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        for piece in self._pieces():
+            if self.token_rate:
+                await asyncio.sleep(1 / self.token_rate)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="",
+            usage_metadata=self._usage(messages),
+            response_metadata={"model_name": self._llm_type},
+        ))
+
+
+class FakeOpenAIEmbeddings(Embeddings):
+    """Hash-based embeddings of a fixed dimension, so the same text always maps to the same vector."""
+
+    def __init__(self, dimensions: int = 768, latency: float = 0.0, **kwargs: Any) -> None:
+        self.dimensions = dimensions
+        self.latency = latency
+
+    def _embed(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        rng = random.Random(seed)
+        vector = [rng.gauss(0.0, 1.0) for _ in range(self.dimensions)]
+        norm = sum(value * value for value in vector) ** 0.5 or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency)
+        return self._embed(text)
+
+
+class InMemoryHistoryManager:
+    """Database-free stand-in for (Async)OrganiationHistoryManager: every session already exists."""
+
+    def check_organisation_in_session(self, organisation_id: str) -> bool:
+        return True
+
+
+class AsyncInMemoryHistoryManager:
+    async def check_organisation_in_session(self, organisation_id: str) -> bool:
+        return True
+
+
+class InMemoryChatHistory:
+    """Database-free stand-in for (Async)ChatHistory, one in-memory history per organisation."""
+
+    histories: dict = {}
+
+    def __init__(self, organisation_id: str) -> None:
+        self.organisation_id = organisation_id
+
+    def _history(self) -> InMemoryChatMessageHistory:
+        return self.histories.setdefault(self.organisation_id, InMemoryChatMessageHistory())
+
+    def get_messages(self) -> List[Any]:
+        return list(self._history().messages)
+
+    def add_messages(self, messages: List[Any]) -> None:
+        self._history().add_messages(messages)
+
+
+class AsyncInMemoryChatHistory(InMemoryChatHistory):
+    async def aget_messages(self) -> List[Any]:
+        return self.get_messages()
+
+    async def aadd_messages(self, messages: List[Any]) -> None:
+        self.add_messages(messages)
+
+
+def install_fakes(llm_latency: float, token_rate: float = 0.0, embedding_latency: float = 0.0) -> None:
+    """Replace the OpenAI clients used by the chatbot and the ingestion path with the fakes above.
+
+    Must run before chat_model_api builds its ChatBot / CreateDataEmbedding in the lifespan.
+    """
+    import src.rag_folder.question_answer as question_answer
+    import src.organisation_embedding_creation.embedding_generation as embedding_generation
+
+    question_answer.ChatOpenAI = lambda **kwargs: FakeChatOpenAI(latency=llm_latency, token_rate=token_rate)
+    question_answer.OpenAIEmbeddings = lambda **kwargs: FakeOpenAIEmbeddings(dimensions=question_answer.DIMENSION, latency=embedding_latency)
+    embedding_generation.OpenAIEmbeddings = lambda **kwargs: FakeOpenAIEmbeddings(dimensions=embedding_generation.DIMENSION, latency=embedding_latency)
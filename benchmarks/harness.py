@@ -0,0 +1,263 @@
+"""End-to-end benchmark of chat_model_api.app with OpenAI stubbed out.
+
+Drives the real FastAPI app in-process (lifespan, pools, ingestion queue, PGVector) against the
+pgvector Postgres configured through the usual DB* env vars. ChatOpenAI and OpenAIEmbeddings are
+replaced by the deterministic fakes in benchmarks.fake_models, so results only move when the code does.
+
+Scenarios:
+    ingest        POST /api/organisation_database/ and poll until the embeddings are Completed
+    chat          POST /api/organisation_chatbot/
+    chat_stream   POST /api/organisation_chatbot/stream/ (also reports time to first token)
+
+    python -m benchmarks.harness --scenario all --concurrency 20 --requests 200 --organisations 10 --corpus-chunks 50
+    python -m benchmarks.harness --scenario all --save-baseline benchmarks/baseline.json
+    python -m benchmarks.harness --scenario all --baseline benchmarks/baseline.json --tolerance 0.15
+
+With --baseline the process exits with status 1 when a scenario's p95 latency is more than
+``tolerance`` above the baseline or its throughput more than ``tolerance`` below it.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from typing import Any, Dict, List, Optional
+import httpx
+
+# Fake vectors must never land in the shared embedding_cache table.
+os.environ["EMBEDDING_CACHE_BACKEND"] = "memory"
+# Every scenario must reach the LLM; cached answers would hide regressions on the full path.
+os.environ["ANSWER_CACHE_ENABLED"] = "false"
+# Concurrent identical questions would otherwise share one computation (see tests/test_request_coalescing.py).
+os.environ["REQUEST_COALESCING_ENABLED"] = "false"
+
+from benchmarks.fake_models import install_fakes
+
+SCENARIOS = ["ingest", "chat", "chat_stream"]
+QUESTIONS = [
+    "What are your opening hours?",
+    "Where is the office located?",
+    "Which services do you offer?",
+    "How can I contact support?",
+    "Do you offer refunds?",
+]
+WORDS = (
+    "account billing booking branch contact customer delivery discount email hours invoice manager "
+    "office opening order parking payment phone plan policy price refund request schedule service "
+    "shipping staff store subscription support team ticket warranty weekend"
+).split()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarise(latencies: List[float], elapsed: float, extra: Optional[Dict[str, List[float]]] = None) -> Dict[str, Any]:
+    """p50/p95/p99 in milliseconds plus requests per second for one scenario."""
+    summary = {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+    }
+    for name, values in (extra or {}).items():
+        summary[f"{name}_p50_ms"] = round(percentile(values, 0.50) * 1000, 1)
+        summary[f"{name}_p95_ms"] = round(percentile(values, 0.95) * 1000, 1)
+    return summary
+
+
+def organisation_corpus(index: int, corpus_chunks: int, chunk_size: int) -> Dict[str, Any]:
+    """Deterministic organisation payload that splits into roughly ``corpus_chunks`` chunks."""
+    rng = random.Random(index)
+    sections = []
+    for _ in range(corpus_chunks):
+        words, length = [], 0
+        while length < chunk_size * 0.8:
+            word = rng.choice(WORDS)
+            words.append(word)
+            length += len(word) + 1
+        sections.append(" ".join(words))
+    return {
+        "name": f"Benchmark Org {index}",
+        "opening_hours": "9am to 5pm, Monday to Friday",
+        "sections": sections,
+    }
+
+
+async def wait_for_embeddings(client: httpx.AsyncClient, organisation_id: int, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        response = await client.get("/api/organisation_database/status/", params={"organisation_id": organisation_id})
+        response.raise_for_status()
+        status = response.json()["status"]
+        if status == "Completed":
+            return
+        if status == "Failed":
+            raise RuntimeError(f"Embedding organisation {organisation_id} failed: {response.json()['message']}")
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"Embedding organisation {organisation_id} did not complete in {timeout}s")
+
+
+async def run_concurrently(count: int, concurrency: int, task) -> Dict[str, Any]:
+    """Run ``task(i)`` ``count`` times with at most ``concurrency`` in flight and time each call."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    extra: Dict[str, List[float]] = {}
+
+    async def one(index: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            measured = await task(index)
+            latencies.append(time.perf_counter() - started)
+            for name, value in (measured or {}).items():
+                extra.setdefault(name, []).append(value)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(count)))
+    return summarise(latencies, time.perf_counter() - started, extra)
+
+
+async def bench_ingest(client: httpx.AsyncClient, args: argparse.Namespace, chunk_size: int) -> Dict[str, Any]:
+    organisation_ids: List[int] = []
+
+    async def ingest(index: int) -> None:
+        response = await client.post(
+            "/api/organisation_database/",
+            json={"organisation_data": organisation_corpus(index, args.corpus_chunks, chunk_size)},
+        )
+        response.raise_for_status()
+        organisation_id = response.json()["organisation_id"]
+        await wait_for_embeddings(client, organisation_id, args.ingest_timeout)
+        organisation_ids.append(organisation_id)
+
+    summary = await run_concurrently(args.organisations, args.concurrency, ingest)
+    summary["organisation_ids"] = sorted(organisation_ids)
+    return summary
+
+
+async def bench_chat(client: httpx.AsyncClient, args: argparse.Namespace, organisation_ids: List[int]) -> Dict[str, Any]:
+    async def chat(index: int) -> None:
+        response = await client.post(
+            "/api/organisation_chatbot/",
+            params={"organisation_id": organisation_ids[index % len(organisation_ids)]},
+            json={"user_query": QUESTIONS[index % len(QUESTIONS)]},
+        )
+        response.raise_for_status()
+
+    return await run_concurrently(args.requests, args.concurrency, chat)
+
+
+async def bench_chat_stream(client: httpx.AsyncClient, args: argparse.Namespace, organisation_ids: List[int]) -> Dict[str, Any]:
+    async def chat_stream(index: int) -> Dict[str, float]:
+        started = time.perf_counter()
+        first_token = None
+        async with client.stream(
+            "POST",
+            "/api/organisation_chatbot/stream/",
+            params={"organisation_id": organisation_ids[index % len(organisation_ids)]},
+            json={"user_query": QUESTIONS[index % len(QUESTIONS)]},
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if first_token is None and line and json.loads(line).get("type") == "token":
+                    first_token = time.perf_counter() - started
+        return {"ttft": first_token if first_token is not None else time.perf_counter() - started}
+
+    return await run_concurrently(args.requests, args.concurrency, chat_stream)
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from chat_model_api import app
+    from src.organisation_embedding_creation.embedding_generation import CHUNK_SIZE
+
+    scenarios = SCENARIOS if args.scenario == "all" else [args.scenario]
+    results: Dict[str, Any] = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            # The chat scenarios need an embedded corpus, so ingestion always runs; it is only
+            # reported when asked for.
+            ingested = await bench_ingest(client, args, CHUNK_SIZE)
+            organisation_ids = ingested.pop("organisation_ids")
+            if "ingest" in scenarios:
+                results["ingest"] = ingested
+            if "chat" in scenarios:
+                results["chat"] = await bench_chat(client, args, organisation_ids)
+            if "chat_stream" in scenarios:
+                results["chat_stream"] = await bench_chat_stream(client, args, organisation_ids)
+    return results
+
+
+def configuration(args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "organisations": args.organisations,
+        "corpus_chunks": args.corpus_chunks,
+        "llm_latency": args.llm_latency,
+        "token_rate": args.token_rate,
+        "embedding_latency": args.embedding_latency,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of ``results`` against ``baseline``, as human readable lines."""
+    regressions = []
+    for scenario, current in results.items():
+        previous = baseline.get("results", {}).get(scenario)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{scenario}: p95 {current['p95_ms']}ms > baseline {previous['p95_ms']}ms (+{tolerance:.0%})")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{scenario}: {current['rps']} req/s < baseline {previous['rps']} req/s (-{tolerance:.0%})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=SCENARIOS + ["all"], default="all")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200, help="Chat requests per chat scenario")
+    parser.add_argument("--organisations", type=int, default=10, help="Organisations ingested before chatting")
+    parser.add_argument("--corpus-chunks", type=int, default=50, help="Approximate chunks per organisation")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=100.0, help="Tokens per second, 0 for instant")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Seconds per embedding call")
+    parser.add_argument("--ingest-timeout", type=float, default=300.0)
+    parser.add_argument("--baseline", help="Fail on a regression against this baseline JSON")
+    parser.add_argument("--save-baseline", help="Write the results to this baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    install_fakes(args.llm_latency, args.token_rate, args.embedding_latency)
+    results = asyncio.run(run(args))
+    report = {"configuration": configuration(args), "results": results}
+    print(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("configuration") != report["configuration"]:
+            print("warning: baseline was recorded with a different configuration", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Concurrent load test for /api/organisation_chatbot/ against a stubbed LLM.
+
+Needs a reachable pgvector Postgres configured through the usual DB* env vars;
+OpenAI is replaced by FakeChatOpenAI / FakeOpenAIEmbeddings so no API key is used.
+A --concurrency above what the configured pools can serve grows the pools to match,
+so the run measures the chatbot rather than connection pool timeouts.
+
+    python -m benchmarks.load_test_chatbot --requests 200 --concurrency 8 --llm-latency 0.5
+    python -m benchmarks.load_test_chatbot --mode sync   # blocking get_response, as before the async path
+"""
+import os
+import time
+import asyncio
+import argparse
+import statistics
+import httpx
+
+# Fake vectors must never land in the shared embedding_cache table.
+os.environ["EMBEDDING_CACHE_BACKEND"] = "memory"
+# Every request asks the same question; the answer cache would turn the run into a cache benchmark.
+os.environ["ANSWER_CACHE_ENABLED"] = "false"
+# Concurrent identical questions would otherwise share one computation (see tests/test_request_coalescing.py).
+os.environ["REQUEST_COALESCING_ENABLED"] = "false"
+
+from benchmarks.fake_models import install_fakes
+import src.database.connection_pool as connection_pool
+import src.rag_folder.question_answer as question_answer
+from src.organisation_ingestion.ingestion_queue import INGESTION_WORKERS
+
+
+def use_blocking_path() -> None:
+    async def blocking_aget_response(self, data):
+        return self.get_response(data)
+
+    question_answer.ChatBot.aget_response = blocking_aget_response
+
+
+def size_pools(concurrency: int) -> None:
+    # A chat request holds at most one psycopg connection and one SQLAlchemy connection at a time;
+    # the ingestion workers need theirs on top while the organisation is embedded.
+    connection_pool.DB_POOL_MAX_SIZE = max(connection_pool.DB_POOL_MAX_SIZE, concurrency + INGESTION_WORKERS)
+    connection_pool.SQLALCHEMY_MAX_OVERFLOW = max(
+        connection_pool.SQLALCHEMY_MAX_OVERFLOW, concurrency + INGESTION_WORKERS - connection_pool.SQLALCHEMY_POOL_SIZE
+    )
+
+
+async def wait_for_embeddings(client: httpx.AsyncClient, organisation_id: int, timeout: float = 60) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        response = await client.get("/api/organisation_database/status/", params={"organisation_id": organisation_id})
+        status = response.json()["status"]
+        if status == "Completed":
+            return
+        if status == "Failed":
+            raise RuntimeError(f"Embedding organisation {organisation_id} failed: {response.json()['message']}")
+        await asyncio.sleep(0.2)
+    raise TimeoutError(f"Embedding organisation {organisation_id} did not complete in {timeout}s")
+
+
+async def run(args: argparse.Namespace) -> None:
+    from chat_model_api import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+            seeded = await client.post(
+                "/api/organisation_database/",
+                json={"organisation_data": {"name": "Load Test Org", "opening_hours": "9am to 5pm, Monday to Friday"}},
+            )
+            seeded.raise_for_status()
+            organisation_id = seeded.json()["organisation_id"]
+            await wait_for_embeddings(client, organisation_id)
+
+            semaphore = asyncio.Semaphore(args.concurrency)
+            latencies = []
+
+            async def one_request() -> None:
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.post(
+                        "/api/organisation_chatbot/",
+                        params={"organisation_id": organisation_id},
+                        json={"user_query": "What are your opening hours?"},
+                    )
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one_request() for _ in range(args.requests)))
+            elapsed = time.perf_counter() - started
+
+    print(f"mode={args.mode} requests={args.requests} concurrency={args.concurrency} llm_latency={args.llm_latency}s")
+    print(f"elapsed={elapsed:.2f}s throughput={args.requests / elapsed:.1f} req/s")
+    print(f"latency mean={statistics.mean(latencies):.3f}s max={max(latencies):.3f}s")
+    print(f"fully serialised lower bound would be {args.requests * args.llm_latency:.1f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--mode", choices=["async", "sync"], default="async")
+    args = parser.parse_args()
+
+    install_fakes(args.llm_latency)
+    size_pools(args.concurrency)
+    if args.mode == "sync":
+        use_blocking_path()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
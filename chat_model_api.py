@@ -1,23 +1,80 @@
 import os
 import json
+import asyncio
 import uvicorn
 import logging
-import requests
-from typing import Optional
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
 from fastapi.responses import JSONResponse
 from fastapi.responses import StreamingResponse
+from fastapi.responses import Response
 from src.rag_folder.question_answer import ChatBot
 from starlette.middleware.cors import CORSMiddleware
-from src.database.organisation_database import DatabaseManager
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query, Body
+from src.database.organisation_database import AsyncDatabaseManager
+from src.database.connection_pool import open_pools, close_pools, open_async_pools, close_async_pools, get_pool_stats
+from fastapi import FastAPI, HTTPException, Query, Body, Depends, Request
 from src.organisation_embedding_creation.embedding_generation import CreateDataEmbedding
+from src.organisation_ingestion.ingestion_queue import IngestionQueue, IngestionQueueFull
+from src.organisation_ingestion.bulk_ingestion import bulk_upsert, parse_bulk_payload
+from src.organisation_ingestion.streaming_ingestion import stream_organisation_upload
+from src.organisation_embedding_creation.token_counter import warm_encoder
+from src.monitoring.metrics import CONTENT_TYPE_LATEST, ingestion_stage, metrics_payload
+from src.database.organisation_events import OrganisationChangeListener
+from src.database.migrations import run_startup_migrations
+from src.model_scheduling.model_scheduler import ModelSchedulerOverloaded
 
-app = FastAPI()
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(run_startup_migrations)
+    open_pools()
+    await open_async_pools()
+    app.state.chatbot = ChatBot()
+    # Off the startup path: tiktoken may have to download its BPE file first.
+    app.state.tokenizer_warmup = asyncio.create_task(asyncio.to_thread(warm_encoder))
+    app.state.embedding_creator = CreateDataEmbedding()
+    app.state.ingestion_queue = IngestionQueue(app.state.embedding_creator, answer_cache=app.state.chatbot.answer_cache)
+    await app.state.ingestion_queue.start()
+    # Other workers' uploads reach this worker's in-process caches through LISTEN/NOTIFY.
+    app.state.organisation_listener = OrganisationChangeListener()
+    app.state.organisation_listener.subscribe(app.state.chatbot.answer_cache.on_organisation_changed)
+    app.state.organisation_listener.subscribe(app.state.chatbot.on_organisation_changed)
+    app.state.organisation_listener.subscribe(app.state.chatbot.hot_index.on_organisation_changed)
+    await app.state.organisation_listener.start()
+    yield
+    await app.state.organisation_listener.stop()
+    await app.state.ingestion_queue.stop()
+    await close_async_pools()
+    close_pools()
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(ModelSchedulerOverloaded)
+async def model_scheduler_overloaded(request: Request, exc: ModelSchedulerOverloaded) -> JSONResponse:
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)})
+
+
+def get_chatbot(request: Request) -> ChatBot:
+    return request.app.state.chatbot
+
+
+def get_embedding_creator(request: Request) -> CreateDataEmbedding:
+    return request.app.state.embedding_creator
+
+
+def get_ingestion_queue(request: Request) -> IngestionQueue:
+    return request.app.state.ingestion_queue
+
+
 logger = logging.getLogger("fastapi_app")
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,10 +88,34 @@ app.add_middleware(
 async def hello():
     return "<h1 style='color:blue'>Hello There!</h1>"
 
+@app.get("/api/pool_stats/")
+async def pool_stats():
+    return JSONResponse(content=get_pool_stats())
+
+@app.get("/metrics")
+async def metrics():
+    return Response(content=metrics_payload(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/api/cache_stats/")
+async def cache_stats(request: Request):
+    return JSONResponse(content={
+            "chat_embeddings": request.app.state.chatbot.embedding_model.stats(),
+            "ingestion_embeddings": request.app.state.embedding_creator.embedding_model.stats(),
+            "answers": request.app.state.chatbot.answer_cache.stats(),
+            "coalescing": request.app.state.chatbot.single_flight.stats(),
+            "hot_index": request.app.state.chatbot.hot_index.stats(),
+        })
+
+@app.get("/api/scheduler_stats/")
+async def scheduler_stats(chatbot: ChatBot = Depends(get_chatbot)):
+    return JSONResponse(content=chatbot.scheduler.stats())
+
 @app.post("/api/organisation_database/")
 async def upload_file(
         organisation_id: Optional[int] = Query(None, description="Organisation ID is optional"),
-        organisation_data: dict = Body(..., embed=True)
+        organisation_data: dict = Body(..., embed=True),
+        ingestion_queue: IngestionQueue = Depends(get_ingestion_queue),
+        chatbot: ChatBot = Depends(get_chatbot),
     ):
     organisation_data_from_frontend = json.dumps(organisation_data)
     
@@ -52,28 +133,123 @@ async def upload_file(
             "ai_embeddings_reason": "Initial processing"
         }
 
-    orgainsation_database_object = DatabaseManager()
-    orgainsation_database_object.connect()
-    organisation_status = orgainsation_database_object.insert_or_update_data(organisation_data)
+    orgainsation_database_object = AsyncDatabaseManager()
+    await orgainsation_database_object.connect()
+    try:
+        with ingestion_stage("db_upsert", str(organisation_id or "")):
+            organisation_status = await orgainsation_database_object.insert_or_update_data(organisation_data)
+    finally:
+        await orgainsation_database_object.close()
 
-    organisation_data = {
-            "organisation_id": str(organisation_status['organisation_id']),
-            "organisation_data": organisation_data_from_frontend,
-            "ai_embeddings_status": "Pending",
-            "ai_embeddings_reason": "Initial processing"
-        }
+    await chatbot.answer_cache.ainvalidate(str(organisation_status['organisation_id']))
+
+    try:
+        ingestion_queue.submit(organisation_status['organisation_id'])
+    except IngestionQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
 
-    organisation_vector_database = CreateDataEmbedding()
-    embedding_status = organisation_vector_database._create_embedding_selection(organisation_data)
-    embedding_status['organisation_data'] = organisation_data_from_frontend
+    return JSONResponse(status_code=202, content={
+            "organisation_id": organisation_status["organisation_id"],
+            "message": "Embedding generation queued",
+            "status": "Pending"
+        })
 
-    orgainsation_database_object.insert_or_update_data(embedding_status)
-    orgainsation_database_object.close()
 
+@app.post("/api/organisation_database/bulk/")
+async def bulk_upload_files(
+        request: Request,
+        ingestion_queue: IngestionQueue = Depends(get_ingestion_queue),
+        chatbot: ChatBot = Depends(get_chatbot),
+    ):
+    """Upsert many organisations sent as a JSON array or NDJSON body and queue them for embedding."""
+    try:
+        items = parse_bulk_payload((await request.body()).decode("utf-8"))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not items:
+        raise HTTPException(status_code=400, detail="No organisations in the request body")
+
+    summary = await bulk_upsert(items, chatbot.answer_cache)
+    for result in summary["results"]:
+        if result["status"] != "Pending":
+            continue
+        try:
+            ingestion_queue.submit(result["organisation_id"])
+        except IngestionQueueFull:
+            # Stored as Pending, so the periodic sweep of the queue picks up the rest.
+            break
+    return JSONResponse(status_code=202, content=summary)
+
+
+@app.post("/api/organisation_database/bulk/status/")
+async def get_bulk_embedding_status(
+        organisation_ids: List[int] = Body(..., embed=True),
+    ):
+    """Embedding status of the organisations returned by a bulk upload."""
+    orgainsation_database_object = AsyncDatabaseManager()
+    await orgainsation_database_object.connect()
+    try:
+        statuses = await orgainsation_database_object.get_organisation_statuses(organisation_ids)
+    finally:
+        await orgainsation_database_object.close()
+
+    counts: Dict[str, int] = {}
+    for status, _ in statuses.values():
+        counts[status] = counts.get(status, 0) + 1
     return JSONResponse(content={
-            "organisation_id": organisation_status["organisation_id"],
-            "message": embedding_status['ai_embeddings_reason'],
-            "status": embedding_status['ai_embeddings_status']
+            "counts": counts,
+            "missing": [organisation_id for organisation_id in organisation_ids if organisation_id not in statuses],
+            "organisations": [
+                {"organisation_id": organisation_id, "status": status, "message": reason}
+                for organisation_id, (status, reason) in statuses.items()
+            ],
+        })
+
+
+@app.post("/api/organisation_database/stream/")
+async def stream_upload_file(
+        request: Request,
+        organisation_id: Optional[int] = Query(None, description="Organisation ID is optional"),
+        embedding_creator: CreateDataEmbedding = Depends(get_embedding_creator),
+        ingestion_queue: IngestionQueue = Depends(get_ingestion_queue),
+        chatbot: ChatBot = Depends(get_chatbot),
+    ):
+    """Store and embed a very large organisation payload sent as a (chunked) request body."""
+    status = await stream_organisation_upload(
+        request.stream(), embedding_creator, organisation_id or None, chatbot.answer_cache, ingestion_queue
+    )
+    if not status["status"]:
+        status_code = 422
+    else:
+        status_code = 202 if status["ai_embeddings_status"] == "Pending" else 200
+    return JSONResponse(status_code=status_code, content={
+            "organisation_id": status["organisation_id"],
+            "message": status["ai_embeddings_reason"],
+            "status": status["ai_embeddings_status"],
+            "bytes": status["bytes"],
+        })
+
+
+@app.get("/api/organisation_database/status/")
+async def get_embedding_status(
+        organisation_id: int = Query(..., description="Organisation ID"),
+    ):
+    orgainsation_database_object = AsyncDatabaseManager()
+    await orgainsation_database_object.connect()
+    try:
+        organisation = await orgainsation_database_object.get_organisation(organisation_id)
+    finally:
+        await orgainsation_database_object.close()
+
+    if organisation is None:
+        raise HTTPException(status_code=404, detail="Organisation not found")
+
+    return JSONResponse(content={
+            "organisation_id": organisation["organisation_id"],
+            "message": organisation["ai_embeddings_reason"],
+            "status": organisation["ai_embeddings_status"],
+            "modified_at": organisation["modified_at"].isoformat()
         })
 
 
@@ -81,6 +257,7 @@ async def upload_file(
 async def get_organisation_data(    
                         organisation_id: Optional[int] = Query(None, description="Organisation ID is optional"),
                         user_query: str = Body(..., embed=True),
+                        chatbot: ChatBot = Depends(get_chatbot),
                     )-> JSONResponse:
 
     if not user_query:
@@ -89,15 +266,62 @@ async def get_organisation_data(
     if not organisation_id:
         raise HTTPException(status_code=400, detail="Missing Organisation ID")
 
+    # Reject before any work is done when the model calls are already backed up.
+    chatbot.scheduler.check_admission()
+
     data = {
         "user_query": user_query,
         "organisation_id": str(organisation_id)
     }
     
-    chatbot = ChatBot()
-    answer = chatbot.get_response(data)
+    answer = await chatbot.aget_response(data)
     return JSONResponse(content=answer)
 
 
+@app.post("/api/organisation_chatbot/stream/")
+async def stream_organisation_data(
+                        organisation_id: Optional[int] = Query(None, description="Organisation ID is optional"),
+                        user_query: str = Body(..., embed=True),
+                        chatbot: ChatBot = Depends(get_chatbot),
+                    ) -> StreamingResponse:
+
+    if not user_query:
+        raise HTTPException(status_code=400, detail="Missing query")
+
+    if not organisation_id:
+        raise HTTPException(status_code=400, detail="Missing Organisation ID")
+
+    # Reject before any work is done when the model calls are already backed up.
+    chatbot.scheduler.check_admission()
+
+    data = {
+        "user_query": user_query,
+        "organisation_id": str(organisation_id)
+    }
+
+    events = chatbot.astream_response(data)
+    # The first event only comes once the model slot was granted, so a scheduler that rejects the
+    # call while it waits is still answered with a 503 rather than a 200 and an empty stream.
+    first_event = await anext(events)
+
+    async def ndjson_events():
+        yield json.dumps(first_event) + "\n"
+        try:
+            async for event in events:
+                yield json.dumps(event) + "\n"
+        except ModelSchedulerOverloaded as e:
+            # The 200 headers are already sent; end the stream with an event the client can act on.
+            yield json.dumps({"type": "error", "status": 503, "detail": str(e), "retry_after": e.retry_after}) + "\n"
+
+    return StreamingResponse(ndjson_events(), media_type="application/x-ndjson")
+
+
 if __name__ == "__main__":
-    uvicorn.run(app, host='0.0.0.0')
\ No newline at end of file
+    # Production runs several workers through gunicorn (see gunicorn.conf.py); this entry point
+    # is for development and small deployments.
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    if workers > 1:
+        # Apply the migrations once here rather than concurrently in every worker.
+        run_startup_migrations()
+        os.environ["RUN_MIGRATIONS_ON_STARTUP"] = "false"
+    uvicorn.run("chat_model_api:app" if workers > 1 else app, host='0.0.0.0', workers=workers)
\ No newline at end of file
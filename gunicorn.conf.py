@@ -0,0 +1,67 @@
+"""Multi-process serving of chat_model_api.
+
+    gunicorn chat_model_api:app -c gunicorn.conf.py
+
+Every worker runs its own event loop, connection pools, ingestion queue and in-process caches;
+organisation changes are propagated between them through Postgres LISTEN/NOTIFY.
+
+Graceful reload: ``kill -HUP <master pid>`` starts new workers with the current configuration and
+stops the old ones once their in-flight requests finished. With GUNICORN_PRELOAD the application
+code is loaded once in the master, so a code deploy needs ``kill -USR2`` (new master) followed by
+``kill -WINCH`` / ``kill -QUIT`` of the old master instead.
+"""
+import os
+import shutil
+import tempfile
+import multiprocessing
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn_worker.UvicornWorker"
+# Import the app (models, prompts, langchain) once in the master and fork it into every worker.
+# Connections are only opened in the lifespan, so nothing is shared across the fork.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+# Recycle workers now and then so slow leaks in third-party clients cannot accumulate.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 0))
+
+# Migrations run once in the master (on_starting) instead of concurrently in every worker. This
+# module is loaded before the app is preloaded, so the workers see the flag switched off.
+run_migrations_in_master = os.getenv("RUN_MIGRATIONS_ON_STARTUP", "true").lower() == "true"
+os.environ["RUN_MIGRATIONS_ON_STARTUP"] = "false"
+
+# prometheus_client reads PROMETHEUS_MULTIPROC_DIR when it is imported, so it is set here,
+# before the app is loaded.
+if workers > 1 and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="chatbot-metrics-")
+
+
+def on_starting(server):
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        # Samples of a previous run would otherwise be added to this one.
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+    if run_migrations_in_master:
+        from src.database.migrations import run_migrations
+        try:
+            run_migrations()
+        except Exception as e:
+            server.log.warning("Could not apply migrations at startup: %s", e)
+    if preload_app:
+        # Loaded once in the master and inherited by every forked worker, instead of each worker
+        # fetching the tiktoken BPE file on its own.
+        from src.organisation_embedding_creation.token_counter import warm_encoder
+        warm_encoder()
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,169 @@
+import os
+import logging
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+load_dotenv()
+
+DBNAME = os.getenv("DBNAME")
+DBUSER = os.getenv("DBUSER")
+DBPW = os.getenv("DBPW")
+DBHOST = os.getenv("DBHOST")
+DBPORT = os.getenv("DBPORT")
+CONNINFO = f"postgresql://{DBUSER}:{DBPW}@{DBHOST}:{DBPORT}/{DBNAME}"
+CONNECTION_SETTINGS = f"postgresql+psycopg://{DBUSER}:{DBPW}@{DBHOST}:{DBPORT}/{DBNAME}"
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+SQLALCHEMY_POOL_SIZE = int(os.getenv("SQLALCHEMY_POOL_SIZE", 5))
+SQLALCHEMY_MAX_OVERFLOW = int(os.getenv("SQLALCHEMY_MAX_OVERFLOW", 5))
+LOGGER = logging.getLogger(__name__)
+
+_connection_pool: Optional[ConnectionPool] = None
+_engine: Optional[Engine] = None
+_async_connection_pool: Optional[AsyncConnectionPool] = None
+_async_engine: Optional[AsyncEngine] = None
+
+
+def open_pools() -> None:
+    """Create the app-wide psycopg pool and SQLAlchemy engine if they do not exist yet."""
+    global _connection_pool, _engine
+    if _connection_pool is None:
+        _connection_pool = ConnectionPool(
+            CONNINFO,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            timeout=DB_POOL_TIMEOUT,
+            open=True,
+        )
+        LOGGER.info("Database connection pool opened (min=%s, max=%s).", DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE)
+    if _engine is None:
+        _engine = create_engine(
+            CONNECTION_SETTINGS,
+            pool_size=SQLALCHEMY_POOL_SIZE,
+            max_overflow=SQLALCHEMY_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_pre_ping=True,
+        )
+        # Before the engine hands out its first connection, so every pooled connection gets the
+        # ANN search settings. Imported here because vector_index itself imports CONNINFO.
+        from src.database.vector_index import register_search_settings
+        register_search_settings(_engine)
+
+
+def close_pools() -> None:
+    """Close the app-wide psycopg pool and dispose of the SQLAlchemy engine."""
+    global _connection_pool, _engine
+    if _connection_pool is not None:
+        _connection_pool.close()
+        _connection_pool = None
+        LOGGER.info("Database connection pool closed.")
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+
+
+async def open_async_pools() -> None:
+    """Create the app-wide async psycopg pool and async SQLAlchemy engine if they do not exist yet."""
+    global _async_connection_pool, _async_engine
+    if _async_connection_pool is None:
+        _async_connection_pool = AsyncConnectionPool(
+            CONNINFO,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            timeout=DB_POOL_TIMEOUT,
+            open=False,
+        )
+        await _async_connection_pool.open()
+        LOGGER.info("Async database connection pool opened (min=%s, max=%s).", DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE)
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            CONNECTION_SETTINGS,
+            pool_size=SQLALCHEMY_POOL_SIZE,
+            max_overflow=SQLALCHEMY_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_pre_ping=True,
+        )
+        from src.database.vector_index import register_search_settings
+        register_search_settings(_async_engine)
+
+
+async def close_async_pools() -> None:
+    """Close the app-wide async psycopg pool and dispose of the async SQLAlchemy engine."""
+    global _async_connection_pool, _async_engine
+    if _async_connection_pool is not None:
+        await _async_connection_pool.close()
+        _async_connection_pool = None
+        LOGGER.info("Async database connection pool closed.")
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+
+
+def get_connection_pool() -> ConnectionPool:
+    """Return the shared psycopg pool, opening it lazily outside of the FastAPI app."""
+    if _connection_pool is None:
+        open_pools()
+    return _connection_pool
+
+
+def get_engine() -> Engine:
+    """Return the shared SQLAlchemy engine used by PGVector."""
+    if _engine is None:
+        open_pools()
+    return _engine
+
+
+async def get_async_connection_pool() -> AsyncConnectionPool:
+    """Return the shared async psycopg pool, opening it lazily outside of the FastAPI app."""
+    if _async_connection_pool is None:
+        await open_async_pools()
+    return _async_connection_pool
+
+
+async def get_async_engine() -> AsyncEngine:
+    """Return the shared async SQLAlchemy engine used by PGVector in async mode."""
+    if _async_engine is None:
+        await open_async_pools()
+    return _async_engine
+
+
+def _psycopg_pool_stats(pool: Any) -> Dict[str, Any]:
+    pool_stats = pool.get_stats()
+    return {
+        "pool_size": pool_stats.get("pool_size", 0),
+        "in_use": pool_stats.get("pool_size", 0) - pool_stats.get("pool_available", 0),
+        "available": pool_stats.get("pool_available", 0),
+        "waiting": pool_stats.get("requests_waiting", 0),
+        "requests": pool_stats.get("requests_num", 0),
+        "wait_time_ms": pool_stats.get("requests_wait_ms", 0),
+        "timeouts": pool_stats.get("requests_errors", 0),
+    }
+
+
+def _sqlalchemy_pool_stats(pool: Any) -> Dict[str, Any]:
+    return {
+        "pool_size": pool.size(),
+        "in_use": pool.checkedout(),
+        "available": pool.checkedin(),
+        "overflow": pool.overflow(),
+    }
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Return usage statistics for the shared psycopg pool and SQLAlchemy engine."""
+    stats: Dict[str, Any] = {}
+    if _connection_pool is not None:
+        stats["psycopg"] = _psycopg_pool_stats(_connection_pool)
+    if _engine is not None:
+        stats["sqlalchemy"] = _sqlalchemy_pool_stats(_engine.pool)
+    if _async_connection_pool is not None:
+        stats["psycopg_async"] = _psycopg_pool_stats(_async_connection_pool)
+    if _async_engine is not None:
+        stats["sqlalchemy_async"] = _sqlalchemy_pool_stats(_async_engine.pool)
+    return stats
@@ -0,0 +1,290 @@
+"""In-process vector index of small organisations.
+
+The chunks of an organisation with at most HOT_INDEX_MAX_CHUNKS chunks are loaded once from
+langchain_pg_embedding into a NumPy matrix of normalised embeddings, so full-context, similarity
+and MMR retrieval for it run without a database round-trip. Entries live in an LRU bounded by
+HOT_INDEX_MAX_BYTES and are dropped when the organisation is re-embedded, on an organisation
+change notification, or after HOT_INDEX_TTL_SECONDS. Larger organisations are remembered as
+such and keep being served by Postgres.
+"""
+import os
+import time
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from dotenv import load_dotenv
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from src.database.connection_pool import get_async_connection_pool, get_connection_pool
+from src.database.organisation_vector_database import CHUNK_ORDER, ORGANISATION_TOKENS_QUERY, organisation_containment
+from src.rag_folder.single_flight import SingleFlight
+
+load_dotenv()
+
+HOT_INDEX_ENABLED = os.getenv("HOT_INDEX_ENABLED", "true").lower() == "true"
+HOT_INDEX_MAX_CHUNKS = int(os.getenv("HOT_INDEX_MAX_CHUNKS", 2000))
+HOT_INDEX_MAX_BYTES = int(os.getenv("HOT_INDEX_MAX_BYTES", 64 * 1024 * 1024))
+# Upper bound on staleness when change notifications are lost or disabled.
+HOT_INDEX_TTL_SECONDS = int(os.getenv("HOT_INDEX_TTL_SECONDS", 300))
+# Same defaults as the PGVector MMR retriever.
+HOT_INDEX_TOP_K = int(os.getenv("HOT_INDEX_TOP_K", 4))
+HOT_INDEX_FETCH_K = int(os.getenv("HOT_INDEX_FETCH_K", 20))
+HOT_INDEX_LAMBDA_MULT = float(os.getenv("HOT_INDEX_LAMBDA_MULT", 0.5))
+LOGGER = logging.getLogger(__name__)
+
+HOT_INDEX_CHUNKS_QUERY = f"""
+    SELECT e.id, e.document, e.cmetadata, e.embedding::real[]
+    FROM langchain_pg_embedding e
+    JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+    WHERE c.name = %s
+      AND e.cmetadata @> %s
+    ORDER BY {CHUNK_ORDER}
+"""
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class HotOrganisation:
+    def __init__(self, rows: List[Tuple[str, str, Dict[str, Any], List[float]]]) -> None:
+        """
+        The chunks of one organisation, in document order like ORGANISATION_CHUNKS_QUERY.
+
+        Args:
+            rows (list): (id, document, cmetadata, embedding) rows of the organisation.
+        """
+        self.ids = [row[0] for row in rows]
+        self.texts = [row[1] for row in rows]
+        self.metadatas = [row[2] or {} for row in rows]
+        self.matrix = _normalise(np.asarray([row[3] for row in rows], dtype=np.float32))
+        # Same fallback as ORGANISATION_TOKENS_QUERY for chunks stored without a token count.
+        self.tokens = sum(int(metadata.get("tokens") or (len(text) + 3) // 4) for metadata, text in zip(self.metadatas, self.texts))
+        self.nbytes = self.matrix.nbytes + sum(len(text) for text in self.texts)
+        self.loaded_at = time.monotonic()
+
+    def _documents(self, indices) -> List[Document]:
+        return [Document(id=self.ids[i], page_content=self.texts[i], metadata=self.metadatas[i]) for i in indices]
+
+    def full_context(self, max_tokens: int) -> Optional[List[Document]]:
+        """Every chunk if together they fit in ``max_tokens``, like ``get_full_context``."""
+        if not self.ids or self.tokens > max_tokens:
+            return None
+        return self._documents(range(len(self.ids)))
+
+    def _similarities(self, embedding: List[float]) -> np.ndarray:
+        return self.matrix @ _normalise(np.asarray(embedding, dtype=np.float32))
+
+    def similarity_search(self, embedding: List[float], k: int = HOT_INDEX_TOP_K) -> List[Document]:
+        if not self.ids:
+            return []
+        similarities = self._similarities(embedding)
+        return self._documents(np.argsort(-similarities)[:k])
+
+    def max_marginal_relevance_search(
+                self, embedding: List[float], k: int = HOT_INDEX_TOP_K,
+                fetch_k: int = HOT_INDEX_FETCH_K, lambda_mult: float = HOT_INDEX_LAMBDA_MULT,
+            ) -> List[Document]:
+        """MMR over the ``fetch_k`` most similar chunks, cosine similarity throughout."""
+        if not self.ids:
+            return []
+        similarities = self._similarities(embedding)
+        candidates = np.argsort(-similarities)[:fetch_k]
+        selected = [int(candidates[0])]
+        candidates = candidates[1:]
+        while candidates.size and len(selected) < k:
+            redundancy = (self.matrix[candidates] @ self.matrix[selected].T).max(axis=1)
+            scores = lambda_mult * similarities[candidates] - (1 - lambda_mult) * redundancy
+            best = int(np.argmax(scores))
+            selected.append(int(candidates[best]))
+            candidates = np.delete(candidates, best)
+        return self._documents(selected)
+
+
+class HotVectorIndex:
+    def __init__(
+                self,
+                collection_name: str,
+                max_chunks: int = HOT_INDEX_MAX_CHUNKS,
+                max_bytes: int = HOT_INDEX_MAX_BYTES,
+                ttl_seconds: int = HOT_INDEX_TTL_SECONDS,
+            ) -> None:
+        """
+        Lazily loaded, byte-bounded LRU of HotOrganisation entries.
+
+        Args:
+            collection_name (str): The PGVector collection.
+            max_chunks (int): Organisations with more chunks stay in Postgres.
+            max_bytes (int): Total size of the cached matrices and texts.
+            ttl_seconds (int): Age after which an entry is reloaded.
+        """
+        self.collection_name = collection_name
+        self.max_chunks = max_chunks
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lru: "OrderedDict[str, HotOrganisation]" = OrderedDict()
+        self._large: Dict[str, float] = {}
+        self._versions: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loads = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, organisation_id: str) -> Tuple[bool, Optional[HotOrganisation]]:
+        """(known, entry): known is False when the organisation has to be looked up in Postgres."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lru.get(organisation_id)
+            if entry is not None and now - entry.loaded_at < self.ttl_seconds:
+                self._lru.move_to_end(organisation_id)
+                self.hits += 1
+                return True, entry
+            if entry is not None:
+                self._drop(organisation_id)
+            large_at = self._large.get(organisation_id)
+            if large_at is not None and now - large_at < self.ttl_seconds:
+                return True, None
+            self.misses += 1
+            return False, None
+
+    def _drop(self, organisation_id: str) -> None:
+        entry = self._lru.pop(organisation_id, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    def _store(self, organisation_id: str, version: int, entry: Optional[HotOrganisation]) -> None:
+        with self._lock:
+            if self._versions.get(organisation_id, 0) != version:
+                # Invalidated while loading; the next request loads the new chunks.
+                return
+            self._drop(organisation_id)
+            if entry is None:
+                self._large[organisation_id] = time.monotonic()
+                return
+            if entry.nbytes > self.max_bytes:
+                self._large[organisation_id] = time.monotonic()
+                return
+            self._large.pop(organisation_id, None)
+            self._lru[organisation_id] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._lru.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def _version(self, organisation_id: str) -> int:
+        with self._lock:
+            return self._versions.get(organisation_id, 0)
+
+    def invalidate(self, organisation_id: str) -> None:
+        """Drop an organisation, e.g. after its chunks were rewritten."""
+        organisation_id = str(organisation_id)
+        with self._lock:
+            self._versions[organisation_id] = self._versions.get(organisation_id, 0) + 1
+            self._drop(organisation_id)
+            self._large.pop(organisation_id, None)
+
+    def on_organisation_changed(self, organisation_id: Optional[str]) -> None:
+        """OrganisationChangeListener callback: drop a changed organisation, or everything for None."""
+        if organisation_id is not None:
+            self.invalidate(organisation_id)
+            return
+        with self._lock:
+            for key in set(self._lru) | set(self._large):
+                self._versions[key] = self._versions.get(key, 0) + 1
+            self._lru.clear()
+            self._large.clear()
+            self._bytes = 0
+
+    def _load(self, organisation_id: str) -> Optional[HotOrganisation]:
+        version = self._version(organisation_id)
+        containment = organisation_containment(organisation_id)
+        with get_connection_pool().connection() as db:
+            _, chunks = db.execute(ORGANISATION_TOKENS_QUERY, (self.collection_name, containment)).fetchone()
+            rows = None
+            if chunks <= self.max_chunks:
+                rows = db.execute(HOT_INDEX_CHUNKS_QUERY, (self.collection_name, containment)).fetchall()
+        entry = HotOrganisation(rows) if rows is not None else None
+        self._store(organisation_id, version, entry)
+        return entry
+
+    async def _aload(self, organisation_id: str) -> Optional[HotOrganisation]:
+        version = self._version(organisation_id)
+        containment = organisation_containment(organisation_id)
+        pool = await get_async_connection_pool()
+        async with pool.connection() as db:
+            cursor = await db.execute(ORGANISATION_TOKENS_QUERY, (self.collection_name, containment))
+            _, chunks = await cursor.fetchone()
+            rows = None
+            if chunks <= self.max_chunks:
+                cursor = await db.execute(HOT_INDEX_CHUNKS_QUERY, (self.collection_name, containment))
+                rows = await cursor.fetchall()
+        entry = HotOrganisation(rows) if rows is not None else None
+        self._store(organisation_id, version, entry)
+        return entry
+
+    def get(self, organisation_id: str) -> Optional[HotOrganisation]:
+        """
+        The in-process entry of an organisation, loading it on first use.
+
+        Args:
+            organisation_id (str): The ID of the organisation.
+
+        Returns:
+            Optional[HotOrganisation]: None for organisations that are too large, or on a database error.
+        """
+        organisation_id = str(organisation_id)
+        known, entry = self._cached(organisation_id)
+        if known:
+            return entry
+        try:
+            return self._loads.do(organisation_id, lambda: self._load(organisation_id))[0]
+        except Exception as e:
+            LOGGER.warning("Could not load organisation %s into the hot index: %s", organisation_id, e)
+            return None
+
+    async def aget(self, organisation_id: str) -> Optional[HotOrganisation]:
+        """
+        The in-process entry of an organisation, loading it on first use with the async pool.
+
+        Args:
+            organisation_id (str): The ID of the organisation.
+
+        Returns:
+            Optional[HotOrganisation]: None for organisations that are too large, or on a database error.
+        """
+        organisation_id = str(organisation_id)
+        known, entry = self._cached(organisation_id)
+        if known:
+            return entry
+        try:
+            return (await self._loads.ado(organisation_id, lambda: self._aload(organisation_id)))[0]
+        except Exception as e:
+            LOGGER.warning("Could not load organisation %s into the hot index: %s", organisation_id, e)
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "organisations": len(self._lru),
+                "large_organisations": len(self._large),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_hot_index: Optional[HotVectorIndex] = None
+_hot_index_lock = threading.Lock()
+
+
+def get_hot_index(collection_name: str = "organisation_embeddings") -> HotVectorIndex:
+    """The index shared by the chatbot and the ingestion path of this process."""
+    global _hot_index
+    with _hot_index_lock:
+        if _hot_index is None:
+            _hot_index = HotVectorIndex(collection_name)
+        return _hot_index
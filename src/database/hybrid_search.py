@@ -0,0 +1,270 @@
+"""Hybrid keyword + vector retrieval over langchain_pg_embedding.
+
+Keyword matches come from a full-text search on ``document`` (served by the ``ix_document_tsv``
+expression index), vector matches from the ANN index. Both candidate lists are merged with reciprocal
+rank fusion, ``score = sum(1 / (HYBRID_RRF_K + rank))``, in a single statement. Organisations held
+in the hot vector index only fetch the keyword candidates from Postgres; their vector ranking comes
+from the in-process matrix and both are fused in Python with the same formula.
+
+With HYBRID_KEYWORD_FAST_PATH on, a short, selective keyword match (product codes, phone numbers,
+names) is answered from the full-text search alone, without embedding the query.
+"""
+import os
+import json
+import logging
+from dotenv import load_dotenv
+from sqlalchemy import text
+from typing import Any, Dict, List, Optional, Sequence
+from langchain_core.documents import Document
+from src.database.connection_pool import get_async_engine, get_engine
+
+load_dotenv()
+
+# Must be a regconfig name; it is inlined so the queries match the expression index.
+TEXT_SEARCH_CONFIG = os.getenv("TEXT_SEARCH_CONFIG", "english")
+HYBRID_TOP_K = int(os.getenv("HYBRID_TOP_K", 4))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 20))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+# Off by default: a keyword hit skips the vector search, which can miss the better chunks.
+HYBRID_KEYWORD_FAST_PATH = os.getenv("HYBRID_KEYWORD_FAST_PATH", "false").lower() == "true"
+# The fast path is taken when the query occurs as a phrase in at most this many chunks of the
+# organisation, and the best of them ranks at least HYBRID_KEYWORD_MIN_RANK. 0 disables it.
+HYBRID_KEYWORD_MAX_MATCHES = int(os.getenv("HYBRID_KEYWORD_MAX_MATCHES", 3))
+HYBRID_KEYWORD_MAX_TERMS = int(os.getenv("HYBRID_KEYWORD_MAX_TERMS", 3))
+# ts_rank_cd of a single occurrence of a single term is 0.1.
+HYBRID_KEYWORD_MIN_RANK = float(os.getenv("HYBRID_KEYWORD_MIN_RANK", 0.1))
+LOGGER = logging.getLogger(__name__)
+
+if not TEXT_SEARCH_CONFIG.replace("_", "").isalnum():
+    raise ValueError(f"Invalid TEXT_SEARCH_CONFIG: {TEXT_SEARCH_CONFIG}")
+
+DOCUMENT_TSVECTOR = f"to_tsvector('{TEXT_SEARCH_CONFIG}', document)"
+CREATE_TSVECTOR_INDEX_QUERY = f"""
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_document_tsv
+    ON langchain_pg_embedding USING gin ({DOCUMENT_TSVECTOR})
+"""
+
+_COLLECTION_FILTER = """
+    collection_id = (SELECT uuid FROM langchain_pg_collection WHERE name = :collection)
+    AND cmetadata @> CAST(:filter AS jsonb)
+"""
+
+KEYWORD_SEARCH_QUERY = f"""
+    SELECT id, document, cmetadata,
+           ts_rank_cd({DOCUMENT_TSVECTOR}, query) AS score,
+           numnode(query) AS query_nodes,
+           {DOCUMENT_TSVECTOR} @@ phraseto_tsquery('{TEXT_SEARCH_CONFIG}', :query) AS phrase_match
+    FROM langchain_pg_embedding,
+         websearch_to_tsquery('{TEXT_SEARCH_CONFIG}', :query) AS query
+    WHERE {_COLLECTION_FILTER}
+      AND {DOCUMENT_TSVECTOR} @@ query
+    ORDER BY score DESC
+    LIMIT :limit
+"""
+
+HYBRID_SEARCH_QUERY = f"""
+    WITH keyword AS (
+        SELECT id, row_number() OVER (ORDER BY score DESC) AS rank
+        FROM (
+            SELECT id, ts_rank_cd({DOCUMENT_TSVECTOR}, query) AS score
+            FROM langchain_pg_embedding,
+                 websearch_to_tsquery('{TEXT_SEARCH_CONFIG}', :query) AS query
+            WHERE {_COLLECTION_FILTER}
+              AND {DOCUMENT_TSVECTOR} @@ query
+            ORDER BY score DESC
+            LIMIT :candidates
+        ) matches
+    ),
+    semantic AS (
+        SELECT id, row_number() OVER (ORDER BY distance) AS rank
+        FROM (
+            SELECT id, embedding <=> CAST(:embedding AS vector) AS distance
+            FROM langchain_pg_embedding
+            WHERE {_COLLECTION_FILTER}
+            ORDER BY distance
+            LIMIT :candidates
+        ) neighbours
+    ),
+    fused AS (
+        SELECT COALESCE(k.id, s.id) AS id,
+               COALESCE(1.0 / (:rrf_k + k.rank), 0) + COALESCE(1.0 / (:rrf_k + s.rank), 0) AS score
+        FROM keyword k
+        FULL OUTER JOIN semantic s ON k.id = s.id
+    )
+    SELECT e.id, e.document, e.cmetadata, f.score
+    FROM fused f
+    JOIN langchain_pg_embedding e ON e.id = f.id
+    ORDER BY f.score DESC
+    LIMIT :k
+"""
+
+
+def _documents(rows: Sequence[Any]) -> List[Document]:
+    return [Document(id=row.id, page_content=row.document, metadata=row.cmetadata or {}) for row in rows]
+
+
+def _vector_literal(embedding: Sequence[float]) -> str:
+    return "[" + ",".join(repr(float(value)) for value in embedding) + "]"
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Document]], k: int = HYBRID_TOP_K, rrf_k: int = HYBRID_RRF_K) -> List[Document]:
+    """
+    Merge rankings of the same chunks like HYBRID_SEARCH_QUERY does.
+
+    Args:
+        rankings (Sequence[Sequence[Document]]): Best first; chunks are matched by ``Document.id``.
+        k (int): Number of chunks to return.
+        rrf_k (int): Damping constant of the fusion.
+
+    Returns:
+        List[Document]: Chunks ordered by reciprocal rank fusion score.
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            scores[document.id] = scores.get(document.id, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(document.id, document)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [documents[chunk_id] for chunk_id in ranked[:k]]
+
+
+def _is_confident(rows: Sequence[Any]) -> bool:
+    # websearch_to_tsquery ANDs the terms, so every row matched all of them. A short query found as
+    # a phrase in only a few chunks is an exact-term lookup; the vector search would not add
+    # anything to it. Terms merely scattered over a chunk are not.
+    if not rows or HYBRID_KEYWORD_MAX_MATCHES <= 0 or len(rows) > HYBRID_KEYWORD_MAX_MATCHES:
+        return False
+    if rows[0].score < HYBRID_KEYWORD_MIN_RANK or not all(row.phrase_match for row in rows):
+        return False
+    # numnode counts operands and operators: n terms joined by & give 2n - 1 nodes.
+    return (rows[0].query_nodes + 1) // 2 <= HYBRID_KEYWORD_MAX_TERMS
+
+
+class HybridSearch:
+    """Keyword, vector and fused search restricted to one organisation of a PGVector collection."""
+
+    def __init__(self, collection_name: str) -> None:
+        self.collection_name = collection_name
+
+    def _keyword_params(self, organisation_id: str, query: str) -> Dict[str, Any]:
+        return {
+            "collection": self.collection_name,
+            "filter": json.dumps({"id": str(organisation_id)}),
+            "query": query,
+            # One row more than the fast path accepts tells a selective query from a broad one.
+            "limit": max(HYBRID_KEYWORD_MAX_MATCHES, 0) + 1,
+        }
+
+    def _candidate_params(self, organisation_id: str, query: str, limit: int) -> Dict[str, Any]:
+        return {**self._keyword_params(organisation_id, query), "limit": limit}
+
+    def _hybrid_params(self, organisation_id: str, query: str, embedding: Sequence[float], k: int) -> Dict[str, Any]:
+        return {
+            "collection": self.collection_name,
+            "filter": json.dumps({"id": str(organisation_id)}),
+            "query": query,
+            "embedding": _vector_literal(embedding),
+            "candidates": max(HYBRID_CANDIDATES, k),
+            "rrf_k": HYBRID_RRF_K,
+            "k": k,
+        }
+
+    def keyword_fast_path(self, organisation_id: str, query: str) -> Optional[List[Document]]:
+        """
+        Answer an exact-term query from the full-text index alone.
+
+        Args:
+            organisation_id (str): Organisation whose chunks are searched.
+            query (str): The user query.
+
+        Returns:
+            Optional[List[Document]]: The matching chunks, or None when the vector search is needed.
+        """
+        engine = get_engine()
+        with engine.connect() as conn:
+            rows = conn.execute(text(KEYWORD_SEARCH_QUERY), self._keyword_params(organisation_id, query)).fetchall()
+        return _documents(rows) if _is_confident(rows) else None
+
+    async def akeyword_fast_path(self, organisation_id: str, query: str) -> Optional[List[Document]]:
+        """Async version of ``keyword_fast_path``."""
+        engine = await get_async_engine()
+        async with engine.connect() as conn:
+            rows = (await conn.execute(text(KEYWORD_SEARCH_QUERY), self._keyword_params(organisation_id, query))).fetchall()
+        return _documents(rows) if _is_confident(rows) else None
+
+    def keyword_candidates(self, organisation_id: str, query: str, limit: int = HYBRID_CANDIDATES) -> List[Document]:
+        """
+        The keyword half of the hybrid search: full-text matches of an organisation, best first.
+
+        Args:
+            organisation_id (str): Organisation whose chunks are searched.
+            query (str): The user query.
+            limit (int): Number of candidates to return.
+
+        Returns:
+            List[Document]: Chunks ordered by ts_rank_cd.
+        """
+        engine = get_engine()
+        with engine.connect() as conn:
+            rows = conn.execute(text(KEYWORD_SEARCH_QUERY), self._candidate_params(organisation_id, query, limit)).fetchall()
+        return _documents(rows)
+
+    async def akeyword_candidates(self, organisation_id: str, query: str, limit: int = HYBRID_CANDIDATES) -> List[Document]:
+        """Async version of ``keyword_candidates``."""
+        engine = await get_async_engine()
+        async with engine.connect() as conn:
+            rows = (await conn.execute(text(KEYWORD_SEARCH_QUERY), self._candidate_params(organisation_id, query, limit))).fetchall()
+        return _documents(rows)
+
+    def search_hot(self, organisation_id: str, query: str, embedding: Sequence[float], hot: Any, k: int = HYBRID_TOP_K) -> List[Document]:
+        """
+        Hybrid search of an organisation held in the hot vector index.
+
+        Only the keyword candidates are read from Postgres; the vector ranking comes from the
+        in-process matrix of ``hot``.
+
+        Args:
+            organisation_id (str): Organisation whose chunks are searched.
+            query (str): The user query, for the keyword ranking.
+            embedding (Sequence[float]): The query embedding, for the vector ranking.
+            hot (HotOrganisation): The organisation's entry in the hot vector index.
+            k (int): Number of chunks to return.
+
+        Returns:
+            List[Document]: Chunks ordered by reciprocal rank fusion score.
+        """
+        candidates = max(HYBRID_CANDIDATES, k)
+        keyword = self.keyword_candidates(organisation_id, query, candidates)
+        return reciprocal_rank_fusion([keyword, hot.similarity_search(embedding, candidates)], k)
+
+    async def asearch_hot(self, organisation_id: str, query: str, embedding: Sequence[float], hot: Any, k: int = HYBRID_TOP_K) -> List[Document]:
+        """Async version of ``search_hot``."""
+        candidates = max(HYBRID_CANDIDATES, k)
+        keyword = await self.akeyword_candidates(organisation_id, query, candidates)
+        return reciprocal_rank_fusion([keyword, hot.similarity_search(embedding, candidates)], k)
+
+    def search(self, organisation_id: str, query: str, embedding: Sequence[float], k: int = HYBRID_TOP_K) -> List[Document]:
+        """
+        Fuse the keyword and vector rankings of an organisation's chunks in one round trip.
+
+        Args:
+            organisation_id (str): Organisation whose chunks are searched.
+            query (str): The user query, for the keyword ranking.
+            embedding (Sequence[float]): The query embedding, for the vector ranking.
+            k (int): Number of chunks to return.
+
+        Returns:
+            List[Document]: Chunks ordered by reciprocal rank fusion score.
+        """
+        engine = get_engine()
+        with engine.connect() as conn:
+            rows = conn.execute(text(HYBRID_SEARCH_QUERY), self._hybrid_params(organisation_id, query, embedding, k)).fetchall()
+        return _documents(rows)
+
+    async def asearch(self, organisation_id: str, query: str, embedding: Sequence[float], k: int = HYBRID_TOP_K) -> List[Document]:
+        """Async version of ``search``."""
+        engine = await get_async_engine()
+        async with engine.connect() as conn:
+            rows = (await conn.execute(text(HYBRID_SEARCH_QUERY), self._hybrid_params(organisation_id, query, embedding, k))).fetchall()
+        return _documents(rows)
@@ -0,0 +1,175 @@
+import os
+import re
+import logging
+import psycopg
+from dotenv import load_dotenv
+from typing import List, Tuple
+from src.database.connection_pool import CONNINFO
+from src.database.hybrid_search import CREATE_TSVECTOR_INDEX_QUERY
+from src.database.vector_index import DIMENSION, drop_invalid_index
+
+load_dotenv()
+
+# The API runs the migrations at startup unless disabled, e.g. when a deploy step runs them.
+RUN_MIGRATIONS_ON_STARTUP = os.getenv("RUN_MIGRATIONS_ON_STARTUP", "true").lower() == "true"
+LOGGER = logging.getLogger(__name__)
+CONCURRENT_INDEX_NAME = re.compile(r"CREATE INDEX CONCURRENTLY IF NOT EXISTS (\w+)", re.IGNORECASE)
+
+# (name, statement) pairs, applied in order. Every statement must be idempotent.
+# Statements run in autocommit mode so CREATE INDEX CONCURRENTLY does not lock writers.
+MIGRATIONS: List[Tuple[str, str]] = [
+    (
+        "vector_extension",
+        "CREATE EXTENSION IF NOT EXISTS vector",
+    ),
+    (
+        "organisation_data_table",
+        """
+        CREATE TABLE IF NOT EXISTS organisation_data (
+            organisation_id SERIAL PRIMARY KEY,
+            organisation_data TEXT NOT NULL,
+            ai_embeddings_status TEXT NOT NULL,
+            ai_embeddings_reason TEXT,
+            created_at TIMESTAMP NOT NULL,
+            modified_at TIMESTAMP NOT NULL
+        )
+        """,
+    ),
+    (
+        # Same layout as PostgresChatMessageHistory.create_tables.
+        "message_store_table",
+        """
+        CREATE TABLE IF NOT EXISTS message_store (
+            id SERIAL PRIMARY KEY,
+            session_id UUID NOT NULL,
+            message JSONB NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """,
+    ),
+    (
+        "message_store_session_id_index",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_message_store_session_id ON message_store (session_id)",
+    ),
+    (
+        "message_store_session_id_id_index",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_message_store_session_id_id ON message_store (session_id, id)",
+    ),
+    (
+        # Same layout as the PGVector models of langchain-postgres.
+        "langchain_pg_collection_table",
+        """
+        CREATE TABLE IF NOT EXISTS langchain_pg_collection (
+            uuid UUID PRIMARY KEY,
+            name VARCHAR NOT NULL UNIQUE,
+            cmetadata JSON
+        )
+        """,
+    ),
+    (
+        # pgvector cannot build an HNSW or IVFFlat index on a column without a fixed dimension.
+        "langchain_pg_embedding_table",
+        f"""
+        CREATE TABLE IF NOT EXISTS langchain_pg_embedding (
+            id VARCHAR PRIMARY KEY,
+            collection_id UUID REFERENCES langchain_pg_collection (uuid) ON DELETE CASCADE,
+            embedding vector({DIMENSION}),
+            document VARCHAR,
+            cmetadata JSONB
+        )
+        """,
+    ),
+    (
+        "langchain_pg_embedding_cmetadata_gin_index",
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_cmetadata_gin
+        ON langchain_pg_embedding USING gin (cmetadata jsonb_path_ops)
+        """,
+    ),
+    (
+        "langchain_pg_embedding_document_tsv_index",
+        CREATE_TSVECTOR_INDEX_QUERY,
+    ),
+    (
+        "message_store_summary_table",
+        """
+        CREATE TABLE IF NOT EXISTS message_store_summary (
+            session_id UUID PRIMARY KEY,
+            summary TEXT NOT NULL,
+            summarised_until_id INTEGER NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """,
+    ),
+    (
+        "embedding_cache_table",
+        """
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            content_hash TEXT NOT NULL,
+            model TEXT NOT NULL,
+            dimension INTEGER NOT NULL,
+            embedding REAL[] NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (content_hash, model, dimension)
+        )
+        """,
+    ),
+    (
+        "embedding_cache_created_at_index",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_embedding_cache_created_at ON embedding_cache (created_at)",
+    ),
+    (
+        "answer_cache_table",
+        """
+        CREATE TABLE IF NOT EXISTS answer_cache (
+            organisation_id TEXT NOT NULL,
+            query_hash TEXT NOT NULL,
+            query TEXT NOT NULL,
+            embedding vector NOT NULL,
+            answer TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (organisation_id, query_hash)
+        )
+        """,
+    ),
+    (
+        "answer_cache_created_at_index",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_answer_cache_created_at ON answer_cache (created_at)",
+    ),
+    (
+        # Set while an ingestion worker of any process embeds the organisation; see CLAIM_ORGANISATIONS_QUERY.
+        "organisation_data_embedding_claimed_at_column",
+        "ALTER TABLE organisation_data ADD COLUMN IF NOT EXISTS embedding_claimed_at TIMESTAMP",
+    ),
+]
+
+
+def run_migrations() -> None:
+    """Apply every migration against the configured database."""
+    with psycopg.connect(CONNINFO, autocommit=True, connect_timeout=10) as conn:
+        for name, statement in MIGRATIONS:
+            LOGGER.info("Applying migration %s", name)
+            index = CONCURRENT_INDEX_NAME.search(statement)
+            if index is not None:
+                # IF NOT EXISTS would skip an index a previous run failed to build.
+                drop_invalid_index(conn, index.group(1))
+            conn.execute(statement)
+    LOGGER.info("Migrations applied.")
+
+
+def run_startup_migrations() -> None:
+    """Startup step of the API: apply the migrations, but keep serving if the database is not reachable yet."""
+    if not RUN_MIGRATIONS_ON_STARTUP:
+        return
+    try:
+        run_migrations()
+    except Exception as e:
+        LOGGER.warning("Could not apply migrations at startup: %s", e)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+    )
+    run_migrations()
@@ -1,47 +1,142 @@
-import os
-import psycopg
-from datetime import datetime
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from psycopg import Connection
-from typing import Any, Optional, Dict
+from psycopg import AsyncConnection, Connection
+from src.database.connection_pool import get_async_connection_pool, get_connection_pool
+from typing import Any, Optional, Dict, List, Tuple
 
 load_dotenv()
 
-DBNAME = os.getenv("DBNAME")
-DBUSER = os.getenv("DBUSER")
-DBPW = os.getenv("DBPW")
-DBHOST = os.getenv("DBHOST")
-DBPORT = os.getenv("DBPORT")
-
+INSERT_ORGANISATION_QUERY = (
+    """
+    INSERT INTO organisation_data (
+        organisation_data, ai_embeddings_status,
+        ai_embeddings_reason, created_at, modified_at
+    )
+    VALUES (%s, %s, %s, %s, %s)
+    RETURNING organisation_id
+    """
+)
+UPDATE_ORGANISATION_QUERY = (
+    """
+    UPDATE organisation_data
+    SET organisation_data = %s,
+        ai_embeddings_status = %s,
+        ai_embeddings_reason = %s,
+        modified_at = %s
+    WHERE organisation_id = %s
+    """
+)
+UPDATE_ORGANISATION_RETURNING_QUERY = (
+    """
+    UPDATE organisation_data
+    SET organisation_data = %s,
+        ai_embeddings_status = %s,
+        ai_embeddings_reason = %s,
+        modified_at = %s
+    WHERE organisation_id = %s
+    RETURNING organisation_id
+    """
+)
+UPDATE_EMBEDDING_STATUS_QUERY = (
+    """
+    UPDATE organisation_data
+    SET ai_embeddings_status = %s,
+        ai_embeddings_reason = %s,
+        modified_at = %s
+    WHERE organisation_id = %s
+    """
+)
+SELECT_ORGANISATION_QUERY = (
+    """
+    SELECT organisation_id, organisation_data, ai_embeddings_status,
+           ai_embeddings_reason, created_at, modified_at
+    FROM organisation_data
+    WHERE organisation_id = %s
+    """
+)
+SELECT_ORGANISATION_STATUSES_QUERY = (
+    """
+    SELECT organisation_id, ai_embeddings_status, ai_embeddings_reason
+    FROM organisation_data
+    WHERE organisation_id = ANY(%s)
+    """
+)
+# Organisations waiting to be embedded: Pending and unclaimed, or claimed by a process whose claim expired.
+SELECT_PENDING_ORGANISATIONS_QUERY = (
+    """
+    SELECT organisation_id
+    FROM organisation_data
+    WHERE (ai_embeddings_status = 'Pending' AND embedding_claimed_at IS NULL)
+       OR embedding_claimed_at < %s
+    ORDER BY modified_at
+    LIMIT %s
+    """
+)
+# Claims are taken with SKIP LOCKED so concurrent processes never both claim a row. The data is
+# returned by the same statement, so the embedding run uses exactly the data it claimed.
+CLAIM_ORGANISATIONS_QUERY = (
+    """
+    UPDATE organisation_data
+    SET ai_embeddings_status = 'Processing',
+        ai_embeddings_reason = 'Embedding in progress',
+        embedding_claimed_at = %s,
+        modified_at = %s
+    WHERE organisation_id IN (
+        SELECT organisation_id
+        FROM organisation_data
+        WHERE organisation_id = ANY(%s)
+          AND ((ai_embeddings_status = 'Pending' AND embedding_claimed_at IS NULL)
+               OR embedding_claimed_at < %s)
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING organisation_id, organisation_data
+    """
+)
+UPDATE_CLAIMED_REASON_QUERY = (
+    """
+    UPDATE organisation_data
+    SET ai_embeddings_reason = %s,
+        modified_at = %s
+    WHERE organisation_id = %s
+      AND embedding_claimed_at = %s
+      AND ai_embeddings_status = 'Processing'
+    """
+)
+# The final status is only written while the row is still Processing: an upload during the run
+# set it back to Pending, which has to survive so the new data gets embedded too.
+RELEASE_ORGANISATION_QUERY = (
+    """
+    UPDATE organisation_data
+    SET ai_embeddings_status = CASE WHEN ai_embeddings_status = 'Processing' THEN %s ELSE ai_embeddings_status END,
+        ai_embeddings_reason = CASE WHEN ai_embeddings_status = 'Processing' THEN %s ELSE ai_embeddings_reason END,
+        embedding_claimed_at = NULL,
+        modified_at = %s
+    WHERE organisation_id = %s
+      AND embedding_claimed_at = %s
+    RETURNING ai_embeddings_status
+    """
+)
 
 class DatabaseManager:
     def __init__(self):
-        """Initialize the database manager with configuration."""
-        self.db_config = {
-            "dbname": DBNAME,
-            "user": DBUSER,
-            "password": DBPW,
-            "host": DBHOST,
-            "port": DBPORT
-        }
+        """Initialize the database manager on top of the shared connection pool."""
         self.conn: Optional[Connection] = None
 
     def connect(self) -> None:
-        """Establish a connection to the PostgreSQL database."""
+        """Borrow a connection from the shared PostgreSQL pool."""
         if not self.conn:
             try:
-                self.conn = psycopg.connect(**self.db_config)
-                print("Database connection established.")
+                self.conn = get_connection_pool().getconn()
             except Exception as e:
                 raise ConnectionError(f"Failed to connect to the database: {e}")
 
     def close(self) -> None:
-        """Close the connection to the PostgreSQL database."""
+        """Return the borrowed connection to the shared PostgreSQL pool."""
         if self.conn:
             try:
-                self.conn.close()
+                self.conn.rollback()
+                get_connection_pool().putconn(self.conn)
                 self.conn = None
-                print("Database connection closed.")
             except Exception as e:
                 raise ConnectionError(f"Failed to close the database connection: {e}")
 
@@ -88,33 +183,12 @@ class DatabaseManager:
         Returns:
             int: The organisation_id of the inserted or updated record.
         """
-        query_insert = (
-            """
-            INSERT INTO organisation_data (
-                organisation_data, ai_embeddings_status,
-                ai_embeddings_reason, created_at, modified_at
-            )
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING organisation_id
-            """
-        )
-        query_update = (
-            """
-            UPDATE organisation_data
-            SET organisation_data = %s,
-                ai_embeddings_status = %s,
-                ai_embeddings_reason = %s,
-                modified_at = %s
-            WHERE organisation_id = %s
-            """
-        )
-
         now = datetime.now()
         try:
             with self.conn.cursor() as cur:
                 if "organisation_id" in data and data["organisation_id"] is not None:
                     cur.execute(
-                        query_update,
+                        UPDATE_ORGANISATION_QUERY,
                         (
                             data["organisation_data"],
                             data["ai_embeddings_status"],
@@ -130,7 +204,7 @@ class DatabaseManager:
                     }
                 else:
                     cur.execute(
-                        query_insert,
+                        INSERT_ORGANISATION_QUERY,
                         (
                             data["organisation_data"],
                             data["ai_embeddings_status"],
@@ -151,6 +225,299 @@ class DatabaseManager:
             self.conn.rollback()
             raise RuntimeError(f"Failed to insert or update data: {e}")
 
+
+class AsyncDatabaseManager:
+    def __init__(self):
+        """Initialize the async database manager on top of the shared async connection pool."""
+        self.conn: Optional[AsyncConnection] = None
+
+    async def connect(self) -> None:
+        """Borrow a connection from the shared async PostgreSQL pool."""
+        if not self.conn:
+            try:
+                pool = await get_async_connection_pool()
+                self.conn = await pool.getconn()
+            except Exception as e:
+                raise ConnectionError(f"Failed to connect to the database: {e}")
+
+    async def close(self) -> None:
+        """Return the borrowed connection to the shared async PostgreSQL pool."""
+        if self.conn:
+            try:
+                await self.conn.rollback()
+                pool = await get_async_connection_pool()
+                await pool.putconn(self.conn)
+                self.conn = None
+            except Exception as e:
+                raise ConnectionError(f"Failed to close the database connection: {e}")
+
+    async def insert_or_update_data(self, data: Dict[str, Any]) -> int:
+        """Insert or update data in the table and return the organisation_id.
+
+        Args:
+            data (Dict[str, Any]): A dictionary containing the data to be inserted or updated.
+
+        Returns:
+            int: The organisation_id of the inserted or updated record.
+        """
+        now = datetime.now()
+        try:
+            async with self.conn.cursor() as cur:
+                if "organisation_id" in data and data["organisation_id"] is not None:
+                    await cur.execute(
+                        UPDATE_ORGANISATION_QUERY,
+                        (
+                            data["organisation_data"],
+                            data["ai_embeddings_status"],
+                            data["ai_embeddings_reason"],
+                            now,
+                            data["organisation_id"],
+                        ),
+                    )
+                    organisation_id = data["organisation_id"]
+                    data = {
+                        "organisation_id": organisation_id,
+                        "message": f"Data updated for the {organisation_id}"
+                    }
+                else:
+                    await cur.execute(
+                        INSERT_ORGANISATION_QUERY,
+                        (
+                            data["organisation_data"],
+                            data["ai_embeddings_status"],
+                            data["ai_embeddings_reason"],
+                            now,
+                            now,
+                        ),
+                    )
+                    organisation_id = (await cur.fetchone())[0]
+                    data = {
+                        "organisation_id": organisation_id,
+                        "message": f"Data inserted for the {organisation_id}"
+                    }
+
+                await self.conn.commit()
+                return data
+        except Exception as e:
+            await self.conn.rollback()
+            raise RuntimeError(f"Failed to insert or update data: {e}")
+
+    async def bulk_insert_or_update_data(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert or update many organisations in one transaction.
+
+        New rows and updates are each sent with a single pipelined ``executemany``.
+
+        Args:
+            items (List[Dict[str, Any]]): Dictionaries shaped like the ``insert_or_update_data`` input.
+
+        Returns:
+            List[Dict[str, Any]]: One ``{"organisation_id", "message"}`` per item, in input order.
+                ``organisation_id`` is None for updates of organisations that do not exist.
+        """
+        now = datetime.now()
+        inserts = [index for index, item in enumerate(items) if item.get("organisation_id") is None]
+        updates = [index for index, item in enumerate(items) if item.get("organisation_id") is not None]
+        results: List[Dict[str, Any]] = [{} for _ in items]
+        try:
+            async with self.conn.cursor() as cur:
+                if inserts:
+                    await cur.executemany(
+                        INSERT_ORGANISATION_QUERY,
+                        [
+                            (
+                                items[index]["organisation_data"],
+                                items[index]["ai_embeddings_status"],
+                                items[index]["ai_embeddings_reason"],
+                                now,
+                                now,
+                            )
+                            for index in inserts
+                        ],
+                        returning=True,
+                    )
+                    for index in inserts:
+                        organisation_id = (await cur.fetchone())[0]
+                        results[index] = {
+                            "organisation_id": organisation_id,
+                            "message": f"Data inserted for the {organisation_id}"
+                        }
+                        cur.nextset()
+                if updates:
+                    await cur.executemany(
+                        UPDATE_ORGANISATION_RETURNING_QUERY,
+                        [
+                            (
+                                items[index]["organisation_data"],
+                                items[index]["ai_embeddings_status"],
+                                items[index]["ai_embeddings_reason"],
+                                now,
+                                items[index]["organisation_id"],
+                            )
+                            for index in updates
+                        ],
+                        returning=True,
+                    )
+                    for index in updates:
+                        row = await cur.fetchone()
+                        organisation_id = items[index]["organisation_id"]
+                        results[index] = {
+                            "organisation_id": row[0] if row else None,
+                            "message": f"Data updated for the {organisation_id}" if row else f"Organisation {organisation_id} not found"
+                        }
+                        cur.nextset()
+            await self.conn.commit()
+            return results
+        except Exception as e:
+            await self.conn.rollback()
+            raise RuntimeError(f"Failed to insert or update data: {e}")
+
+    async def update_embedding_status(self, organisation_id: int, status: str, reason: str) -> None:
+        """Update only the embedding status columns of an organisation, leaving its data untouched.
+
+        Args:
+            organisation_id (int): The organisation to update.
+            status (str): One of "Pending", "Processing", "Completed" or "Failed".
+            reason (str): Human readable detail stored in ai_embeddings_reason.
+        """
+        try:
+            async with self.conn.cursor() as cur:
+                await cur.execute(UPDATE_EMBEDDING_STATUS_QUERY, (status, reason, datetime.now(), organisation_id))
+            await self.conn.commit()
+        except Exception as e:
+            await self.conn.rollback()
+            raise RuntimeError(f"Failed to update embedding status: {e}")
+
+    async def get_organisation(self, organisation_id: int) -> Optional[Dict[str, Any]]:
+        """Fetch one organisation row.
+
+        Args:
+            organisation_id (int): The organisation to fetch.
+
+        Returns:
+            Optional[Dict[str, Any]]: The row as a dictionary, or None if it does not exist.
+        """
+        try:
+            async with self.conn.cursor() as cur:
+                await cur.execute(SELECT_ORGANISATION_QUERY, (organisation_id,))
+                row = await cur.fetchone()
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch organisation: {e}")
+        if not row:
+            return None
+        return {
+            "organisation_id": row[0],
+            "organisation_data": row[1],
+            "ai_embeddings_status": row[2],
+            "ai_embeddings_reason": row[3],
+            "created_at": row[4],
+            "modified_at": row[5],
+        }
+
+    async def get_organisation_statuses(self, organisation_ids: List[int]) -> Dict[int, Tuple[str, str]]:
+        """Fetch the embedding status of many organisations.
+
+        Args:
+            organisation_ids (List[int]): The organisations to look up.
+
+        Returns:
+            Dict[int, Tuple[str, str]]: ``(status, reason)`` per existing organisation.
+        """
+        try:
+            async with self.conn.cursor() as cur:
+                await cur.execute(SELECT_ORGANISATION_STATUSES_QUERY, (list(organisation_ids),))
+                return {row[0]: (row[1], row[2]) for row in await cur.fetchall()}
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch organisation statuses: {e}")
+
+    async def get_pending_organisation_ids(self, claim_timeout: float, limit: int) -> List[int]:
+        """Return the ids of organisations waiting to be embedded, oldest first.
+
+        Args:
+            claim_timeout (float): Seconds after which a claim of a crashed process is given up.
+            limit (int): Maximum number of ids returned.
+
+        Returns:
+            List[int]: Pending unclaimed organisations and organisations with an expired claim.
+        """
+        expired = datetime.now() - timedelta(seconds=claim_timeout)
+        try:
+            async with self.conn.cursor() as cur:
+                await cur.execute(SELECT_PENDING_ORGANISATIONS_QUERY, (expired, limit))
+                return [row[0] for row in await cur.fetchall()]
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch pending organisations: {e}")
+
+    async def claim_organisations(
+                self, organisation_ids: List[int], claim_timeout: float,
+            ) -> Tuple[datetime, List[Dict[str, Any]]]:
+        """Atomically mark organisations as Processing by this caller.
+
+        Only one caller across every process can hold the claim of an organisation; ids that are
+        not Pending, or are claimed by someone else, are left out of the result.
+
+        Args:
+            organisation_ids (List[int]): The organisations to claim.
+            claim_timeout (float): Seconds after which a claim of a crashed process is given up.
+
+        Returns:
+            Tuple[datetime, List[Dict[str, Any]]]: The claim token to pass to ``release_organisation``
+                and one ``{"organisation_id", "organisation_data"}`` per claimed organisation.
+        """
+        now = datetime.now()
+        expired = now - timedelta(seconds=claim_timeout)
+        try:
+            async with self.conn.cursor() as cur:
+                await cur.execute(CLAIM_ORGANISATIONS_QUERY, (now, now, list(organisation_ids), expired))
+                rows = await cur.fetchall()
+            await self.conn.commit()
+        except Exception as e:
+            await self.conn.rollback()
+            raise RuntimeError(f"Failed to claim organisations: {e}")
+        return now, [{"organisation_id": row[0], "organisation_data": row[1]} for row in rows]
+
+    async def update_claimed_reason(self, organisation_id: int, claimed_at: datetime, reason: str) -> None:
+        """Update the reason of an organisation this caller is still processing.
+
+        Args:
+            organisation_id (int): The claimed organisation.
+            claimed_at (datetime): The claim token returned by ``claim_organisations``.
+            reason (str): Human readable detail stored in ai_embeddings_reason.
+        """
+        try:
+            async with self.conn.cursor() as cur:
+                await cur.execute(UPDATE_CLAIMED_REASON_QUERY, (reason, datetime.now(), organisation_id, claimed_at))
+            await self.conn.commit()
+        except Exception as e:
+            await self.conn.rollback()
+            raise RuntimeError(f"Failed to update embedding status: {e}")
+
+    async def release_organisation(
+                self, organisation_id: int, claimed_at: datetime, status: str, reason: str,
+            ) -> Optional[str]:
+        """Drop the claim of an organisation and store the outcome of the run.
+
+        Args:
+            organisation_id (int): The claimed organisation.
+            claimed_at (datetime): The claim token returned by ``claim_organisations``.
+            status (str): "Completed", "Failed", or "Pending" to have it picked up again.
+            reason (str): Human readable detail stored in ai_embeddings_reason.
+
+        Returns:
+            Optional[str]: The status the row ended up with, "Pending" when it was updated during the
+                run, or None when the claim had expired and was taken over.
+        """
+        try:
+            async with self.conn.cursor() as cur:
+                await cur.execute(
+                    RELEASE_ORGANISATION_QUERY, (status, reason, datetime.now(), organisation_id, claimed_at)
+                )
+                row = await cur.fetchone()
+            await self.conn.commit()
+        except Exception as e:
+            await self.conn.rollback()
+            raise RuntimeError(f"Failed to update embedding status: {e}")
+        return row[0] if row else None
+
 # if __name__ == "__main__":
 #     db_manager = DatabaseManager()
 #     try:
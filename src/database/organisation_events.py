@@ -0,0 +1,109 @@
+"""Cross-process notification of organisation changes through Postgres LISTEN/NOTIFY.
+
+Every API worker keeps its own in-process caches. When an organisation's data or embeddings
+change, the worker that made the change publishes the organisation id on ORGANISATION_CHANNEL and
+every worker, including itself, drops what it cached for that organisation.
+"""
+import os
+import asyncio
+import logging
+import psycopg
+from psycopg import sql
+from dotenv import load_dotenv
+from typing import Awaitable, Callable, List, Optional, Union
+from src.database.connection_pool import CONNINFO, get_async_connection_pool, get_connection_pool
+
+load_dotenv()
+
+ORGANISATION_CHANNEL = os.getenv("ORGANISATION_CHANNEL", "organisation_changed")
+ORGANISATION_EVENTS_ENABLED = os.getenv("ORGANISATION_EVENTS_ENABLED", "true").lower() == "true"
+ORGANISATION_EVENTS_RECONNECT_DELAY = float(os.getenv("ORGANISATION_EVENTS_RECONNECT_DELAY", 1))
+LOGGER = logging.getLogger(__name__)
+
+NOTIFY_QUERY = "SELECT pg_notify(%s, %s)"
+
+# Called with an organisation id, or with None when notifications may have been missed and
+# everything cached has to be dropped.
+OrganisationCallback = Callable[[Optional[str]], Union[None, Awaitable[None]]]
+
+
+def notify_organisation_changed(organisation_id: str) -> None:
+    """Tell every worker that an organisation changed."""
+    if not ORGANISATION_EVENTS_ENABLED:
+        return
+    try:
+        with get_connection_pool().connection() as db:
+            db.execute(NOTIFY_QUERY, (ORGANISATION_CHANNEL, str(organisation_id)))
+    except Exception as e:
+        LOGGER.warning("Could not publish change of organisation %s: %s", organisation_id, e)
+
+
+async def anotify_organisation_changed(organisation_id: str) -> None:
+    """Tell every worker that an organisation changed, using the async pool."""
+    if not ORGANISATION_EVENTS_ENABLED:
+        return
+    try:
+        pool = await get_async_connection_pool()
+        async with pool.connection() as db:
+            await db.execute(NOTIFY_QUERY, (ORGANISATION_CHANNEL, str(organisation_id)))
+    except Exception as e:
+        LOGGER.warning("Could not publish change of organisation %s: %s", organisation_id, e)
+
+
+class OrganisationChangeListener:
+    def __init__(self, channel: str = ORGANISATION_CHANNEL, reconnect_delay: float = ORGANISATION_EVENTS_RECONNECT_DELAY) -> None:
+        """
+        Background LISTEN on the organisation channel, on a dedicated connection outside the pool.
+
+        Args:
+            channel (str): The NOTIFY channel.
+            reconnect_delay (float): Seconds to wait before reconnecting after the connection is lost.
+        """
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._callbacks: List[OrganisationCallback] = []
+        self._task: Optional[asyncio.Task] = None
+        self.received = 0
+
+    def subscribe(self, callback: OrganisationCallback) -> None:
+        self._callbacks.append(callback)
+
+    async def start(self) -> None:
+        if ORGANISATION_EVENTS_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._listen(), name="organisation-change-listener")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _dispatch(self, organisation_id: Optional[str]) -> None:
+        for callback in self._callbacks:
+            try:
+                result = callback(organisation_id)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                LOGGER.warning("Organisation change callback failed for %s: %s", organisation_id, e)
+
+    async def _listen(self) -> None:
+        connected_before = False
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(CONNINFO, autocommit=True) as conn:
+                    await conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.channel)))
+                    if connected_before:
+                        # Changes published while the connection was down were not received.
+                        await self._dispatch(None)
+                    connected_before = True
+                    LOGGER.info("Listening for organisation changes on %s", self.channel)
+                    async for notification in conn.notifies():
+                        self.received += 1
+                        await self._dispatch(notification.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                LOGGER.warning("Organisation change listener disconnected: %s", e)
+                connected_before = True
+                await asyncio.sleep(self.reconnect_delay)
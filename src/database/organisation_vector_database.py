@@ -1,24 +1,147 @@
 import os
-import uuid
-import psycopg2
+import asyncio
+import hashlib
+import logging
 from dotenv import load_dotenv
-from typing import List, Any, Dict
+from typing import AsyncIterator, List, Any, Dict, Optional, Tuple
+from psycopg.types.json import Jsonb
 from langchain_postgres import PGVector
-from psycopg2.extensions import register_adapter, AsIs
+from src.database.connection_pool import get_async_connection_pool, get_async_engine, get_connection_pool, get_engine
+from src.database.vector_index import ensure_vector_index
+from langchain_core.documents import Document
+from src.monitoring.metrics import ingestion_stage
+from src.organisation_embedding_creation.token_counter import count_tokens
+from src.model_scheduling.model_scheduler import scheduling_organisation
 
 load_dotenv()
 
-DBNAME = os.getenv("DBNAME")
-DBUSER = os.getenv("DBUSER")
-DBPW = os.getenv("DBPW")
-DBHOST = os.getenv("DBHOST")
-DBPORT = os.getenv("DBPORT")
-CONNECTION_SETTINGS = f"postgresql+psycopg2://{DBUSER}:{DBPW}@{DBHOST}:{DBPORT}/{DBNAME}"
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", 4))
+VECTOR_INSERT_BATCH_SIZE = int(os.getenv("VECTOR_INSERT_BATCH_SIZE", 1000))
+LOGGER = logging.getLogger(__name__)
 
-def adapt_uuid(uuid_val: uuid.UUID) -> AsIs:
-    return AsIs(f"'{str(uuid_val)}'")
+RECORD_EXISTS_QUERY = "SELECT EXISTS (SELECT 1 FROM langchain_pg_embedding WHERE cmetadata @> %s LIMIT 1)"
+ORGANISATION_CHUNK_IDS_QUERY = """
+    SELECT e.id
+    FROM langchain_pg_embedding e
+    JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+    WHERE c.name = %s
+      AND e.cmetadata @> %s
+"""
+DELETE_CHUNKS_QUERY = "DELETE FROM langchain_pg_embedding WHERE id = ANY(%s)"
+# Chunks stored before token counts were recorded fall back to the 4-characters-per-token estimate.
+_CHUNK_TOKENS = "COALESCE((e.cmetadata->>'tokens')::int, (length(e.document) + 3) / 4)"
+ORGANISATION_TOKENS_QUERY = f"""
+    SELECT COALESCE(SUM({_CHUNK_TOKENS}), 0), COUNT(*)
+    FROM langchain_pg_embedding e
+    JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+    WHERE c.name = %s
+      AND e.cmetadata @> %s
+"""
+# Document order; chunks stored before ordinals were recorded sort last, by id.
+CHUNK_ORDER = "(e.cmetadata->>'ordinal')::int, e.id"
+ORGANISATION_CHUNKS_QUERY = f"""
+    SELECT e.id, e.document, e.cmetadata
+    FROM langchain_pg_embedding e
+    JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+    WHERE c.name = %s
+      AND e.cmetadata @> %s
+    ORDER BY {CHUNK_ORDER}
+"""
+# Kept chunks move when text is inserted or removed before them; only rows whose position changed are written.
+RENUMBER_CHUNKS_QUERY = """
+    UPDATE langchain_pg_embedding e
+    SET cmetadata = jsonb_set(e.cmetadata, '{ordinal}', to_jsonb(o.ordinal))
+    FROM unnest(%s::text[], %s::int[]) AS o (id, ordinal)
+    WHERE e.id = o.id
+      AND (e.cmetadata->>'ordinal') IS DISTINCT FROM o.ordinal::text
+"""
+DELETE_ORGANISATION_QUERY = """
+    DELETE FROM langchain_pg_embedding e
+    USING langchain_pg_collection c
+    WHERE e.collection_id = c.uuid
+      AND c.name = %s
+      AND e.cmetadata @> %s
+"""
+
+
+def chunk_id(organisation_id: str, page_content: str) -> str:
+    """Stable id of a chunk: ``<organisation_id>:<sha256 of the chunk text>``."""
+    return f"{organisation_id}:{hashlib.sha256(page_content.encode('utf-8')).hexdigest()}"
+
+
+def organisation_filter(organisation_id: str) -> Dict[str, Any]:
+    """PGVector metadata filter restricting a search to one organisation."""
+    return {"id": str(organisation_id)}
+
+
+def organisation_containment(organisation_id: str) -> Jsonb:
+    """``cmetadata @> %s`` parameter matching every chunk of one organisation."""
+    return Jsonb({"id": str(organisation_id)})
+
+
+class OrganisationPGVector(PGVector):
+    """PGVector whose plain equality filters compile to JSONB containment (``cmetadata @> {...}``).
+
+    PGVector turns ``{"id": x}`` into ``jsonb_path_match(cmetadata, ...)``, which is evaluated row by row
+    after the vector scan. Containment is served by the ``ix_cmetadata_gin`` jsonb_path_ops index, so the
+    organisation filter is applied before distances are computed.
+    """
+
+    def _create_filter_clause(self, filters: Any) -> Any:
+        if isinstance(filters, dict) and filters and all(
+            not key.startswith("$") and not isinstance(value, (dict, list)) for key, value in filters.items()
+        ):
+            return self.EmbeddingStore.cmetadata.contains(filters)
+        return super()._create_filter_clause(filters)
+
+
+_vector_index_checked = False
+
+
+def _ensure_vector_index() -> None:
+    global _vector_index_checked
+    if _vector_index_checked:
+        return
+    try:
+        ensure_vector_index()
+    except Exception as e:
+        LOGGER.warning("Could not create the vector index: %s", e)
+    _vector_index_checked = True
+
+
+def _batches(items: List[Any], size: int) -> List[List[Any]]:
+    return [items[index:index + size] for index in range(0, len(items), size)]
+
+
+def _diff_chunks(
+            texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str], existing_ids: set
+        ) -> Tuple[List[str], List[Dict[str, Any]], List[str], List[str], int]:
+    """Split the current chunks into ones that need embedding and stored ids that are gone."""
+    new_texts: List[str] = []
+    new_metadatas: List[Dict[str, Any]] = []
+    new_ids: List[str] = []
+    for text, metadata, doc_id in zip(texts, metadatas, ids):
+        if doc_id not in existing_ids:
+            new_texts.append(text)
+            new_metadatas.append(metadata)
+            new_ids.append(doc_id)
+    removed_ids = sorted(existing_ids - set(ids))
+    reused = len(ids) - len(new_ids)
+    return new_texts, new_metadatas, new_ids, removed_ids, reused
+
+
+def _update_status(organisation_id: str, reused: int, added: int, removed: int) -> Dict[str, Any]:
+    return {
+            "status": True,
+            "organisation_id": organisation_id,
+            "ai_embeddings_status": "Completed",
+            "ai_embeddings_reason": (
+                f"Embeddings of organisation id: {organisation_id} is updated successfully "
+                f"(reused: {reused}, added: {added}, removed: {removed})"
+            )
+        }
 
-register_adapter(uuid.UUID, adapt_uuid)
 
 class VectorStorePostgresVector:
     def __init__(self, collection_name: str, embeddings: Any) -> None:
@@ -28,56 +151,245 @@ class VectorStorePostgresVector:
         Args:
             collection_name (str): The name of the collection.
             embeddings (Any): The embeddings function.
-            connection_settings (str): The connection settings for the database.
         """
         self.collection_name: str = collection_name
-        self.connection: str = CONNECTION_SETTINGS
         self.embeddings: Any = embeddings
+        self._vector_db: Optional[PGVector] = None
+        self._async_vector_db: Optional[PGVector] = None
 
     def get_or_create_collection(self) -> PGVector:
         """
-        Retrieves an existing collection or creates a new one.
+        Retrieves an existing collection or creates a new one. The PGVector instance is
+        built once per object, so the extension/collection setup only runs on first use.
+        The ANN index is created if missing; the shared engine applies the search settings.
 
         Returns:
             PGVector: The PGVector collection.
         """
-        return PGVector(
-                        embeddings=self.embeddings,
-                        collection_name=self.collection_name,
-                        connection=CONNECTION_SETTINGS,
-                        use_jsonb=True,
-                        create_extension=True
-                    )
+        if self._vector_db is None:
+            engine = get_engine()
+            self._vector_db = OrganisationPGVector(
+                            embeddings=self.embeddings,
+                            collection_name=self.collection_name,
+                            connection=engine,
+                            use_jsonb=True,
+                            create_extension=True
+                        )
+            _ensure_vector_index()
+        return self._vector_db
+
+    async def aget_or_create_collection(self) -> PGVector:
+        """
+        Retrieves an existing collection or creates a new one, bound to the async engine.
+
+        Returns:
+            PGVector: The PGVector collection in async mode.
+        """
+        if self._async_vector_db is None:
+            engine = await get_async_engine()
+            self._async_vector_db = OrganisationPGVector(
+                            embeddings=self.embeddings,
+                            collection_name=self.collection_name,
+                            connection=engine,
+                            use_jsonb=True,
+                            create_extension=True,
+                            async_mode=True
+                        )
+            await asyncio.to_thread(_ensure_vector_index)
+        return self._async_vector_db
+
+    def _prepare_docs(
+                self, organisation_id: str, docs: List[Any], first_ordinal: int = 0,
+            ) -> Tuple[List[str], List[Dict[str, Any]], List[str]]:
+        """Build texts, metadatas (with the chunk's token count and position) and content-hash ids for the chunks, dropping duplicate chunks."""
+        texts: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+        ids: List[str] = []
+        seen = set()
+
+        for ordinal, doc in enumerate(docs, start=first_ordinal):
+            doc_id = chunk_id(organisation_id, doc.page_content)
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            metadata: Dict[str, Any] = {
+                **doc.metadata,
+                'id': organisation_id,
+                'tokens': count_tokens(doc.page_content),
+                'ordinal': ordinal,
+            }
+            doc.metadata = metadata
+            texts.append(doc.page_content)
+            metadatas.append(doc.metadata)
+            ids.append(doc_id)
+        return texts, metadatas, ids
+
+    def _embed_in_batches(self, texts: List[str], organisation_id: Optional[str] = None) -> List[List[float]]:
+        embeddings: List[List[float]] = []
+        with ingestion_stage("embedding", organisation_id), scheduling_organisation(organisation_id):
+            for batch in _batches(texts, EMBEDDING_BATCH_SIZE):
+                embeddings.extend(self.embeddings.embed_documents(batch))
+        return embeddings
+
+    async def _aembed_in_batches(self, texts: List[str], organisation_id: Optional[str] = None) -> List[List[float]]:
+        semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self.embeddings.aembed_documents(batch)
+
+        # The batch tasks inherit the organisation, which the model scheduler limits per organisation.
+        with ingestion_stage("embedding", organisation_id), scheduling_organisation(organisation_id):
+            results = await asyncio.gather(*(embed_batch(batch) for batch in _batches(texts, EMBEDDING_BATCH_SIZE)))
+        return [embedding for batch in results for embedding in batch]
+
+    def _insert_in_batches(
+                self, vector_db: PGVector, texts: List[str], embeddings: List[List[float]],
+                metadatas: List[Dict[str, Any]], ids: List[str], organisation_id: Optional[str] = None,
+            ) -> None:
+        with ingestion_stage("vector_insert", organisation_id):
+            for start in range(0, len(texts), VECTOR_INSERT_BATCH_SIZE):
+                end = start + VECTOR_INSERT_BATCH_SIZE
+                vector_db.add_embeddings(texts[start:end], embeddings[start:end], metadatas[start:end], ids=ids[start:end])
+
+    async def _ainsert_in_batches(
+                self, vector_db: PGVector, texts: List[str], embeddings: List[List[float]],
+                metadatas: List[Dict[str, Any]], ids: List[str], organisation_id: Optional[str] = None,
+            ) -> None:
+        with ingestion_stage("vector_insert", organisation_id):
+            for start in range(0, len(texts), VECTOR_INSERT_BATCH_SIZE):
+                end = start + VECTOR_INSERT_BATCH_SIZE
+                await vector_db.aadd_embeddings(texts[start:end], embeddings[start:end], metadatas[start:end], ids=ids[start:end])
+
+    def _renumber_chunks(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Store the current position of chunks that were reused from an earlier version."""
+        if ids:
+            with get_connection_pool().connection() as db:
+                db.execute(RENUMBER_CHUNKS_QUERY, (ids, [metadata['ordinal'] for metadata in metadatas]))
+
+    async def _arenumber_chunks(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Store the current position of chunks that were reused from an earlier version, using the async pool."""
+        if ids:
+            pool = await get_async_connection_pool()
+            async with pool.connection() as db:
+                await db.execute(RENUMBER_CHUNKS_QUERY, (ids, [metadata['ordinal'] for metadata in metadatas]))
 
     def store_docs_to_collection(self, organisation_id: str, docs: List[Any]) -> bool:
         """
         Stores documents into the vector store collection.
 
         Args:
-            document_id (str): The ID of the document.
-            docs (List[Any]): The list of documents to store.
-            document_path (str): The path to the document.
+            organisation_id (str): The ID of the organisation.
+            docs (List[Any]): The list of chunks to store.
 
         Returns:
             bool: True if documents are stored successfully.
         """
         try:
             vector_db = self.get_or_create_collection()
+            texts, metadatas, ids = self._prepare_docs(organisation_id, docs)
+            embeddings = self._embed_in_batches(texts, organisation_id)
+            self._insert_in_batches(vector_db, texts, embeddings, metadatas, ids, organisation_id)
+            return {
+                    "status": True,
+                    "organisation_id": organisation_id,
+                    "ai_embeddings_status": "Completed",
+                    "ai_embeddings_reason": f"Embeddings of organisation id: {organisation_id} is generated successfully"
+                }
+        except Exception as e:
+            return {
+                    "status": False,
+                    "organisation_id": organisation_id,
+                    "ai_embeddings_status": "Failed",
+                    "ai_embeddings_reason": f"{e}"
+                }
 
-            texts: List[str] = []
-            metadatas: List[Dict[str, Any]] = []
-            ids: List[str] = []
+    def get_organisation_chunk_ids(self, organisation_id: str) -> List[str]:
+        """Return the ids of the chunks currently stored for an organisation."""
+        with get_connection_pool().connection() as db:
+            cursor = db.execute(ORGANISATION_CHUNK_IDS_QUERY, (self.collection_name, organisation_containment(organisation_id)))
+            return [row[0] for row in cursor.fetchall()]
+
+    def update_docs_in_collection(self, organisation_id: str, docs: List[Any]) -> Dict[str, Any]:
+        """
+        Brings the stored chunks of an organisation in line with ``docs``: only chunks whose
+        content hash is new get embedded, chunks that disappeared are deleted and the rest are kept.
+
+        Args:
+            organisation_id (str): The ID of the organisation.
+            docs (List[Any]): The full, current list of chunks of the organisation.
 
-            for doc in docs:
-                metadata: Dict[str, Any] = {
-                    'id': organisation_id
+        Returns:
+            Dict[str, Any]: The embedding status, including reused/added/removed chunk counts.
+        """
+        try:
+            vector_db = self.get_or_create_collection()
+            existing_ids = set(self.get_organisation_chunk_ids(organisation_id))
+            texts, metadatas, ids = self._prepare_docs(organisation_id, docs)
+            new_texts, new_metadatas, new_ids, removed_ids, reused = _diff_chunks(texts, metadatas, ids, existing_ids)
+
+            embeddings = self._embed_in_batches(new_texts, organisation_id)
+            self._insert_in_batches(vector_db, new_texts, embeddings, new_metadatas, new_ids, organisation_id)
+            self._renumber_chunks(ids, metadatas)
+            if removed_ids:
+                with get_connection_pool().connection() as db:
+                    db.execute(DELETE_CHUNKS_QUERY, (removed_ids,))
+            return _update_status(organisation_id, reused, len(new_ids), len(removed_ids))
+        except Exception as e:
+            return {
+                    "status": False,
+                    "organisation_id": organisation_id,
+                    "ai_embeddings_status": "Failed",
+                    "ai_embeddings_reason": f"{e}"
                 }
-                doc.metadata = metadata
-                texts.append(doc.page_content)
-                metadatas.append(doc.metadata)
-                ids.append(f"{organisation_id}")
 
-            vector_db.add_texts(texts, metadatas, ids=ids)
+    def delete_documents_from_collection(self, organisation_id: str) -> None:
+        """
+        Deletes every chunk of an organisation from the collection.
+
+        Args:
+            organisation_id (str): The ID of the organisation to delete.
+        """
+        with get_connection_pool().connection() as db:
+            db.execute(DELETE_ORGANISATION_QUERY, (self.collection_name, organisation_containment(organisation_id)))
+
+    def check_if_record_exist(self, organisation_id: str) -> Dict[str, bool]:
+        """
+        Checks if any chunk of the given organisation exists in the database.
+
+        Args:
+            organisation_id (str): The ID of the organisation to check.
+
+        Returns:
+            Dict[str, bool]: A dictionary indicating whether the record exists.
+        """
+        is_rec_exist: bool = False
+        try:
+            with get_connection_pool().connection() as db:
+                cursor = db.cursor()
+                cursor.execute(RECORD_EXISTS_QUERY, (organisation_containment(organisation_id),))
+                record = cursor.fetchone()
+                is_rec_exist = record[0] if record else False
+        except Exception as e:
+            LOGGER.warning("Error checking record existence: %s", e)
+        return {"is_rec_exist": is_rec_exist}
+
+    async def astore_docs_to_collection(self, organisation_id: str, docs: List[Any]) -> bool:
+        """
+        Stores documents into the vector store collection using the async engine.
+
+        Args:
+            organisation_id (str): The ID of the organisation.
+            docs (List[Any]): The list of chunks to store.
+
+        Returns:
+            bool: True if documents are stored successfully.
+        """
+        try:
+            vector_db = await self.aget_or_create_collection()
+            texts, metadatas, ids = self._prepare_docs(organisation_id, docs)
+            embeddings = await self._aembed_in_batches(texts, organisation_id)
+            await self._ainsert_in_batches(vector_db, texts, embeddings, metadatas, ids, organisation_id)
             return {
                     "status": True,
                     "organisation_id": organisation_id,
@@ -92,37 +404,273 @@ class VectorStorePostgresVector:
                     "ai_embeddings_reason": f"{e}"
                 }
 
-    def delete_documents_from_collection(self, organisation_id: str) -> None:
+    async def aget_organisation_chunk_ids(self, organisation_id: str) -> List[str]:
+        """Return the ids of the chunks currently stored for an organisation, using the async pool."""
+        pool = await get_async_connection_pool()
+        async with pool.connection() as db:
+            cursor = await db.execute(ORGANISATION_CHUNK_IDS_QUERY, (self.collection_name, organisation_containment(organisation_id)))
+            return [row[0] for row in await cursor.fetchall()]
+
+    async def aupdate_docs_in_collection(self, organisation_id: str, docs: List[Any]) -> Dict[str, Any]:
         """
-        Deletes documents from the collection.
+        Async version of ``update_docs_in_collection``.
 
         Args:
-            document_id (str): The ID of the document to delete.
+            organisation_id (str): The ID of the organisation.
+            docs (List[Any]): The full, current list of chunks of the organisation.
+
+        Returns:
+            Dict[str, Any]: The embedding status, including reused/added/removed chunk counts.
         """
-        vector_db = self.get_or_create_collection()
-        vector_db.delete([organisation_id])
+        try:
+            vector_db = await self.aget_or_create_collection()
+            existing_ids = set(await self.aget_organisation_chunk_ids(organisation_id))
+            texts, metadatas, ids = self._prepare_docs(organisation_id, docs)
+            new_texts, new_metadatas, new_ids, removed_ids, reused = _diff_chunks(texts, metadatas, ids, existing_ids)
 
-    def check_if_record_exist(self, organisation_id: str) -> Dict[str, bool]:
+            embeddings = await self._aembed_in_batches(new_texts, organisation_id)
+            await self._ainsert_in_batches(vector_db, new_texts, embeddings, new_metadatas, new_ids, organisation_id)
+            await self._arenumber_chunks(ids, metadatas)
+            if removed_ids:
+                pool = await get_async_connection_pool()
+                async with pool.connection() as db:
+                    await db.execute(DELETE_CHUNKS_QUERY, (removed_ids,))
+            return _update_status(organisation_id, reused, len(new_ids), len(removed_ids))
+        except Exception as e:
+            return {
+                    "status": False,
+                    "organisation_id": organisation_id,
+                    "ai_embeddings_status": "Failed",
+                    "ai_embeddings_reason": f"{e}"
+                }
+
+    async def astore_doc_stream(self, organisation_id: str, doc_batches: AsyncIterator[List[Any]]) -> Dict[str, Any]:
         """
-        Checks if a record with the given document ID exists in the database.
+        ``aupdate_docs_in_collection`` for chunks that arrive in batches, so the full chunk list of
+        a very large organisation never has to be held in memory. Each batch is diffed against the
+        stored chunk ids, its new chunks are embedded and inserted, and chunks that did not show up
+        in the stream are deleted once it is exhausted.
 
         Args:
-            document_id (str): The ID of the document to check.
+            organisation_id (str): The ID of the organisation.
+            doc_batches (AsyncIterator[List[Any]]): The full, current chunks of the organisation, in batches.
+
+        Returns:
+            Dict[str, Any]: The embedding status, including reused/added/removed chunk counts.
+
+        Raises:
+            Exception: Whatever the stream or the embedding raised. Chunks added by this call are removed first.
+        """
+        vector_db = await self.aget_or_create_collection()
+        existing_ids = set(await self.aget_organisation_chunk_ids(organisation_id))
+        seen_ids: set = set()
+        added_ids: List[str] = []
+        reused = 0
+        ordinal = 0
+        pool = await get_async_connection_pool()
+        try:
+            async for docs in doc_batches:
+                texts, metadatas, ids = self._prepare_docs(organisation_id, docs, first_ordinal=ordinal)
+                ordinal += len(docs)
+                fresh = [index for index, doc_id in enumerate(ids) if doc_id not in seen_ids]
+                seen_ids.update(ids)
+                fresh_metadatas = [metadatas[index] for index in fresh]
+                fresh_ids = [ids[index] for index in fresh]
+                new_texts, new_metadatas, new_ids, _, batch_reused = _diff_chunks(
+                    [texts[index] for index in fresh], fresh_metadatas, fresh_ids, existing_ids,
+                )
+                reused += batch_reused
+                if new_texts:
+                    embeddings = await self._aembed_in_batches(new_texts, organisation_id)
+                    await self._ainsert_in_batches(vector_db, new_texts, embeddings, new_metadatas, new_ids, organisation_id)
+                    added_ids.extend(new_ids)
+                await self._arenumber_chunks(fresh_ids, fresh_metadatas)
+        except Exception:
+            if added_ids:
+                async with pool.connection() as db:
+                    await db.execute(DELETE_CHUNKS_QUERY, (added_ids,))
+            raise
+
+        removed_ids = sorted(existing_ids - seen_ids)
+        if removed_ids:
+            async with pool.connection() as db:
+                await db.execute(DELETE_CHUNKS_QUERY, (removed_ids,))
+        return _update_status(organisation_id, reused, len(added_ids), len(removed_ids))
+
+    async def aget_organisations_chunk_ids(self, organisation_ids: List[str]) -> Dict[str, set]:
+        """Return the stored chunk ids of many organisations, fetched in one pipelined round trip."""
+        existing: Dict[str, set] = {}
+        pool = await get_async_connection_pool()
+        async with pool.connection() as db:
+            async with db.cursor() as cursor:
+                await cursor.executemany(
+                    ORGANISATION_CHUNK_IDS_QUERY,
+                    [(self.collection_name, organisation_containment(organisation_id)) for organisation_id in organisation_ids],
+                    returning=True,
+                )
+                for organisation_id in organisation_ids:
+                    existing[organisation_id] = {row[0] for row in await cursor.fetchall()}
+                    cursor.nextset()
+        return existing
+
+    async def abulk_update_collection(self, organisation_docs: Dict[str, List[Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        ``aupdate_docs_in_collection`` for many organisations at once: the new chunks of all
+        organisations share embedding batches and vector inserts, and removed chunks are deleted
+        with a single statement.
+
+        Args:
+            organisation_docs (Dict[str, List[Any]]): The full, current chunks of every organisation.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: The embedding status of every organisation.
+        """
+        try:
+            vector_db = await self.aget_or_create_collection()
+            existing = await self.aget_organisations_chunk_ids(list(organisation_docs))
+            texts: List[str] = []
+            metadatas: List[Dict[str, Any]] = []
+            ids: List[str] = []
+            current_metadatas: List[Dict[str, Any]] = []
+            current_ids: List[str] = []
+            removed_ids: List[str] = []
+            counts: Dict[str, Tuple[int, int, int]] = {}
+            for organisation_id, docs in organisation_docs.items():
+                org_texts, org_metadatas, org_ids = self._prepare_docs(organisation_id, docs)
+                new_texts, new_metadatas, new_ids, org_removed_ids, reused = _diff_chunks(
+                    org_texts, org_metadatas, org_ids, existing[organisation_id]
+                )
+                texts.extend(new_texts)
+                metadatas.extend(new_metadatas)
+                ids.extend(new_ids)
+                current_metadatas.extend(org_metadatas)
+                current_ids.extend(org_ids)
+                removed_ids.extend(org_removed_ids)
+                counts[organisation_id] = (reused, len(new_ids), len(org_removed_ids))
+
+            embeddings = await self._aembed_in_batches(texts)
+            await self._ainsert_in_batches(vector_db, texts, embeddings, metadatas, ids)
+            await self._arenumber_chunks(current_ids, current_metadatas)
+            if removed_ids:
+                pool = await get_async_connection_pool()
+                async with pool.connection() as db:
+                    await db.execute(DELETE_CHUNKS_QUERY, (removed_ids,))
+            return {
+                organisation_id: _update_status(organisation_id, reused, added, removed)
+                for organisation_id, (reused, added, removed) in counts.items()
+            }
+        except Exception as e:
+            return {
+                organisation_id: {
+                    "status": False,
+                    "organisation_id": organisation_id,
+                    "ai_embeddings_status": "Failed",
+                    "ai_embeddings_reason": f"{e}"
+                }
+                for organisation_id in organisation_docs
+            }
+
+    async def adelete_documents_from_collection(self, organisation_id: str) -> None:
+        """
+        Deletes every chunk of an organisation from the collection, using the async pool.
+
+        Args:
+            organisation_id (str): The ID of the organisation to delete.
+        """
+        pool = await get_async_connection_pool()
+        async with pool.connection() as db:
+            await db.execute(DELETE_ORGANISATION_QUERY, (self.collection_name, organisation_containment(organisation_id)))
+
+    async def acheck_if_record_exist(self, organisation_id: str) -> Dict[str, bool]:
+        """
+        Checks if any chunk of the given organisation exists, using the async pool.
+
+        Args:
+            organisation_id (str): The ID of the organisation to check.
 
         Returns:
             Dict[str, bool]: A dictionary indicating whether the record exists.
         """
         is_rec_exist: bool = False
         try:
-            with psycopg2.connect(host=DBHOST, database=DBNAME, user=DBUSER, password=DBPW) as db:
+            pool = await get_async_connection_pool()
+            async with pool.connection() as db:
                 cursor = db.cursor()
-                cursor.execute("SELECT EXISTS (SELECT 1 FROM langchain_pg_embedding WHERE id = %s LIMIT 1)", (organisation_id,))
-                record = cursor.fetchone()
+                await cursor.execute(RECORD_EXISTS_QUERY, (organisation_containment(organisation_id),))
+                record = await cursor.fetchone()
                 is_rec_exist = record[0] if record else False
         except Exception as e:
-            print(f"Error checking record existence: {e}")
+            LOGGER.warning("Error checking record existence: %s", e)
         return {"is_rec_exist": is_rec_exist}
 
+    def get_organisation_token_count(self, organisation_id: str) -> Dict[str, int]:
+        """
+        Totals the token counts stored in the chunk metadata of an organisation.
+
+        Args:
+            organisation_id (str): The ID of the organisation.
+
+        Returns:
+            Dict[str, int]: The total number of tokens and of chunks.
+        """
+        with get_connection_pool().connection() as db:
+            tokens, chunks = db.execute(ORGANISATION_TOKENS_QUERY, (self.collection_name, organisation_containment(organisation_id))).fetchone()
+        return {"tokens": int(tokens), "chunks": chunks}
+
+    async def aget_organisation_token_count(self, organisation_id: str) -> Dict[str, int]:
+        """
+        Totals the token counts stored in the chunk metadata of an organisation, using the async pool.
+
+        Args:
+            organisation_id (str): The ID of the organisation.
+
+        Returns:
+            Dict[str, int]: The total number of tokens and of chunks.
+        """
+        pool = await get_async_connection_pool()
+        async with pool.connection() as db:
+            cursor = await db.execute(ORGANISATION_TOKENS_QUERY, (self.collection_name, organisation_containment(organisation_id)))
+            tokens, chunks = await cursor.fetchone()
+        return {"tokens": int(tokens), "chunks": chunks}
+
+    def get_full_context(self, organisation_id: str, max_tokens: int) -> Optional[List[Document]]:
+        """
+        Returns every chunk of an organisation if together they fit in ``max_tokens``.
+
+        Args:
+            organisation_id (str): The ID of the organisation.
+            max_tokens (int): The token budget of the context.
+
+        Returns:
+            Optional[List[Document]]: All chunks of the organisation, or None if they do not fit or there are none.
+        """
+        count = self.get_organisation_token_count(organisation_id)
+        if not count["chunks"] or count["tokens"] > max_tokens:
+            return None
+        with get_connection_pool().connection() as db:
+            rows = db.execute(ORGANISATION_CHUNKS_QUERY, (self.collection_name, organisation_containment(organisation_id))).fetchall()
+        return [Document(id=row[0], page_content=row[1], metadata=row[2] or {}) for row in rows]
+
+    async def aget_full_context(self, organisation_id: str, max_tokens: int) -> Optional[List[Document]]:
+        """
+        Returns every chunk of an organisation if together they fit in ``max_tokens``, using the async pool.
+
+        Args:
+            organisation_id (str): The ID of the organisation.
+            max_tokens (int): The token budget of the context.
+
+        Returns:
+            Optional[List[Document]]: All chunks of the organisation, or None if they do not fit or there are none.
+        """
+        count = await self.aget_organisation_token_count(organisation_id)
+        if not count["chunks"] or count["tokens"] > max_tokens:
+            return None
+        pool = await get_async_connection_pool()
+        async with pool.connection() as db:
+            cursor = await db.execute(ORGANISATION_CHUNKS_QUERY, (self.collection_name, organisation_containment(organisation_id)))
+            rows = await cursor.fetchall()
+        return [Document(id=row[0], page_content=row[1], metadata=row[2] or {}) for row in rows]
+
     # def delete_file_embeddings_from_collection(self, pdf_id: str) -> Dict[str, bool]:
     #     """
     #     Deletes file embeddings associated with the given PDF ID.
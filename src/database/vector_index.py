@@ -0,0 +1,196 @@
+import os
+import logging
+import argparse
+import psycopg
+from dotenv import load_dotenv
+from sqlalchemy import event
+from typing import Any, Dict, List, Tuple
+from src.database.connection_pool import CONNINFO
+
+load_dotenv()
+
+LOGGER = logging.getLogger(__name__)
+
+DIMENSION = int(os.getenv("DIMENSION", 768))
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw")
+VECTOR_INDEX_NAME = "ix_langchain_pg_embedding_embedding"
+HNSW_M = int(os.getenv("HNSW_M", 16))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 64))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 100))
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", 100))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", 10))
+# pgvector >= 0.8 keeps scanning the index until enough rows pass the organisation filter.
+VECTOR_ITERATIVE_SCAN = os.getenv("VECTOR_ITERATIVE_SCAN", "relaxed_order")
+
+COLUMN_DIMENSION_QUERY = """
+    SELECT atttypmod
+    FROM pg_attribute
+    WHERE attrelid = to_regclass('langchain_pg_embedding')
+      AND attname = 'embedding'
+"""
+SET_COLUMN_DIMENSION_QUERY = "ALTER TABLE langchain_pg_embedding ALTER COLUMN embedding TYPE vector({dimension})"
+INDEX_DEFINITION_QUERY = "SELECT indexdef FROM pg_indexes WHERE tablename = 'langchain_pg_embedding' AND indexname = %s"
+DROP_INDEX_QUERY = "DROP INDEX CONCURRENTLY IF EXISTS {name}"
+INVALID_INDEX_QUERY = "SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)"
+REINDEX_QUERY = "REINDEX INDEX CONCURRENTLY {name}"
+ANALYZE_QUERY = "ANALYZE langchain_pg_embedding"
+
+
+def index_options() -> Dict[str, int]:
+    """Build parameters of the configured index type."""
+    if VECTOR_INDEX_TYPE == "hnsw":
+        return {"m": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION}
+    if VECTOR_INDEX_TYPE == "ivfflat":
+        return {"lists": IVFFLAT_LISTS}
+    raise ValueError(f"Unsupported VECTOR_INDEX_TYPE: {VECTOR_INDEX_TYPE}")
+
+
+def create_index_statement() -> str:
+    """CREATE INDEX statement for the configured index type, using cosine distance like PGVector."""
+    options = ", ".join(f"{name} = {value}" for name, value in index_options().items())
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {VECTOR_INDEX_NAME} ON langchain_pg_embedding "
+        f"USING {VECTOR_INDEX_TYPE} (embedding vector_cosine_ops) WITH ({options})"
+    )
+
+
+def search_settings() -> List[Tuple[str, str]]:
+    """Session settings applied to every connection that runs similarity searches."""
+    if VECTOR_INDEX_TYPE == "hnsw":
+        settings = [("hnsw.ef_search", str(HNSW_EF_SEARCH))]
+    elif VECTOR_INDEX_TYPE == "ivfflat":
+        settings = [("ivfflat.probes", str(IVFFLAT_PROBES))]
+    else:
+        return []
+    if VECTOR_ITERATIVE_SCAN:
+        settings.append((f"{VECTOR_INDEX_TYPE}.iterative_scan", VECTOR_ITERATIVE_SCAN))
+    return settings
+
+
+def _apply_search_settings(dbapi_connection: Any, connection_record: Any) -> None:
+    for name, value in search_settings():
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT set_config(%s, %s, false)", (name, value))
+            dbapi_connection.commit()
+        except Exception as e:
+            # e.g. iterative_scan on a pgvector older than 0.8; the search still works without it.
+            dbapi_connection.rollback()
+            LOGGER.warning("Could not apply %s=%s: %s", name, value, e)
+        finally:
+            cursor.close()
+
+
+def register_search_settings(engine: Any) -> None:
+    """Apply the ef_search / probes settings to every new connection of a (sync or async) SQLAlchemy engine."""
+    target = getattr(engine, "sync_engine", engine)
+    if not event.contains(target, "connect", _apply_search_settings):
+        event.listen(target, "connect", _apply_search_settings)
+
+
+def drop_invalid_index(conn: psycopg.Connection, name: str) -> bool:
+    """
+    Drop an index left INVALID by a failed or interrupted CREATE INDEX CONCURRENTLY.
+
+    Such an index is never used by the planner, and ``CREATE INDEX ... IF NOT EXISTS`` skips it,
+    so it would otherwise stay broken for good.
+
+    Args:
+        conn (psycopg.Connection): An autocommit connection.
+        name (str): Name of the index.
+
+    Returns:
+        bool: True if an invalid index was dropped.
+    """
+    row = conn.execute(INVALID_INDEX_QUERY, (name,)).fetchone()
+    if row is None or not row[0]:
+        return False
+    LOGGER.warning("Dropping invalid index %s left by a failed build", name)
+    conn.execute(DROP_INDEX_QUERY.format(name=name))
+    return True
+
+
+def ensure_vector_index(allow_rewrite: bool = False) -> bool:
+    """
+    Create the ANN index on langchain_pg_embedding.embedding if it does not exist.
+
+    pgvector can only index a column with a fixed dimension, while PGVector creates ``vector``
+    without one. Setting the dimension rewrites the table, so it is only done when allowed.
+
+    Args:
+        allow_rewrite (bool): Whether to ALTER an untyped embedding column to vector(DIMENSION).
+
+    Returns:
+        bool: True if the index exists after the call.
+    """
+    with psycopg.connect(CONNINFO, autocommit=True) as conn:
+        row = conn.execute(COLUMN_DIMENSION_QUERY).fetchone()
+        if row is None:
+            return False
+        if row[0] != DIMENSION:
+            if not allow_rewrite:
+                LOGGER.warning(
+                    "langchain_pg_embedding.embedding has no fixed dimension, run "
+                    "`python -m src.database.vector_index create` to index it."
+                )
+                return False
+            LOGGER.info("Setting langchain_pg_embedding.embedding to vector(%s)", DIMENSION)
+            conn.execute(SET_COLUMN_DIMENSION_QUERY.format(dimension=DIMENSION))
+        drop_invalid_index(conn, VECTOR_INDEX_NAME)
+        conn.execute(create_index_statement())
+        return True
+
+
+def _matches_configuration(definition: str) -> bool:
+    # pg_indexes renders the options as WITH (m='16', ef_construction='64').
+    return f"USING {VECTOR_INDEX_TYPE} " in definition and all(
+        f"{name}='{value}'" in definition for name, value in index_options().items()
+    )
+
+
+def rebuild_vector_index() -> None:
+    """Rebuild the ANN index, e.g. after a bulk ingestion. IVFFlat lists are recomputed from the current rows."""
+    with psycopg.connect(CONNINFO, autocommit=True) as conn:
+        conn.execute(ANALYZE_QUERY)
+        definition = conn.execute(INDEX_DEFINITION_QUERY, (VECTOR_INDEX_NAME,)).fetchone()
+        if definition is not None and _matches_configuration(definition[0]):
+            LOGGER.info("Reindexing %s", VECTOR_INDEX_NAME)
+            conn.execute(REINDEX_QUERY.format(name=VECTOR_INDEX_NAME))
+            return
+    # The index type or its build parameters changed, so it has to be created again.
+    with psycopg.connect(CONNINFO, autocommit=True) as conn:
+        LOGGER.info("Recreating %s", VECTOR_INDEX_NAME)
+        conn.execute(DROP_INDEX_QUERY.format(name=VECTOR_INDEX_NAME))
+    ensure_vector_index(allow_rewrite=True)
+
+
+def vector_index_status() -> Dict[str, Any]:
+    """Current index definition, column dimension and the search settings applied to new connections."""
+    with psycopg.connect(CONNINFO, autocommit=True) as conn:
+        definition = conn.execute(INDEX_DEFINITION_QUERY, (VECTOR_INDEX_NAME,)).fetchone()
+        row = conn.execute(COLUMN_DIMENSION_QUERY).fetchone()
+    return {
+        "index": definition[0] if definition else None,
+        "column_dimension": row[0] if row and row[0] > 0 else None,
+        "search_settings": dict(search_settings()),
+    }
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+    )
+    parser = argparse.ArgumentParser(description="Manage the ANN index on langchain_pg_embedding.")
+    parser.add_argument("command", choices=["create", "rebuild", "status"])
+    args = parser.parse_args()
+
+    if args.command == "create":
+        ensure_vector_index(allow_rewrite=True)
+    elif args.command == "rebuild":
+        rebuild_vector_index()
+    LOGGER.info("%s", vector_index_status())
+
+
+if __name__ == "__main__":
+    main()
@@ -2,38 +2,247 @@ import os
 import uuid
 import logging
 import psycopg
+from psycopg import sql
+from typing import Any, List, Optional, Sequence
 from dotenv import load_dotenv
+from langchain_core.messages import BaseMessage, SystemMessage, messages_from_dict
 from langchain_postgres import PostgresChatMessageHistory
+from src.monitoring.metrics import chatbot_stage
+from src.organisation_prompts.prompts import SUMMARY_PROMPT
+from src.database.connection_pool import get_async_connection_pool, get_connection_pool
 
 load_dotenv()
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-)
 logger = logging.getLogger(__name__)
-load_dotenv()
 
-DBNAME = os.getenv("DBNAME")
-DBUSER = os.getenv("DBUSER")
-DBPW = os.getenv("DBPW")
-DBHOST = os.getenv("DBHOST")
-DBPORT = os.getenv("DBPORT")
-CHATHISTORY_SETTINGS = f"postgresql://{DBUSER}:{DBPW}@{DBHOST}:{DBPORT}/{DBNAME}"
+# "last_n" keeps the newest HISTORY_MAX_MESSAGES messages, "token_budget" additionally stops once
+# HISTORY_TOKEN_BUDGET (approximate, 4 characters per token) is used up, "full" loads everything.
+HISTORY_STRATEGY = os.getenv("HISTORY_STRATEGY", "last_n")
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", 20))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 2000))
+HISTORY_SUMMARY_ENABLED = os.getenv("HISTORY_SUMMARY_ENABLED", "false").lower() == "true"
+HISTORY_SUMMARY_MIN_MESSAGES = int(os.getenv("HISTORY_SUMMARY_MIN_MESSAGES", 10))
 
 table_name = "message_store"
-PostgresChatMessageHistory.create_tables(psycopg.connect(CHATHISTORY_SETTINGS), table_name)
+summary_table_name = "message_store_summary"
+# Both tables are created by src.database.migrations.
+
+LAST_N_MESSAGES_QUERY = sql.SQL(
+    """
+    SELECT message FROM (
+        SELECT id, message FROM {table_name}
+        WHERE session_id = %(session_id)s
+        ORDER BY id DESC
+        LIMIT %(limit)s
+    ) recent
+    ORDER BY id
+    """
+).format(table_name=sql.Identifier(table_name))
+TOKEN_BUDGET_MESSAGES_QUERY = sql.SQL(
+    """
+    SELECT message FROM (
+        SELECT id, message,
+               SUM(length(message->'data'->>'content') / 4 + 4) OVER (ORDER BY id DESC) AS running_tokens
+        FROM {table_name}
+        WHERE session_id = %(session_id)s
+        ORDER BY id DESC
+        LIMIT %(limit)s
+    ) recent
+    WHERE running_tokens <= %(budget)s
+    ORDER BY id
+    """
+).format(table_name=sql.Identifier(table_name))
+SELECT_SUMMARY_QUERY = sql.SQL(
+    "SELECT summary, summarised_until_id FROM {summary_table} WHERE session_id = %(session_id)s"
+).format(summary_table=sql.Identifier(summary_table_name))
+UNSUMMARISED_MESSAGES_QUERY = sql.SQL(
+    """
+    SELECT id, message FROM {table_name}
+    WHERE session_id = %(session_id)s
+      AND id > %(summarised_until_id)s
+      AND id < (
+          SELECT COALESCE(MIN(id), 0) FROM (
+              SELECT id FROM {table_name}
+              WHERE session_id = %(session_id)s
+              ORDER BY id DESC
+              LIMIT %(limit)s
+          ) window_ids
+      )
+    ORDER BY id
+    """
+).format(table_name=sql.Identifier(table_name))
+UPSERT_SUMMARY_QUERY = sql.SQL(
+    """
+    INSERT INTO {summary_table} (session_id, summary, summarised_until_id, updated_at)
+    VALUES (%(session_id)s, %(summary)s, %(summarised_until_id)s, NOW())
+    ON CONFLICT (session_id)
+    DO UPDATE SET summary = EXCLUDED.summary,
+                  summarised_until_id = EXCLUDED.summarised_until_id,
+                  updated_at = NOW()
+    """
+).format(summary_table=sql.Identifier(summary_table_name))
+
+
+def _window_query() -> tuple:
+    params = {"limit": HISTORY_MAX_MESSAGES, "budget": HISTORY_TOKEN_BUDGET}
+    if HISTORY_STRATEGY == "token_budget":
+        return TOKEN_BUDGET_MESSAGES_QUERY, params
+    return LAST_N_MESSAGES_QUERY, params
+
+
+def _summary_message(summary: str) -> SystemMessage:
+    return SystemMessage(content=f"Summary of the earlier conversation: {summary}")
+
+
+class WindowedPostgresChatMessageHistory(PostgresChatMessageHistory):
+    """PostgresChatMessageHistory that only loads the configured window of recent messages,
+    preceded by the rolling summary of older messages when summarisation is enabled.
+    Loads and writes are timed as the history_load and history_write chatbot stages."""
+
+    def __init__(self, *args: Any, organisation_id: Optional[str] = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.organisation_id = organisation_id
+
+    def get_messages(self) -> List[BaseMessage]:
+        with chatbot_stage("history_load", self.organisation_id):
+            return self._get_window()
+
+    async def aget_messages(self) -> List[BaseMessage]:
+        with chatbot_stage("history_load", self.organisation_id):
+            return await self._aget_window()
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        with chatbot_stage("history_write", self.organisation_id):
+            super().add_messages(messages)
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        with chatbot_stage("history_write", self.organisation_id):
+            await super().aadd_messages(messages)
+
+    def _get_window(self) -> List[BaseMessage]:
+        if HISTORY_STRATEGY == "full":
+            return super().get_messages()
+        query, params = _window_query()
+        params["session_id"] = self._session_id
+        with self._connection.cursor() as cursor:
+            cursor.execute(query, params)
+            items = [record[0] for record in cursor.fetchall()]
+            summary = None
+            if HISTORY_SUMMARY_ENABLED:
+                try:
+                    cursor.execute(SELECT_SUMMARY_QUERY, {"session_id": self._session_id})
+                    summary = cursor.fetchone()
+                except psycopg.errors.UndefinedTable:
+                    self._connection.rollback()
+        messages = messages_from_dict(items)
+        return [_summary_message(summary[0])] + messages if summary else messages
+
+    async def _aget_window(self) -> List[BaseMessage]:
+        if HISTORY_STRATEGY == "full":
+            return await super().aget_messages()
+        query, params = _window_query()
+        params["session_id"] = self._session_id
+        async with self._aconnection.cursor() as cursor:
+            await cursor.execute(query, params)
+            items = [record[0] for record in await cursor.fetchall()]
+            summary = None
+            if HISTORY_SUMMARY_ENABLED:
+                try:
+                    await cursor.execute(SELECT_SUMMARY_QUERY, {"session_id": self._session_id})
+                    summary = await cursor.fetchone()
+                except psycopg.errors.UndefinedTable:
+                    await self._aconnection.rollback()
+        messages = messages_from_dict(items)
+        return [_summary_message(summary[0])] + messages if summary else messages
+
+
+async def aupdate_rolling_summary(organisation_id: str, chat_model: Any) -> None:
+    """Fold messages that have dropped out of the history window into the session's rolling summary.
+
+    Does nothing until at least HISTORY_SUMMARY_MIN_MESSAGES unsummarised messages sit outside
+    the window, so the summarisation call is made once per batch rather than once per turn.
+    """
+    session_id = uuid.UUID(organisation_id.replace('-', '').ljust(32, '0'))
+    pool = await get_async_connection_pool()
+    async with pool.connection() as connection:
+        cursor = await connection.execute(SELECT_SUMMARY_QUERY, {"session_id": session_id})
+        row = await cursor.fetchone()
+        summary, summarised_until_id = row if row else ("", 0)
+        cursor = await connection.execute(UNSUMMARISED_MESSAGES_QUERY, {
+            "session_id": session_id,
+            "summarised_until_id": summarised_until_id,
+            "limit": HISTORY_MAX_MESSAGES,
+        })
+        rows = await cursor.fetchall()
+    if len(rows) < HISTORY_SUMMARY_MIN_MESSAGES:
+        return
+
+    # The model call happens outside the connection block so no pooled connection is held while waiting on it.
+    transcript = "\n".join(
+        f"{message.type}: {message.content}" for message in messages_from_dict([row[1] for row in rows])
+    )
+    result = await chat_model.ainvoke(SUMMARY_PROMPT.format(summary=summary or "(none)", transcript=transcript))
+    async with pool.connection() as connection:
+        await connection.execute(UPSERT_SUMMARY_QUERY, {
+            "session_id": session_id,
+            "summary": result.content,
+            "summarised_until_id": rows[-1][0],
+        })
+
 
 class ChatHistory:
     def __init__(self, organisation_id: str) -> None:
-        self.connection = psycopg.connect(CHATHISTORY_SETTINGS)
+        """
+        The message history of one organisation's session. Every read and write borrows a pooled
+        connection for just that statement, so none is held while the answer is being generated.
+        """
+        self.organisation_id = organisation_id
+        self.session_id = uuid.UUID(organisation_id.replace('-', '').ljust(32, '0'))
+
+    def _history(self, connection) -> WindowedPostgresChatMessageHistory:
+        return WindowedPostgresChatMessageHistory(
+            table_name,
+            str(self.session_id),
+            sync_connection=connection,
+            organisation_id=self.organisation_id,
+        )
+
+    def get_messages(self) -> List[BaseMessage]:
+        """Load the configured window of the session's history."""
+        with get_connection_pool().connection() as connection:
+            return self._history(connection).get_messages()
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """Append messages to the session's history."""
+        with get_connection_pool().connection() as connection:
+            self._history(connection).add_messages(messages)
+
+
+class AsyncChatHistory:
+    def __init__(self, organisation_id: str) -> None:
+        """
+        Async version of ``ChatHistory``; every read and write borrows a connection from the
+        shared async pool for just that statement.
+        """
+        self.organisation_id = organisation_id
         self.session_id = uuid.UUID(organisation_id.replace('-', '').ljust(32, '0'))
 
-    def session_based_chat_history(self):
-        """Retrieve the chat history for the session."""
-        chat_history = PostgresChatMessageHistory(
+    def _history(self, connection) -> WindowedPostgresChatMessageHistory:
+        return WindowedPostgresChatMessageHistory(
             table_name,
             str(self.session_id),
-            sync_connection=self.connection 
+            async_connection=connection,
+            organisation_id=self.organisation_id,
         )
-        return chat_history
+
+    async def aget_messages(self) -> List[BaseMessage]:
+        """Load the configured window of the session's history."""
+        pool = await get_async_connection_pool()
+        async with pool.connection() as connection:
+            return await self._history(connection).aget_messages()
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """Append messages to the session's history."""
+        pool = await get_async_connection_pool()
+        async with pool.connection() as connection:
+            await self._history(connection).aadd_messages(messages)
@@ -0,0 +1,432 @@
+"""Admission control and fair scheduling of the OpenAI calls of one worker.
+
+Every chat completion and embedding request takes a slot from the worker's ModelScheduler before
+it is sent. A slot is granted when both the global and the organisation's concurrency limit allow
+it; waiting calls are granted interactive (chat) before background (ingestion), and within one
+priority the organisation with the fewest calls in flight goes first, so one busy organisation
+cannot starve the others. Granted calls then draw from request- and token-per-minute buckets and
+are retried with jittered exponential backoff when OpenAI answers 429. OpenAI applies its limits
+per model, so the chat model and the embedding model each have their own buckets.
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+import itertools
+import contextvars
+from collections import Counter
+from dotenv import load_dotenv
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+import openai
+from langchain_core.embeddings import Embeddings
+from src.organisation_embedding_creation.token_counter import count_tokens
+from src.monitoring.metrics import observe_model_queue_wait, record_model_rejection, record_model_retry
+
+load_dotenv()
+
+MODEL_MAX_CONCURRENCY = int(os.getenv("MODEL_MAX_CONCURRENCY", 32))
+MODEL_MAX_CONCURRENCY_PER_ORGANISATION = int(os.getenv("MODEL_MAX_CONCURRENCY_PER_ORGANISATION", 4))
+# 0 disables the bucket. Set them a little below the account's OpenAI limits of each model,
+# divided by the number of workers. The chat limits fall back to the former shared settings.
+MODEL_CHAT_REQUESTS_PER_MINUTE = int(os.getenv("MODEL_CHAT_REQUESTS_PER_MINUTE", os.getenv("MODEL_REQUESTS_PER_MINUTE", 0)))
+MODEL_CHAT_TOKENS_PER_MINUTE = int(os.getenv("MODEL_CHAT_TOKENS_PER_MINUTE", os.getenv("MODEL_TOKENS_PER_MINUTE", 0)))
+MODEL_EMBEDDING_REQUESTS_PER_MINUTE = int(os.getenv("MODEL_EMBEDDING_REQUESTS_PER_MINUTE", 0))
+MODEL_EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv("MODEL_EMBEDDING_TOKENS_PER_MINUTE", 0))
+# Interactive calls waiting for a slot beyond this are rejected instead of queued.
+MODEL_MAX_QUEUE_DEPTH = int(os.getenv("MODEL_MAX_QUEUE_DEPTH", 100))
+MODEL_RETRY_AFTER_SECONDS = int(os.getenv("MODEL_RETRY_AFTER_SECONDS", 5))
+MODEL_MAX_RETRIES = int(os.getenv("MODEL_MAX_RETRIES", 4))
+MODEL_RETRY_BASE_DELAY = float(os.getenv("MODEL_RETRY_BASE_DELAY", 0.5))
+MODEL_RETRY_MAX_DELAY = float(os.getenv("MODEL_RETRY_MAX_DELAY", 20))
+# Completion tokens reserved from the token bucket for every chat call.
+MODEL_COMPLETION_TOKEN_ESTIMATE = int(os.getenv("MODEL_COMPLETION_TOKEN_ESTIMATE", 500))
+LOGGER = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+CHAT = "chat"
+EMBEDDING = "embedding"
+# (requests per minute, tokens per minute) of every model.
+MODEL_RATE_LIMITS: Dict[str, Tuple[int, int]] = {
+    CHAT: (MODEL_CHAT_REQUESTS_PER_MINUTE, MODEL_CHAT_TOKENS_PER_MINUTE),
+    EMBEDDING: (MODEL_EMBEDDING_REQUESTS_PER_MINUTE, MODEL_EMBEDDING_TOKENS_PER_MINUTE),
+}
+
+# Errors worth another attempt. The OpenAI clients are built with max_retries=0 so that retries
+# go through the scheduler, which frees the slot while backing off.
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+T = TypeVar("T")
+
+_organisation_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("model_organisation_id", default=None)
+
+
+class ModelSchedulerOverloaded(Exception):
+    """Raised instead of queueing an interactive call when too many are already waiting."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Too many model calls are waiting, try again later")
+        self.retry_after = retry_after
+
+
+def set_scheduling_organisation(organisation_id: Optional[str]) -> None:
+    """Attribute the model calls of the current request or task to an organisation."""
+    _organisation_id.set(None if organisation_id is None else str(organisation_id))
+
+
+@contextmanager
+def scheduling_organisation(organisation_id: Optional[str]) -> Iterator[None]:
+    token = _organisation_id.set(None if organisation_id is None else str(organisation_id))
+    try:
+        yield
+    finally:
+        _organisation_id.reset(token)
+
+
+def current_organisation() -> str:
+    return _organisation_id.get() or ""
+
+
+def is_retryable(error: BaseException) -> bool:
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+def retry_delay(attempt: int, error: Optional[BaseException] = None) -> float:
+    """Exponential backoff with jitter, never shorter than a Retry-After sent by OpenAI."""
+    delay = min(MODEL_RETRY_MAX_DELAY, MODEL_RETRY_BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.5)
+    response = getattr(error, "response", None)
+    try:
+        retry_after = float(response.headers.get("retry-after")) if response is not None else 0.0
+    except (TypeError, ValueError):
+        retry_after = 0.0
+    return max(delay, min(retry_after, MODEL_RETRY_MAX_DELAY))
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int) -> None:
+        """
+        Rate limit refilled continuously up to one minute's worth.
+
+        Args:
+            per_minute (int): Units per minute, 0 for unlimited.
+        """
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take ``amount`` from the bucket and return the seconds to wait until it was available."""
+        if self.rate <= 0 or amount <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+            self._updated = now
+            # A single call larger than the bucket still passes once the bucket is full.
+            self._level -= min(amount, self.capacity)
+            return max(0.0, -self._level / self.rate)
+
+
+class _Waiter:
+    __slots__ = ("organisation_id", "priority", "sequence", "enqueued", "granted", "wake")
+
+    def __init__(self, organisation_id: str, priority: int, sequence: int, wake: Callable[[], None]) -> None:
+        self.organisation_id = organisation_id
+        self.priority = priority
+        self.sequence = sequence
+        self.enqueued = time.perf_counter()
+        self.granted = False
+        self.wake = wake
+
+
+class ModelScheduler:
+    def __init__(
+                self,
+                max_concurrency: int = MODEL_MAX_CONCURRENCY,
+                max_per_organisation: int = MODEL_MAX_CONCURRENCY_PER_ORGANISATION,
+                rate_limits: Optional[Dict[str, Tuple[int, int]]] = None,
+                max_queue_depth: int = MODEL_MAX_QUEUE_DEPTH,
+                max_retries: int = MODEL_MAX_RETRIES,
+            ) -> None:
+        """
+        Concurrency limits, rate limits and retries for the model calls of this process. Usable
+        from the event loop and from worker threads alike.
+
+        Args:
+            max_concurrency (int): Model calls in flight across all organisations.
+            max_per_organisation (int): Model calls in flight for one organisation.
+            rate_limits (dict): (requests, tokens) per minute of CHAT and EMBEDDING, 0 for unlimited.
+                Defaults to MODEL_RATE_LIMITS.
+            max_queue_depth (int): Waiting interactive calls before new ones are rejected.
+            max_retries (int): Retries of a call failing with a retryable error.
+        """
+        self.max_concurrency = max_concurrency
+        self.max_per_organisation = max_per_organisation
+        self.max_queue_depth = max_queue_depth
+        self.max_retries = max_retries
+        rate_limits = MODEL_RATE_LIMITS if rate_limits is None else rate_limits
+        self.requests = {model: TokenBucket(requests) for model, (requests, _) in rate_limits.items()}
+        self.tokens = {model: TokenBucket(tokens) for model, (_, tokens) in rate_limits.items()}
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+        self._active = 0
+        self._active_by_organisation: Counter = Counter()
+        self._waiters: List[_Waiter] = []
+        self.granted = 0
+        self.rejected = 0
+        self.retries = 0
+
+    def _has_capacity(self, organisation_id: str) -> bool:
+        return (
+            self._active < self.max_concurrency
+            and self._active_by_organisation[organisation_id] < self.max_per_organisation
+        )
+
+    def _take(self, organisation_id: str) -> None:
+        self._active += 1
+        self._active_by_organisation[organisation_id] += 1
+        self.granted += 1
+
+    def _interactive_waiting(self) -> int:
+        return sum(1 for waiter in self._waiters if waiter.priority == INTERACTIVE)
+
+    def _grant_waiters(self) -> None:
+        """Hand free slots to waiters. Called with the lock held."""
+        while self._waiters and self._active < self.max_concurrency:
+            eligible = [waiter for waiter in self._waiters if self._has_capacity(waiter.organisation_id)]
+            if not eligible:
+                return
+            waiter = min(eligible, key=lambda w: (w.priority, self._active_by_organisation[w.organisation_id], w.sequence))
+            self._waiters.remove(waiter)
+            self._take(waiter.organisation_id)
+            waiter.granted = True
+            waiter.wake()
+
+    def _enqueue(self, organisation_id: str, priority: int, wake: Callable[[], None]) -> Optional[_Waiter]:
+        """Take a slot right away (returns None) or queue a waiter for one."""
+        with self._lock:
+            if self._has_capacity(organisation_id) and not any(w.priority <= priority for w in self._waiters):
+                self._take(organisation_id)
+                return None
+            if priority == INTERACTIVE and self._interactive_waiting() >= self.max_queue_depth:
+                self.rejected += 1
+                record_model_rejection()
+                raise ModelSchedulerOverloaded(MODEL_RETRY_AFTER_SECONDS)
+            waiter = _Waiter(organisation_id, priority, next(self._sequence), wake)
+            self._waiters.append(waiter)
+            # Waiters of other organisations may be blocked only by their own limit.
+            self._grant_waiters()
+            return waiter
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        with self._lock:
+            if waiter.granted:
+                self._release_locked(waiter.organisation_id)
+            else:
+                self._waiters.remove(waiter)
+
+    def _release_locked(self, organisation_id: str) -> None:
+        self._active -= 1
+        self._active_by_organisation[organisation_id] -= 1
+        if self._active_by_organisation[organisation_id] <= 0:
+            del self._active_by_organisation[organisation_id]
+        self._grant_waiters()
+
+    def _release(self, organisation_id: str) -> None:
+        with self._lock:
+            self._release_locked(organisation_id)
+
+    def _rate_limit_delay(self, model: str, tokens: int) -> float:
+        return max(self.requests[model].reserve(1), self.tokens[model].reserve(tokens))
+
+    def check_admission(self, priority: int = INTERACTIVE) -> None:
+        """Raise ModelSchedulerOverloaded when a new call of ``priority`` would be rejected."""
+        if priority != INTERACTIVE:
+            return
+        with self._lock:
+            if self._interactive_waiting() >= self.max_queue_depth:
+                self.rejected += 1
+                record_model_rejection()
+                raise ModelSchedulerOverloaded(MODEL_RETRY_AFTER_SECONDS)
+
+    @contextmanager
+    def slot(
+                self, organisation_id: Optional[str] = None, priority: int = INTERACTIVE,
+                tokens: int = 0, model: str = CHAT,
+            ) -> Iterator[None]:
+        """Hold a model call slot, blocking the current thread while waiting for it."""
+        organisation_id = current_organisation() if organisation_id is None else str(organisation_id)
+        started = time.perf_counter()
+        event = threading.Event()
+        waiter = self._enqueue(organisation_id, priority, event.set)
+        if waiter is not None:
+            try:
+                event.wait()
+            except BaseException:
+                self._abandon(waiter)
+                raise
+        try:
+            delay = self._rate_limit_delay(model, tokens)
+            if delay:
+                time.sleep(delay)
+            observe_model_queue_wait(PRIORITY_NAMES[priority], time.perf_counter() - started)
+            yield
+        finally:
+            self._release(organisation_id)
+
+    @asynccontextmanager
+    async def aslot(
+                self, organisation_id: Optional[str] = None, priority: int = INTERACTIVE,
+                tokens: int = 0, model: str = CHAT,
+            ) -> AsyncIterator[None]:
+        """Hold a model call slot, waiting for it without blocking the event loop."""
+        organisation_id = current_organisation() if organisation_id is None else str(organisation_id)
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake() -> None:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enqueue(organisation_id, priority, wake)
+        if waiter is not None:
+            try:
+                await future
+            except BaseException:
+                self._abandon(waiter)
+                raise
+        try:
+            delay = self._rate_limit_delay(model, tokens)
+            if delay:
+                await asyncio.sleep(delay)
+            observe_model_queue_wait(PRIORITY_NAMES[priority], time.perf_counter() - started)
+            yield
+        finally:
+            self._release(organisation_id)
+
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        if not is_retryable(error) or attempt >= self.max_retries:
+            return False
+        self.retries += 1
+        record_model_retry(type(error).__name__)
+        LOGGER.warning("Model call failed with %s, retry %s of %s", type(error).__name__, attempt + 1, self.max_retries)
+        return True
+
+    def run(
+                self, call: Callable[[], T], organisation_id: Optional[str] = None,
+                priority: int = INTERACTIVE, tokens: int = 0, model: str = CHAT,
+            ) -> T:
+        """
+        Run a blocking model call in a slot, retrying it on 429 and transient errors.
+
+        Args:
+            call (Callable): The model call.
+            organisation_id (str): The organisation the call is made for, defaults to the current one.
+            priority (int): INTERACTIVE or BACKGROUND.
+            tokens (int): Estimated tokens of the call, drawn from the token bucket.
+            model (str): CHAT or EMBEDDING, whose rate limit buckets the call draws from.
+
+        Returns:
+            The result of ``call``.
+        """
+        for attempt in itertools.count():
+            with self.slot(organisation_id, priority, tokens, model):
+                try:
+                    return call()
+                except Exception as e:
+                    if not self.should_retry(e, attempt):
+                        raise
+                    error = e
+            # Back off outside the slot so other calls can use it meanwhile.
+            time.sleep(retry_delay(attempt, error))
+
+    async def arun(
+                self, call: Callable[[], Awaitable[T]], organisation_id: Optional[str] = None,
+                priority: int = INTERACTIVE, tokens: int = 0, model: str = CHAT,
+            ) -> T:
+        """
+        Async version of ``run``.
+
+        Args:
+            call (Callable): Returns the awaitable model call.
+            organisation_id (str): The organisation the call is made for, defaults to the current one.
+            priority (int): INTERACTIVE or BACKGROUND.
+            tokens (int): Estimated tokens of the call, drawn from the token bucket.
+            model (str): CHAT or EMBEDDING, whose rate limit buckets the call draws from.
+
+        Returns:
+            The result of ``call``.
+        """
+        for attempt in itertools.count():
+            async with self.aslot(organisation_id, priority, tokens, model):
+                try:
+                    return await call()
+                except Exception as e:
+                    if not self.should_retry(e, attempt):
+                        raise
+                    error = e
+            await asyncio.sleep(retry_delay(attempt, error))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active": self._active,
+                "waiting_interactive": self._interactive_waiting(),
+                "waiting_background": len(self._waiters) - self._interactive_waiting(),
+                "active_organisations": len(self._active_by_organisation),
+                "granted": self.granted,
+                "rejected": self.rejected,
+                "retries": self.retries,
+            }
+
+
+_scheduler: Optional[ModelScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_model_scheduler() -> ModelScheduler:
+    """The scheduler shared by every model client of this process."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ModelScheduler()
+        return _scheduler
+
+
+def estimate_tokens(texts: List[str]) -> int:
+    return sum(count_tokens(text) for text in texts)
+
+
+class ScheduledEmbeddings(Embeddings):
+    def __init__(self, embeddings: Embeddings, priority: int, scheduler: Optional[ModelScheduler] = None) -> None:
+        """
+        Embeddings wrapper sending every call through the model scheduler, attributed to the
+        organisation set with ``scheduling_organisation``.
+
+        Args:
+            embeddings (Embeddings): The embeddings client.
+            priority (int): INTERACTIVE for chat, BACKGROUND for ingestion.
+            scheduler (ModelScheduler): Defaults to the process-wide scheduler.
+        """
+        self.embeddings = embeddings
+        self.priority = priority
+        self.scheduler = scheduler or get_model_scheduler()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.scheduler.run(lambda: self.embeddings.embed_documents(texts), priority=self.priority, tokens=estimate_tokens(texts), model=EMBEDDING)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.scheduler.run(lambda: self.embeddings.embed_query(text), priority=self.priority, tokens=count_tokens(text), model=EMBEDDING)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.scheduler.arun(lambda: self.embeddings.aembed_documents(texts), priority=self.priority, tokens=estimate_tokens(texts), model=EMBEDDING)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.scheduler.arun(lambda: self.embeddings.aembed_query(text), priority=self.priority, tokens=count_tokens(text), model=EMBEDDING)
@@ -0,0 +1,174 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from dotenv import load_dotenv
+from langchain_core.outputs import LLMResult
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+load_dotenv()
+
+# Per-organisation labels multiply every series by the number of organisations, so they are opt-in.
+METRICS_ORGANISATION_LABELS = os.getenv("METRICS_ORGANISATION_LABELS", "false").lower() == "true"
+
+_STAGE_LABELS = ["stage", "organisation_id"] if METRICS_ORGANISATION_LABELS else ["stage"]
+_TOKEN_LABELS = ["model", "kind", "organisation_id"] if METRICS_ORGANISATION_LABELS else ["model", "kind"]
+_STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CHATBOT_STAGE_SECONDS = Histogram(
+    "chatbot_stage_seconds",
+    "Time spent in each stage of a chatbot request.",
+    _STAGE_LABELS,
+    buckets=_STAGE_BUCKETS,
+)
+INGESTION_STAGE_SECONDS = Histogram(
+    "ingestion_stage_seconds",
+    "Time spent in each stage of organisation ingestion.",
+    _STAGE_LABELS,
+    buckets=_STAGE_BUCKETS,
+)
+_TOKEN_COUNT_BUCKETS = (100, 250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 12000, 16000, 32000, 64000, 128000)
+CONTEXT_TOKENS = Histogram(
+    "chatbot_context_tokens",
+    "Tokens of retrieved context placed in the prompt of a chatbot request.",
+    ["organisation_id"] if METRICS_ORGANISATION_LABELS else [],
+    buckets=_TOKEN_COUNT_BUCKETS,
+)
+PROMPT_TOKENS = Histogram(
+    "chatbot_prompt_tokens",
+    "Prompt tokens of a chatbot request as reported by the chat completion.",
+    ["organisation_id"] if METRICS_ORGANISATION_LABELS else [],
+    buckets=_TOKEN_COUNT_BUCKETS,
+)
+MODEL_QUEUE_WAIT_SECONDS = Histogram(
+    "model_queue_wait_seconds",
+    "Time a model call waited for a scheduler slot and the rate limits.",
+    ["priority"],
+    buckets=_STAGE_BUCKETS,
+)
+MODEL_REJECTIONS = Counter(
+    "model_rejections_total",
+    "Interactive model calls rejected because the scheduler queue was full.",
+)
+MODEL_RETRIES = Counter(
+    "model_retries_total",
+    "Model calls retried after a rate limit or transient error.",
+    ["error"],
+)
+COALESCED_REQUESTS = Counter(
+    "chatbot_coalesced_requests_total",
+    "Chatbot requests answered by an identical request already in flight.",
+    ["organisation_id"] if METRICS_ORGANISATION_LABELS else [],
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens reported by the OpenAI chat completions.",
+    _TOKEN_LABELS,
+)
+
+
+def _stage_labels(stage: str, organisation_id: Optional[str]) -> Dict[str, str]:
+    if METRICS_ORGANISATION_LABELS:
+        return {"stage": stage, "organisation_id": str(organisation_id or "")}
+    return {"stage": stage}
+
+
+def observe_chatbot_stage(stage: str, organisation_id: Optional[str], seconds: float) -> None:
+    CHATBOT_STAGE_SECONDS.labels(**_stage_labels(stage, organisation_id)).observe(seconds)
+
+
+@contextmanager
+def chatbot_stage(stage: str, organisation_id: Optional[str] = None) -> Iterator[None]:
+    """Time a stage of a chatbot request: session_check, history_load, query_embedding, retrieval, llm, ..."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_chatbot_stage(stage, organisation_id, time.perf_counter() - started)
+
+
+@contextmanager
+def ingestion_stage(stage: str, organisation_id: Optional[str] = None) -> Iterator[None]:
+    """Time a stage of organisation ingestion: db_upsert, chunking, embedding, vector_insert."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        INGESTION_STAGE_SECONDS.labels(**_stage_labels(stage, organisation_id)).observe(time.perf_counter() - started)
+
+
+def _per_organisation(metric: Any, organisation_id: Optional[str]) -> Any:
+    return metric.labels(organisation_id=str(organisation_id or "")) if METRICS_ORGANISATION_LABELS else metric
+
+
+def observe_context_tokens(tokens: int, organisation_id: Optional[str] = None) -> None:
+    _per_organisation(CONTEXT_TOKENS, organisation_id).observe(tokens)
+
+
+def record_coalesced_request(organisation_id: Optional[str] = None) -> None:
+    _per_organisation(COALESCED_REQUESTS, organisation_id).inc()
+
+
+def record_tokens(model: str, usage: Dict[str, Any], organisation_id: Optional[str] = None) -> None:
+    for kind in ("input_tokens", "output_tokens"):
+        count = usage.get(kind) or 0
+        if not count:
+            continue
+        labels = {"model": model or "unknown", "kind": kind.split("_")[0]}
+        if METRICS_ORGANISATION_LABELS:
+            labels["organisation_id"] = str(organisation_id or "")
+        LLM_TOKENS.labels(**labels).inc(count)
+    if usage.get("input_tokens"):
+        _per_organisation(PROMPT_TOKENS, organisation_id).observe(usage["input_tokens"])
+
+
+def observe_model_queue_wait(priority: str, seconds: float) -> None:
+    MODEL_QUEUE_WAIT_SECONDS.labels(priority=priority).observe(seconds)
+
+
+def record_model_rejection() -> None:
+    MODEL_REJECTIONS.inc()
+
+
+def record_model_retry(error: str) -> None:
+    MODEL_RETRIES.labels(error=error).inc()
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Records the llm stage duration and the token usage of every chat model call of one request."""
+
+    run_inline = True
+
+    def __init__(self, organisation_id: Optional[str] = None) -> None:
+        self.organisation_id = organisation_id
+        self._started: Dict[Any, float] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[Any], *, run_id: Any, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: Any, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            observe_chatbot_stage("llm", self.organisation_id, time.perf_counter() - started)
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    model = (getattr(message, "response_metadata", None) or {}).get("model_name", "")
+                    record_tokens(model, usage, self.organisation_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        self._started.pop(run_id, None)
+
+
+def metrics_payload() -> bytes:
+    # With several workers every process writes its samples to PROMETHEUS_MULTIPROC_DIR and any
+    # worker answering /metrics aggregates all of them.
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
@@ -0,0 +1,228 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+from src.database.connection_pool import get_async_connection_pool, get_connection_pool
+
+load_dotenv()
+
+EMBEDDING_CACHE_BACKEND = os.getenv("EMBEDDING_CACHE_BACKEND", "postgres")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 10000))
+EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", 30 * 24 * 3600))
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", 1000000))
+EMBEDDING_CACHE_PRUNE_EVERY = int(os.getenv("EMBEDDING_CACHE_PRUNE_EVERY", 10000))
+LOGGER = logging.getLogger(__name__)
+
+SELECT_EMBEDDINGS_QUERY = """
+    SELECT content_hash, embedding
+    FROM embedding_cache
+    WHERE model = %s
+      AND dimension = %s
+      AND content_hash = ANY(%s)
+      AND created_at > NOW() - make_interval(secs => %s::double precision)
+"""
+UPSERT_EMBEDDING_QUERY = """
+    INSERT INTO embedding_cache (content_hash, model, dimension, embedding, created_at)
+    VALUES (%s, %s, %s, %s, NOW())
+    ON CONFLICT (content_hash, model, dimension)
+    DO UPDATE SET embedding = EXCLUDED.embedding, created_at = NOW()
+"""
+PRUNE_EXPIRED_QUERY = "DELETE FROM embedding_cache WHERE created_at <= NOW() - make_interval(secs => %s::double precision)"
+PRUNE_OVERFLOW_QUERY = """
+    DELETE FROM embedding_cache
+    WHERE ctid IN (
+        SELECT ctid FROM embedding_cache
+        ORDER BY created_at DESC
+        OFFSET %s
+    )
+"""
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(
+                self,
+                embeddings: Embeddings,
+                model: str,
+                dimension: int,
+                backend: str = EMBEDDING_CACHE_BACKEND,
+                max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+                ttl_seconds: int = EMBEDDING_CACHE_TTL_SECONDS,
+            ) -> None:
+        """
+        Embeddings wrapper that serves repeated texts from an in-process LRU backed by the
+        ``embedding_cache`` Postgres table, keyed by sha256(text) + model + dimension.
+
+        Args:
+            embeddings (Embeddings): The embeddings client doing the real work on a miss.
+            model (str): Model name, part of the cache key.
+            dimension (int): Embedding dimension, part of the cache key.
+            backend (str): "postgres" for LRU + table, "memory" for the LRU only.
+            max_entries (int): Size of the in-process LRU.
+            ttl_seconds (int): Age after which cached vectors are ignored and pruned.
+        """
+        self.embeddings = embeddings
+        self.model = model
+        self.dimension = dimension
+        self.backend = backend
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lru: "OrderedDict[str, Tuple[List[float], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        self.memory_hits = 0
+        self.database_hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.memory_hits + self.database_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "database_hits": self.database_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.database_hits) / lookups, 4) if lookups else 0.0,
+            "entries": len(self._lru),
+        }
+
+    def _memory_get(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                entry = self._lru.get(key)
+                if entry is None:
+                    continue
+                vector, stored_at = entry
+                if now - stored_at > self.ttl_seconds:
+                    del self._lru[key]
+                    continue
+                self._lru.move_to_end(key)
+                found[key] = vector
+        return found
+
+    def _memory_put(self, items: Dict[str, List[float]]) -> None:
+        now = time.time()
+        with self._lock:
+            for key, vector in items.items():
+                self._lru[key] = (vector, now)
+                self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def _split(self, texts: List[str]) -> Tuple[List[str], Dict[str, List[float]], List[str]]:
+        keys = [content_hash(text) for text in texts]
+        found = self._memory_get(list(dict.fromkeys(keys)))
+        self.memory_hits += len(found)
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        return keys, found, missing
+
+    def _texts_for(self, texts: List[str], keys: List[str], missing: List[str]) -> Dict[str, str]:
+        text_by_key = dict(zip(keys, texts))
+        return {key: text_by_key[key] for key in missing}
+
+    def _finish(self, keys: List[str], found: Dict[str, List[float]], missing_count: int, from_database: int) -> List[List[float]]:
+        self.database_hits += from_database
+        self.misses += missing_count
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._split(texts)
+        from_database = 0
+        if missing and self.backend == "postgres":
+            stored = self._database_get(missing)
+            from_database = len(stored)
+            found.update(stored)
+            self._memory_put(stored)
+            missing = [key for key in missing if key not in stored]
+        if missing:
+            pending = self._texts_for(texts, keys, missing)
+            vectors = dict(zip(pending.keys(), self.embeddings.embed_documents(list(pending.values()))))
+            found.update(vectors)
+            self._memory_put(vectors)
+            if self.backend == "postgres":
+                self._database_put(vectors)
+        return self._finish(keys, found, len(missing), from_database)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._split(texts)
+        from_database = 0
+        if missing and self.backend == "postgres":
+            stored = await self._adatabase_get(missing)
+            from_database = len(stored)
+            found.update(stored)
+            self._memory_put(stored)
+            missing = [key for key in missing if key not in stored]
+        if missing:
+            pending = self._texts_for(texts, keys, missing)
+            vectors = dict(zip(pending.keys(), await self.embeddings.aembed_documents(list(pending.values()))))
+            found.update(vectors)
+            self._memory_put(vectors)
+            if self.backend == "postgres":
+                await self._adatabase_put(vectors)
+        return self._finish(keys, found, len(missing), from_database)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def _database_get(self, keys: List[str]) -> Dict[str, List[float]]:
+        try:
+            with get_connection_pool().connection() as db:
+                cursor = db.execute(SELECT_EMBEDDINGS_QUERY, (self.model, self.dimension, keys, self.ttl_seconds))
+                return {row[0]: list(row[1]) for row in cursor.fetchall()}
+        except Exception as e:
+            LOGGER.warning("Embedding cache lookup failed, falling back to the model: %s", e)
+            return {}
+
+    def _database_put(self, vectors: Dict[str, List[float]]) -> None:
+        try:
+            with get_connection_pool().connection() as db:
+                with db.cursor() as cursor:
+                    cursor.executemany(
+                        UPSERT_EMBEDDING_QUERY,
+                        [(key, self.model, self.dimension, vector) for key, vector in vectors.items()],
+                    )
+                self._writes_since_prune += len(vectors)
+                if self._writes_since_prune >= EMBEDDING_CACHE_PRUNE_EVERY:
+                    self._writes_since_prune = 0
+                    db.execute(PRUNE_EXPIRED_QUERY, (self.ttl_seconds,))
+                    db.execute(PRUNE_OVERFLOW_QUERY, (EMBEDDING_CACHE_MAX_ROWS,))
+        except Exception as e:
+            LOGGER.warning("Failed to store embeddings in the cache: %s", e)
+
+    async def _adatabase_get(self, keys: List[str]) -> Dict[str, List[float]]:
+        try:
+            pool = await get_async_connection_pool()
+            async with pool.connection() as db:
+                cursor = await db.execute(SELECT_EMBEDDINGS_QUERY, (self.model, self.dimension, keys, self.ttl_seconds))
+                return {row[0]: list(row[1]) for row in await cursor.fetchall()}
+        except Exception as e:
+            LOGGER.warning("Embedding cache lookup failed, falling back to the model: %s", e)
+            return {}
+
+    async def _adatabase_put(self, vectors: Dict[str, List[float]]) -> None:
+        try:
+            pool = await get_async_connection_pool()
+            async with pool.connection() as db:
+                async with db.cursor() as cursor:
+                    await cursor.executemany(
+                        UPSERT_EMBEDDING_QUERY,
+                        [(key, self.model, self.dimension, vector) for key, vector in vectors.items()],
+                    )
+                self._writes_since_prune += len(vectors)
+                if self._writes_since_prune >= EMBEDDING_CACHE_PRUNE_EVERY:
+                    self._writes_since_prune = 0
+                    await db.execute(PRUNE_EXPIRED_QUERY, (self.ttl_seconds,))
+                    await db.execute(PRUNE_OVERFLOW_QUERY, (EMBEDDING_CACHE_MAX_ROWS,))
+        except Exception as e:
+            LOGGER.warning("Failed to store embeddings in the cache: %s", e)
@@ -6,28 +6,35 @@ from langchain.schema import Document
 from langchain_openai import OpenAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from src.database.organisation_vector_database import VectorStorePostgresVector
+from src.database.hot_vector_index import get_hot_index
+from src.organisation_embedding_creation.embedding_cache import CachedEmbeddings
+from src.monitoring.metrics import ingestion_stage
+from src.model_scheduling.model_scheduler import BACKGROUND, ScheduledEmbeddings
 
 load_dotenv()
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s",
-    handlers=[
-        logging.StreamHandler()
-    ]
-)
 
 OPENAI_API_KEY=os.getenv("OPENAI_API_KEY")
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 1000))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 200))
 DIMENSION = int(os.getenv("DIMENSION", 768))
+EMBEDDING_MODEL_NAME = "text-embedding-3-large"
 LOGGER = logging.getLogger(__name__)
 
 class CreateDataEmbedding:
     def __init__(self, use_gpu: bool = False) -> None:
-        self.embedding_model = OpenAIEmbeddings(
-                                    model="text-embedding-3-large",
-                                    api_key=OPENAI_API_KEY,
-                                    dimensions=DIMENSION,
+        # Ingestion yields to interactive chat in the model scheduler, which also does the retries.
+        self.embedding_model = CachedEmbeddings(
+                                    ScheduledEmbeddings(
+                                        OpenAIEmbeddings(
+                                            model=EMBEDDING_MODEL_NAME,
+                                            api_key=OPENAI_API_KEY,
+                                            dimensions=DIMENSION,
+                                            max_retries=0,
+                                        ),
+                                        BACKGROUND,
+                                    ),
+                                    model=EMBEDDING_MODEL_NAME,
+                                    dimension=DIMENSION,
                                 )
         self.text_splitter = RecursiveCharacterTextSplitter(
                                 chunk_size=CHUNK_SIZE,
@@ -35,6 +42,8 @@ class CreateDataEmbedding:
                                 length_function=len,
                                 is_separator_regex=False,
                             )
+        self.vector_store = VectorStorePostgresVector("organisation_embeddings", self.embedding_model)
+        self.hot_index = get_hot_index("organisation_embeddings")
 
     def _clean_extraction_data(self, extraction_data: str) -> List[str]:
         lines = extraction_data.splitlines()
@@ -49,7 +58,6 @@ class CreateDataEmbedding:
         return cleaned_lines
 
     def _get_docs_split(self, organisation_data: str):
-        output_document = []
         cleaned_extraction_data = self._clean_extraction_data(organisation_data)
         if isinstance(cleaned_extraction_data, list):
             page_content = "\n".join(cleaned_extraction_data)
@@ -58,39 +66,32 @@ class CreateDataEmbedding:
         metadata = {
             'format': "Text"
         }
-        output_document.append(Document(metadata=metadata, page_content=page_content))
-        return output_document    
+        return self.text_splitter.create_documents([page_content], metadatas=[metadata])
 
     def _create_embedding_selection(
                 self, data: dict
             ) -> dict[str, int]:
-        doc_split = self._get_docs_split(data['organisation_data'])
-        vector_store = VectorStorePostgresVector("organisation_embeddings", self.embedding_model)
+        with ingestion_stage("chunking", str(data['organisation_id'])):
+            doc_split = self._get_docs_split(data['organisation_data'])
+        vector_store = self.vector_store
         if not vector_store.check_if_record_exist(data['organisation_id'])['is_rec_exist']:
             status = vector_store.store_docs_to_collection(str(data['organisation_id']), doc_split)
         else:
-            vector_store.delete_documents_from_collection(str(data['organisation_id']))
-            status = vector_store.store_docs_to_collection(str(data['organisation_id']), doc_split)
-            if status['status']:
-                status["ai_embeddings_reason"] = f"Embeddings of organisation id: {data['organisation_id']} is updated successfully"
-        
+            status = vector_store.update_docs_in_collection(str(data['organisation_id']), doc_split)
+        self.hot_index.invalidate(str(data['organisation_id']))
+
         return status
 
-    def check_if_all_files_can_be_sent(self, vector_store, organisation_id):
-        import anthropic
-        threshold = 20000
-        try:
-            all_docs = vector_store.similarity_search("", k=10 ** 9, filter={
-                                                        'id': {'in': organisation_id}}    
-                                                    )
-            LOGGER.info("ALL DOCS LENGTH: %s" % len(all_docs))
-            vo = anthropic.Client()
-            total_tokens = 0
-            for doc in all_docs:
-                tokens = vo.count_tokens(doc.page_content)
-                total_tokens += tokens
-            LOGGER.info("Checking if all files can be sent, Total tokens: %s" % total_tokens)   
-            return True if 0 < total_tokens < threshold else False
-        except Exception as e:
-            LOGGER.info("Exception in check_if_all_files_can_be_sent: %s" % e)
-            return False
\ No newline at end of file
+    async def _acreate_embedding_selection(
+                self, data: dict
+            ) -> dict[str, int]:
+        with ingestion_stage("chunking", str(data['organisation_id'])):
+            doc_split = self._get_docs_split(data['organisation_data'])
+        vector_store = self.vector_store
+        if not (await vector_store.acheck_if_record_exist(data['organisation_id']))['is_rec_exist']:
+            status = await vector_store.astore_docs_to_collection(str(data['organisation_id']), doc_split)
+        else:
+            status = await vector_store.aupdate_docs_in_collection(str(data['organisation_id']), doc_split)
+        self.hot_index.invalidate(str(data['organisation_id']))
+
+        return status
@@ -0,0 +1,54 @@
+import os
+import logging
+import threading
+from dotenv import load_dotenv
+from typing import Callable, List, Optional, Tuple
+
+load_dotenv()
+
+OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME")
+FALLBACK_ENCODING = "o200k_base"
+LOGGER = logging.getLogger(__name__)
+
+_encoder: Optional[Tuple[Callable[[str], List[int]], Optional[Callable[[List[int]], str]]]] = None
+_encoder_lock = threading.Lock()
+
+
+def _get_encoder() -> Tuple[Callable[[str], List[int]], Optional[Callable[[List[int]], str]]]:
+    """tiktoken encode/decode for the chat model, or a 4-characters-per-token estimate without it."""
+    global _encoder
+    if _encoder is not None:
+        return _encoder
+    with _encoder_lock:
+        if _encoder is not None:
+            return _encoder
+        try:
+            import tiktoken
+            try:
+                encoding = tiktoken.encoding_for_model(OPENAI_MODEL_NAME or "")
+            except KeyError:
+                encoding = tiktoken.get_encoding(FALLBACK_ENCODING)
+            _encoder = (encoding.encode, encoding.decode)
+        except Exception as e:
+            # tiktoken downloads its BPE files on first use (into TIKTOKEN_CACHE_DIR when set, so a
+            # cache baked into the image avoids the download); an offline host estimates instead.
+            LOGGER.warning("tiktoken unavailable, estimating tokens from characters: %s", e)
+            _encoder = (lambda text: [0] * ((len(text) + 3) // 4), None)
+    return _encoder
+
+
+def warm_encoder() -> None:
+    """Load the tokenizer ahead of the first request. Blocking; run it off the event loop."""
+    _get_encoder()
+
+
+def count_tokens(text: str) -> int:
+    encode, _ = _get_encoder()
+    return len(encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    encode, decode = _get_encoder()
+    if decode is None:
+        return text[:max_tokens * 4]
+    return decode(encode(text)[:max_tokens])
@@ -0,0 +1,290 @@
+"""Bulk onboarding of organisations.
+
+Accepts a JSON array or NDJSON of ``{"organisation_id": optional int, "organisation_data": {...}}``
+items. Every batch is upserted with one ``executemany``. The API endpoint stops there and queues
+the organisations on the IngestionQueue; the command line embeds each batch itself, with the
+chunks of all its organisations sharing embedding batches, and writes them to the vector store in bulk.
+
+    python -m src.organisation_ingestion.bulk_ingestion organisations.ndjson --output results.ndjson
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from src.monitoring.metrics import ingestion_stage
+from src.database.organisation_database import AsyncDatabaseManager
+from src.organisation_ingestion.ingestion_queue import INGESTION_CLAIM_TIMEOUT
+
+load_dotenv()
+
+BULK_INGESTION_BATCH_SIZE = int(os.getenv("BULK_INGESTION_BATCH_SIZE", 200))
+LOGGER = logging.getLogger(__name__)
+
+
+def parse_bulk_payload(payload: str) -> List[Dict[str, Any]]:
+    """
+    Parse a JSON array or NDJSON payload into items. Malformed entries are kept as
+    ``{"error": ...}`` so they can be reported at their position instead of failing the whole upload.
+
+    Raises:
+        ValueError: If the payload is a JSON array that cannot be parsed.
+    """
+    payload = payload.strip()
+    if payload.startswith("["):
+        try:
+            raw_items = json.loads(payload)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON array: {e}")
+    else:
+        raw_items = []
+        for line_number, line in enumerate(payload.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                raw_items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raw_items.append({"error": f"Invalid JSON on line {line_number}: {e}"})
+    return [_validate_item(item) for item in raw_items]
+
+
+def _validate_item(item: Any) -> Dict[str, Any]:
+    if not isinstance(item, dict):
+        return {"error": "Item must be a JSON object"}
+    if "error" in item and "organisation_data" not in item:
+        return item
+    if not isinstance(item.get("organisation_data"), dict):
+        return {"error": "Missing organisation_data object", "organisation_id": item.get("organisation_id")}
+    organisation_id = item.get("organisation_id")
+    if organisation_id is not None and (not isinstance(organisation_id, int) or isinstance(organisation_id, bool)):
+        return {"error": "organisation_id must be an integer", "organisation_id": organisation_id}
+    return {"organisation_id": organisation_id or None, "organisation_data": item["organisation_data"]}
+
+
+def _result(index: int, organisation_id: Optional[int], status: str, message: str) -> Dict[str, Any]:
+    return {"index": index, "organisation_id": organisation_id, "status": status, "message": message}
+
+
+async def _upsert_batch(
+            database: AsyncDatabaseManager, batch: List[Dict[str, Any]], offset: int,
+        ) -> Tuple[List[Dict[str, Any]], List[Tuple[int, int, Dict[str, Any]]]]:
+    """Store a batch as Pending. Returns the results of rejected items and (index, id, item) of stored ones."""
+    results: List[Dict[str, Any]] = []
+    indexed_items = []
+    for index, item in enumerate(batch, start=offset):
+        if "error" in item:
+            results.append(_result(index, item.get("organisation_id"), "Failed", item["error"]))
+        else:
+            indexed_items.append((index, item))
+    if not indexed_items:
+        return results, []
+
+    with ingestion_stage("db_upsert"):
+        stored = await database.bulk_insert_or_update_data([
+            {
+                "organisation_id": item["organisation_id"],
+                "organisation_data": json.dumps(item["organisation_data"]),
+                "ai_embeddings_status": "Pending",
+                "ai_embeddings_reason": "Bulk ingestion",
+            }
+            for _, item in indexed_items
+        ])
+    stored_items = []
+    for (index, item), row in zip(indexed_items, stored):
+        if row["organisation_id"] is None:
+            results.append(_result(index, item["organisation_id"], "Failed", row["message"]))
+        else:
+            stored_items.append((index, row["organisation_id"], item))
+    return results, stored_items
+
+
+async def _ingest_batch(batch: List[Dict[str, Any]], offset: int, embedding_creator, answer_cache) -> Dict[str, Any]:
+    database = AsyncDatabaseManager()
+    statuses: Dict[str, dict] = {}
+    organisation_docs: Dict[str, List[Any]] = {}
+    try:
+        await database.connect()
+        results, stored_items = await _upsert_batch(database, batch, offset)
+        if not stored_items:
+            return {"results": results, "chunks": 0}
+
+        # Claimed like IngestionQueue jobs, so an API worker never embeds the same organisation meanwhile.
+        claimed_at, claimed = await database.claim_organisations(
+            list({organisation_id for _, organisation_id, _ in stored_items}), INGESTION_CLAIM_TIMEOUT
+        )
+        claimed_ids = {row["organisation_id"] for row in claimed}
+        for index, organisation_id, item in stored_items:
+            if organisation_id not in claimed_ids:
+                continue
+            # A later item for the same organisation wins, like consecutive single uploads would.
+            with ingestion_stage("chunking", str(organisation_id)):
+                organisation_docs[str(organisation_id)] = embedding_creator._get_docs_split(json.dumps(item["organisation_data"]))
+
+        try:
+            statuses = await embedding_creator.vector_store.abulk_update_collection(organisation_docs) if organisation_docs else {}
+        except Exception as e:
+            statuses = {
+                organisation_id: {"status": False, "ai_embeddings_status": "Failed", "ai_embeddings_reason": f"{e}"}
+                for organisation_id in organisation_docs
+            }
+        for organisation_id, status in statuses.items():
+            await database.release_organisation(
+                int(organisation_id), claimed_at, status["ai_embeddings_status"], status["ai_embeddings_reason"]
+            )
+    finally:
+        await database.close()
+
+    for organisation_id, status in statuses.items():
+        if status["status"]:
+            embedding_creator.hot_index.invalidate(organisation_id)
+            if answer_cache is not None:
+                await answer_cache.ainvalidate(organisation_id)
+    for index, organisation_id, _ in stored_items:
+        status = statuses.get(str(organisation_id))
+        if status is None:
+            results.append(_result(index, organisation_id, "Pending", "Being embedded by another worker"))
+        else:
+            results.append(_result(index, organisation_id, status["ai_embeddings_status"], status["ai_embeddings_reason"]))
+    return {"results": results, "chunks": sum(len(docs) for docs in organisation_docs.values())}
+
+
+def _failed_batch(batch: List[Dict[str, Any]], start: int, error: Exception) -> List[Dict[str, Any]]:
+    LOGGER.error("Bulk ingestion batch starting at item %s failed: %s", start, error)
+    return [_result(index, item.get("organisation_id"), "Failed", f"{error}") for index, item in enumerate(batch, start=start)]
+
+
+async def bulk_upsert(
+            items: List[Dict[str, Any]],
+            answer_cache=None,
+            batch_size: int = BULK_INGESTION_BATCH_SIZE,
+        ) -> Dict[str, Any]:
+    """
+    Store parsed items as Pending, batch by batch, without embedding them. The API hands the
+    stored organisations to the IngestionQueue.
+
+    Args:
+        items (List[Dict[str, Any]]): Output of ``parse_bulk_payload``.
+        answer_cache (AnswerCache): Cache of chatbot answers, cleared for every stored organisation.
+        batch_size (int): Organisations upserted together.
+
+    Returns:
+        Dict[str, Any]: Per-item results, "Pending" with the organisation_id for stored items.
+    """
+    results: List[Dict[str, Any]] = []
+    database = AsyncDatabaseManager()
+    try:
+        await database.connect()
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            try:
+                rejected, stored_items = await _upsert_batch(database, batch, start)
+            except Exception as e:
+                results.extend(_failed_batch(batch, start, e))
+                continue
+            results.extend(rejected)
+            for index, organisation_id, _ in stored_items:
+                results.append(_result(index, organisation_id, "Pending", "Embedding generation queued"))
+    finally:
+        await database.close()
+
+    if answer_cache is not None:
+        for organisation_id in {result["organisation_id"] for result in results if result["status"] == "Pending"}:
+            await answer_cache.ainvalidate(str(organisation_id))
+    results.sort(key=lambda result: result["index"])
+    stored = sum(1 for result in results if result["status"] == "Pending")
+    return {"items": len(items), "stored": stored, "failed": len(results) - stored, "results": results}
+
+
+async def bulk_ingest(
+            items: List[Dict[str, Any]],
+            embedding_creator,
+            answer_cache=None,
+            batch_size: int = BULK_INGESTION_BATCH_SIZE,
+        ) -> Dict[str, Any]:
+    """
+    Upsert and embed parsed items batch by batch, for offline onboarding from the command line.
+
+    Args:
+        items (List[Dict[str, Any]]): Output of ``parse_bulk_payload``.
+        embedding_creator (CreateDataEmbedding): The shared embedding creator.
+        answer_cache (AnswerCache): Cache of chatbot answers, cleared for every re-embedded organisation.
+        batch_size (int): Organisations upserted and embedded together.
+
+    Returns:
+        Dict[str, Any]: Per-item results plus organisation and chunk throughput.
+    """
+    started = time.perf_counter()
+    results: List[Dict[str, Any]] = []
+    chunks = 0
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        try:
+            batch_result = await _ingest_batch(batch, start, embedding_creator, answer_cache)
+        except Exception as e:
+            batch_result = {"results": _failed_batch(batch, start, e), "chunks": 0}
+        results.extend(batch_result["results"])
+        chunks += batch_result["chunks"]
+        LOGGER.info("Bulk ingestion: %s/%s items processed", min(start + batch_size, len(items)), len(items))
+
+    results.sort(key=lambda result: result["index"])
+    elapsed = time.perf_counter() - started
+    completed = sum(1 for result in results if result["status"] == "Completed")
+    return {
+        "items": len(items),
+        "completed": completed,
+        "failed": sum(1 for result in results if result["status"] == "Failed"),
+        "chunks": chunks,
+        "elapsed_seconds": round(elapsed, 3),
+        "organisations_per_second": round(completed / elapsed, 2) if elapsed else 0.0,
+        "chunks_per_second": round(chunks / elapsed, 2) if elapsed else 0.0,
+        "results": results,
+    }
+
+
+async def _run(path: str, batch_size: int, output: Optional[str]) -> Dict[str, Any]:
+    from src.rag_folder.answer_cache import AnswerCache
+    from src.database.connection_pool import open_async_pools, close_async_pools
+    from src.organisation_embedding_creation.embedding_generation import CreateDataEmbedding
+
+    with open(path, encoding="utf-8") as file:
+        items = parse_bulk_payload(file.read())
+
+    await open_async_pools()
+    try:
+        embedding_creator = CreateDataEmbedding()
+        summary = await bulk_ingest(items, embedding_creator, AnswerCache(embedding_creator.embedding_model), batch_size)
+    finally:
+        await close_async_pools()
+
+    if output:
+        with open(output, "w", encoding="utf-8") as file:
+            for result in summary["results"]:
+                file.write(json.dumps(result) + "\n")
+    return summary
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+    )
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="JSON array or NDJSON file of organisations")
+    parser.add_argument("--batch-size", type=int, default=BULK_INGESTION_BATCH_SIZE)
+    parser.add_argument("--output", help="Write one NDJSON status line per item to this file")
+    args = parser.parse_args()
+
+    summary = asyncio.run(_run(args.path, args.batch_size, args.output))
+    results = summary.pop("results")
+    if not args.output:
+        for result in results:
+            print(json.dumps(result))
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
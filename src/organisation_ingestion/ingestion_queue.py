@@ -0,0 +1,207 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional, Set, Tuple
+from dotenv import load_dotenv
+from src.database.organisation_database import AsyncDatabaseManager
+
+load_dotenv()
+
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", 4))
+INGESTION_QUEUE_SIZE = int(os.getenv("INGESTION_QUEUE_SIZE", 1000))
+INGESTION_MAX_RETRIES = int(os.getenv("INGESTION_MAX_RETRIES", 3))
+INGESTION_RETRY_BACKOFF = float(os.getenv("INGESTION_RETRY_BACKOFF", 2))
+# A claim older than this belongs to a crashed process and is taken over.
+INGESTION_CLAIM_TIMEOUT = float(os.getenv("INGESTION_CLAIM_TIMEOUT", 3600))
+# How often every process looks for Pending organisations nobody has claimed.
+INGESTION_SWEEP_INTERVAL = float(os.getenv("INGESTION_SWEEP_INTERVAL", 60))
+LOGGER = logging.getLogger(__name__)
+
+
+class IngestionQueueFull(Exception):
+    """Raised when the ingestion queue cannot accept another organisation."""
+
+
+class IngestionQueue:
+    def __init__(
+                self,
+                embedding_creator,
+                answer_cache=None,
+                workers: int = INGESTION_WORKERS,
+                max_size: int = INGESTION_QUEUE_SIZE,
+                max_retries: int = INGESTION_MAX_RETRIES,
+                retry_backoff: float = INGESTION_RETRY_BACKOFF,
+                claim_timeout: float = INGESTION_CLAIM_TIMEOUT,
+                sweep_interval: float = INGESTION_SWEEP_INTERVAL,
+            ) -> None:
+        """
+        Background embedding queue backed by the organisation_data status columns.
+
+        Jobs are organisation ids only; the worker claims the row and reads its latest data in one
+        statement when it picks a job up, so a burst of updates for one organisation collapses into
+        a single run. Claims live in the database, so however many processes run a queue, each
+        organisation is embedded by one of them at a time. Every process periodically sweeps up
+        Pending rows nobody claimed, e.g. left by a crashed process or by a full queue.
+
+        Args:
+            embedding_creator (CreateDataEmbedding): The shared embedding creator.
+            answer_cache (AnswerCache): Cache of chatbot answers, cleared once an organisation is re-embedded.
+            workers (int): Maximum number of organisations embedded at the same time.
+            max_size (int): Maximum number of queued organisations before submissions are rejected.
+            max_retries (int): Retries after the first failed attempt.
+            retry_backoff (float): Base delay in seconds, doubled after every failed attempt.
+            claim_timeout (float): Seconds after which the claim of a crashed process is taken over.
+            sweep_interval (float): Seconds between two sweeps for unclaimed Pending organisations.
+        """
+        self.embedding_creator = embedding_creator
+        self.answer_cache = answer_cache
+        self.workers = workers
+        self.max_size = max_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.claim_timeout = claim_timeout
+        self.sweep_interval = sweep_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._queued: Set[int] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Start the workers and the sweep for organisations left Pending."""
+        for index in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"ingestion-worker-{index}"))
+        # The sweep runs in the background so an unreachable database does not hold up startup.
+        self._tasks.append(asyncio.create_task(self._sweep_pending(), name="ingestion-sweep"))
+
+    async def _recover_pending(self) -> None:
+        free = self.max_size - self._queue.qsize()
+        if free <= 0:
+            return
+        database = AsyncDatabaseManager()
+        try:
+            await database.connect()
+            for organisation_id in await database.get_pending_organisation_ids(self.claim_timeout, free):
+                try:
+                    self.submit(organisation_id)
+                except IngestionQueueFull:
+                    break
+        except Exception as e:
+            LOGGER.error("Failed to recover pending organisations: %s", e)
+        finally:
+            await database.close()
+
+    async def _sweep_pending(self) -> None:
+        while True:
+            await self._recover_pending()
+            await asyncio.sleep(self.sweep_interval)
+
+    async def stop(self) -> None:
+        """Cancel the workers. Interrupted organisations are released as Pending for the next sweep."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, organisation_id: int) -> None:
+        """Queue an organisation for embedding.
+
+        Raises:
+            IngestionQueueFull: If the queue is at capacity.
+        """
+        if organisation_id in self._queued:
+            return
+        try:
+            self._queue.put_nowait(organisation_id)
+        except asyncio.QueueFull:
+            raise IngestionQueueFull("Ingestion queue is full, please retry later")
+        self._queued.add(organisation_id)
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize(), "workers": self.workers}
+
+    async def _worker(self) -> None:
+        while True:
+            organisation_id = await self._queue.get()
+            self._queued.discard(organisation_id)
+            try:
+                await self._process(organisation_id)
+            except Exception as e:
+                LOGGER.error("Ingestion of organisation %s crashed: %s", organisation_id, e)
+            finally:
+                self._queue.task_done()
+
+    async def _claim(self, organisation_id: int) -> Tuple[Optional[datetime], Optional[dict]]:
+        database = AsyncDatabaseManager()
+        try:
+            await database.connect()
+            claimed_at, rows = await database.claim_organisations([organisation_id], self.claim_timeout)
+        finally:
+            await database.close()
+        return (claimed_at, rows[0]) if rows else (None, None)
+
+    async def _update_reason(self, organisation_id: int, claimed_at: datetime, reason: str) -> None:
+        database = AsyncDatabaseManager()
+        try:
+            await database.connect()
+            await database.update_claimed_reason(organisation_id, claimed_at, reason)
+        finally:
+            await database.close()
+
+    async def _release(self, organisation_id: int, claimed_at: datetime, status: str, reason: str) -> Optional[str]:
+        database = AsyncDatabaseManager()
+        try:
+            await database.connect()
+            return await database.release_organisation(organisation_id, claimed_at, status, reason)
+        finally:
+            await database.close()
+
+    async def _process(self, organisation_id: int) -> None:
+        # Chunk diffs of one organisation must not interleave, so only the holder of the claim embeds it.
+        claimed_at, organisation = await self._claim(organisation_id)
+        if organisation is None:
+            # Already embedded, gone, or being embedded by another worker or process.
+            return
+
+        try:
+            status = await self._embed(organisation_id, claimed_at, organisation["organisation_data"])
+        except asyncio.CancelledError:
+            await self._release(organisation_id, claimed_at, "Pending", "Interrupted by a restart, will be retried")
+            raise
+
+        current = await self._release(organisation_id, claimed_at, status["ai_embeddings_status"], status["ai_embeddings_reason"])
+        if status["status"] and self.answer_cache is not None:
+            # Answers cached while the old chunks were still being served are stale now.
+            await self.answer_cache.ainvalidate(str(organisation_id))
+        if current == "Pending":
+            # Updated while it was being embedded; embed the new data too.
+            try:
+                self.submit(organisation_id)
+            except IngestionQueueFull:
+                LOGGER.warning("Ingestion queue full, organisation %s is left to the next sweep.", organisation_id)
+
+    async def _embed(self, organisation_id: int, claimed_at: datetime, organisation_data: str) -> dict:
+        status: Optional[dict] = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                status = await self.embedding_creator._acreate_embedding_selection({
+                    "organisation_id": str(organisation_id),
+                    "organisation_data": organisation_data,
+                })
+            except Exception as e:
+                status = {
+                    "status": False,
+                    "ai_embeddings_status": "Failed",
+                    "ai_embeddings_reason": f"{e}",
+                }
+            if status["status"] or attempt == self.max_retries:
+                break
+            delay = self.retry_backoff * (2 ** attempt)
+            LOGGER.warning(
+                "Embedding organisation %s failed (attempt %s/%s), retrying in %ss: %s",
+                organisation_id, attempt + 1, self.max_retries + 1, delay, status["ai_embeddings_reason"],
+            )
+            await self._update_reason(
+                organisation_id, claimed_at, f"Retrying after failed attempt {attempt + 1}: {status['ai_embeddings_reason']}"
+            )
+            await asyncio.sleep(delay)
+        return status
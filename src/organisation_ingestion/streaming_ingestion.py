@@ -0,0 +1,295 @@
+"""Streaming ingestion of very large organisation payloads.
+
+The request body is spooled to a temporary file chunk by chunk, stored in organisation_data with
+COPY in one short transaction, and then read back from the file, decoded, cleaned and split into
+chunks that are embedded in batches. No transaction is open while the embeddings are computed, and
+memory stays proportional to STREAM_SPLIT_WINDOW_CHUNKS * CHUNK_SIZE, not to the payload size.
+"""
+import os
+import codecs
+import asyncio
+import logging
+import tempfile
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from langchain.schema import Document
+from typing import IO, Any, AsyncIterator, Dict, List, Optional
+from src.monitoring.metrics import ingestion_stage
+from src.database.organisation_database import CLAIM_ORGANISATIONS_QUERY, AsyncDatabaseManager
+from src.organisation_ingestion.ingestion_queue import INGESTION_CLAIM_TIMEOUT, IngestionQueueFull
+from src.organisation_embedding_creation.embedding_generation import CHUNK_SIZE
+
+load_dotenv()
+
+STREAM_SPLIT_WINDOW_CHUNKS = int(os.getenv("STREAM_SPLIT_WINDOW_CHUNKS", 16))
+STREAM_DOC_BATCH_SIZE = int(os.getenv("STREAM_DOC_BATCH_SIZE", 256))
+STREAM_READ_BLOCK_SIZE = int(os.getenv("STREAM_READ_BLOCK_SIZE", 1024 * 1024))
+STREAM_WINDOW = CHUNK_SIZE * STREAM_SPLIT_WINDOW_CHUNKS
+LOGGER = logging.getLogger(__name__)
+
+NEXT_ORGANISATION_ID_QUERY = "SELECT nextval(pg_get_serial_sequence('organisation_data', 'organisation_id'))"
+ORGANISATION_EXISTS_QUERY = "SELECT EXISTS (SELECT 1 FROM organisation_data WHERE organisation_id = %s)"
+CREATE_STAGING_TABLE_QUERY = "CREATE TEMP TABLE organisation_upload_staging (organisation_data TEXT NOT NULL) ON COMMIT DROP"
+COPY_STAGING_QUERY = "COPY organisation_upload_staging (organisation_data) FROM STDIN"
+INSERT_FROM_STAGING_QUERY = """
+    INSERT INTO organisation_data (
+        organisation_id, organisation_data, ai_embeddings_status,
+        ai_embeddings_reason, created_at, modified_at
+    )
+    SELECT %s, organisation_data, 'Pending', 'Streaming upload', NOW(), NOW()
+    FROM organisation_upload_staging
+"""
+UPDATE_FROM_STAGING_QUERY = """
+    UPDATE organisation_data
+    SET organisation_data = s.organisation_data,
+        ai_embeddings_status = 'Pending',
+        ai_embeddings_reason = 'Streaming upload',
+        modified_at = NOW()
+    FROM organisation_upload_staging s
+    WHERE organisation_id = %s
+"""
+
+# COPY text format escapes; none of these bytes can occur inside a multi-byte UTF-8 sequence,
+# so every network chunk can be escaped on its own.
+_COPY_ESCAPES = ((b"\\", b"\\\\"), (b"\n", b"\\n"), (b"\r", b"\\r"), (b"\t", b"\\t"))
+
+
+def escape_copy_text(data: bytes) -> bytes:
+    for raw, escaped in _COPY_ESCAPES:
+        data = data.replace(raw, escaped)
+    return data
+
+
+async def aiter_lines(byte_chunks: AsyncIterator[bytes], max_line_length: int) -> AsyncIterator[str]:
+    """Decode a byte stream into lines. Lines longer than ``max_line_length`` are cut into segments."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    async for data in byte_chunks:
+        pending += decoder.decode(data)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            for start in range(0, len(line), max_line_length):
+                yield line[start:start + max_line_length]
+        while len(pending) > max_line_length:
+            yield pending[:max_line_length]
+            pending = pending[max_line_length:]
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def aiter_clean_lines(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Streaming version of ``CreateDataEmbedding._clean_extraction_data``."""
+    async for line in lines:
+        stripped_line = line.strip()
+        if stripped_line:
+            yield stripped_line
+
+
+async def aiter_doc_batches(
+            lines: AsyncIterator[str],
+            text_splitter: Any,
+            window: int,
+            batch_size: int = STREAM_DOC_BATCH_SIZE,
+        ) -> AsyncIterator[List[Document]]:
+    """
+    Split a stream of cleaned lines into documents, ``batch_size`` at a time.
+
+    Lines are buffered until about ``window`` characters are pending. The buffer is split, every
+    chunk but the last is emitted and the last one stays at the head of the buffer, so chunk
+    boundaries and overlap near the end of a window are decided with the following text in view.
+    """
+    metadata = {'format': "Text"}
+    buffer: List[str] = []
+    buffered = 0
+    batch: List[Document] = []
+
+    def split(final: bool) -> List[str]:
+        chunks = text_splitter.split_text("\n".join(buffer))
+        buffer.clear()
+        if not final and chunks:
+            buffer.append(chunks.pop())
+        return chunks
+
+    async for line in lines:
+        buffer.append(line)
+        buffered += len(line) + 1
+        if buffered < window:
+            continue
+        for chunk in split(final=False):
+            batch.append(Document(page_content=chunk, metadata=dict(metadata)))
+        buffered = sum(len(text) for text in buffer)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    for chunk in split(final=True):
+        batch.append(Document(page_content=chunk, metadata=dict(metadata)))
+    if batch:
+        yield batch
+
+
+async def _aspool(byte_chunks: AsyncIterator[bytes], file: IO[bytes]) -> int:
+    """Write the request body to ``file`` and return its size."""
+    size = 0
+    async for data in byte_chunks:
+        size += len(data)
+        await asyncio.to_thread(file.write, data)
+    await asyncio.to_thread(file.flush)
+    return size
+
+
+async def aiter_file(file: IO[bytes], block_size: int = STREAM_READ_BLOCK_SIZE) -> AsyncIterator[bytes]:
+    """Read a spooled upload back from the start, ``block_size`` bytes at a time."""
+    await asyncio.to_thread(file.seek, 0)
+    while True:
+        data = await asyncio.to_thread(file.read, block_size)
+        if not data:
+            return
+        yield data
+
+
+async def _store_and_claim(file: IO[bytes], organisation_id: Optional[int]):
+    """
+    Store the spooled payload as Pending and claim it like an IngestionQueue job, in one transaction.
+
+    Returns:
+        Tuple: (organisation_id, claimed_at) with claimed_at None when another worker holds the claim,
+            or None when the organisation to update does not exist.
+    """
+    database = AsyncDatabaseManager()
+    await database.connect()
+    try:
+        async with database.conn.cursor() as cur:
+            if organisation_id is None:
+                await cur.execute(NEXT_ORGANISATION_ID_QUERY)
+                organisation_id, is_new = (await cur.fetchone())[0], True
+            else:
+                await cur.execute(ORGANISATION_EXISTS_QUERY, (organisation_id,))
+                if not (await cur.fetchone())[0]:
+                    return None
+                is_new = False
+
+            with ingestion_stage("db_upsert", str(organisation_id)):
+                await cur.execute(CREATE_STAGING_TABLE_QUERY)
+                async with cur.copy(COPY_STAGING_QUERY) as copy:
+                    async for data in aiter_file(file):
+                        await copy.write(escape_copy_text(data))
+                    await copy.write(b"\n")
+                if is_new:
+                    await cur.execute(INSERT_FROM_STAGING_QUERY, (organisation_id,))
+                else:
+                    await cur.execute(UPDATE_FROM_STAGING_QUERY, (organisation_id,))
+
+            now = datetime.now()
+            await cur.execute(
+                CLAIM_ORGANISATIONS_QUERY,
+                (now, now, [organisation_id], now - timedelta(seconds=INGESTION_CLAIM_TIMEOUT)),
+            )
+            claimed = await cur.fetchone() is not None
+        await database.conn.commit()
+    except Exception:
+        await database.conn.rollback()
+        raise
+    finally:
+        await database.close()
+    return organisation_id, now if claimed else None
+
+
+async def _release(organisation_id: int, claimed_at: datetime, status: str, reason: str) -> Optional[str]:
+    database = AsyncDatabaseManager()
+    try:
+        await database.connect()
+        return await database.release_organisation(organisation_id, claimed_at, status, reason)
+    finally:
+        await database.close()
+
+
+def _queue(ingestion_queue, organisation_id: int) -> None:
+    if ingestion_queue is None:
+        return
+    try:
+        ingestion_queue.submit(organisation_id)
+    except IngestionQueueFull:
+        LOGGER.warning("Ingestion queue full, organisation %s is left to the next sweep.", organisation_id)
+
+
+async def stream_organisation_upload(
+            byte_chunks: AsyncIterator[bytes],
+            embedding_creator,
+            organisation_id: Optional[int] = None,
+            answer_cache=None,
+            ingestion_queue=None,
+        ) -> Dict[str, Any]:
+    """
+    Store and embed an organisation payload too large to be held in memory.
+
+    The body is spooled to a temporary file while it is received, then stored in organisation_data
+    and claimed like an IngestionQueue job. The chunks are embedded from the file afterwards, with
+    the vectors written in batches, so no connection or transaction is held across model calls.
+    When another worker is already embedding the organisation, the upload is left to the queue.
+
+    Args:
+        byte_chunks (AsyncIterator[bytes]): The request body.
+        embedding_creator (CreateDataEmbedding): The shared embedding creator.
+        organisation_id (Optional[int]): Organisation to update; a new one is created when omitted.
+        answer_cache (AnswerCache): Cache of chatbot answers, cleared once the organisation is re-embedded.
+        ingestion_queue (IngestionQueue): Queue that embeds the upload when it cannot be embedded here.
+
+    Returns:
+        Dict[str, Any]: The embedding status plus the number of bytes received.
+    """
+    with tempfile.TemporaryFile() as file:
+        size = await _aspool(byte_chunks, file)
+        try:
+            stored = await _store_and_claim(file, organisation_id)
+        except Exception as e:
+            LOGGER.error("Streaming upload of organisation %s failed: %s", organisation_id, e)
+            return {
+                "status": False,
+                "organisation_id": organisation_id,
+                "ai_embeddings_status": "Failed",
+                "ai_embeddings_reason": f"{e}",
+                "bytes": size,
+            }
+        if stored is None:
+            return {
+                "status": False,
+                "organisation_id": organisation_id,
+                "ai_embeddings_status": "Failed",
+                "ai_embeddings_reason": f"Organisation {organisation_id} not found",
+                "bytes": 0,
+            }
+        organisation_id, claimed_at = stored
+        if answer_cache is not None:
+            await answer_cache.ainvalidate(str(organisation_id))
+        if claimed_at is None:
+            _queue(ingestion_queue, organisation_id)
+            return {
+                "status": True,
+                "organisation_id": organisation_id,
+                "ai_embeddings_status": "Pending",
+                "ai_embeddings_reason": "Embedding generation queued",
+                "bytes": size,
+            }
+
+        try:
+            lines = aiter_clean_lines(aiter_lines(aiter_file(file), STREAM_WINDOW))
+            doc_batches = aiter_doc_batches(lines, embedding_creator.text_splitter, STREAM_WINDOW)
+            status = await embedding_creator.vector_store.astore_doc_stream(str(organisation_id), doc_batches)
+        except Exception as e:
+            LOGGER.error("Streaming upload of organisation %s failed: %s", organisation_id, e)
+            status = {"status": False, "ai_embeddings_status": "Failed", "ai_embeddings_reason": f"{e}"}
+        except asyncio.CancelledError:
+            await _release(organisation_id, claimed_at, "Pending", "Interrupted by a restart, will be retried")
+            raise
+
+    current = await _release(organisation_id, claimed_at, status["ai_embeddings_status"], status["ai_embeddings_reason"])
+    if status["status"]:
+        embedding_creator.hot_index.invalidate(str(organisation_id))
+        if answer_cache is not None:
+            await answer_cache.ainvalidate(str(organisation_id))
+    if current == "Pending":
+        # Updated again while this upload was being embedded.
+        _queue(ingestion_queue, organisation_id)
+    return {**status, "organisation_id": organisation_id, "bytes": size}
@@ -49,4 +49,14 @@ FUNCTION_DESC = [
                     "required": ["name", "phonenumber", "email", "reason"],
                 },
             }
-        ]
\ No newline at end of file
+        ]
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between users and an organisation's AI assistant.
+
+                Current summary:
+                {summary}
+
+                New messages to fold into the summary:
+                {transcript}
+
+                Return the updated summary only, as plain text in at most 200 words. Keep names, contact details, open requests and facts the assistant has promised; drop small talk."""
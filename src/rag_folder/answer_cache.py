@@ -0,0 +1,418 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+from src.database.connection_pool import get_async_connection_pool, get_connection_pool
+from src.database.organisation_events import anotify_organisation_changed, notify_organisation_changed
+
+load_dotenv()
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_BACKEND = os.getenv("ANSWER_CACHE_BACKEND", "postgres")
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", 0.95))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 5000))
+# A single busy organisation must not push everyone else out of the LRU.
+ANSWER_CACHE_MAX_ENTRIES_PER_ORGANISATION = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES_PER_ORGANISATION", 500))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+ANSWER_CACHE_MAX_ROWS = int(os.getenv("ANSWER_CACHE_MAX_ROWS", 100000))
+ANSWER_CACHE_PRUNE_EVERY = int(os.getenv("ANSWER_CACHE_PRUNE_EVERY", 1000))
+LOGGER = logging.getLogger(__name__)
+
+SELECT_EXACT_QUERY = """
+    SELECT answer, embedding::TEXT
+    FROM answer_cache
+    WHERE organisation_id = %s
+      AND query_hash = %s
+      AND created_at > NOW() - make_interval(secs => %s::double precision)
+"""
+SELECT_NEAREST_QUERY = """
+    SELECT query_hash, answer, embedding::TEXT, 1 - (embedding <=> %s::vector) AS similarity
+    FROM answer_cache
+    WHERE organisation_id = %s
+      AND created_at > NOW() - make_interval(secs => %s::double precision)
+    ORDER BY embedding <=> %s::vector
+    LIMIT 1
+"""
+UPSERT_ANSWER_QUERY = """
+    INSERT INTO answer_cache (organisation_id, query_hash, query, embedding, answer, created_at)
+    VALUES (%s, %s, %s, %s::vector, %s, NOW())
+    ON CONFLICT (organisation_id, query_hash)
+    DO UPDATE SET embedding = EXCLUDED.embedding, answer = EXCLUDED.answer, created_at = NOW()
+"""
+DELETE_ORGANISATION_ANSWERS_QUERY = "DELETE FROM answer_cache WHERE organisation_id = %s"
+PRUNE_EXPIRED_QUERY = "DELETE FROM answer_cache WHERE created_at <= NOW() - make_interval(secs => %s::double precision)"
+PRUNE_OVERFLOW_QUERY = """
+    DELETE FROM answer_cache
+    WHERE ctid IN (
+        SELECT ctid FROM answer_cache
+        ORDER BY created_at DESC
+        OFFSET %s
+    )
+"""
+
+
+def normalise_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation, so trivial rewordings share a key."""
+    return re.sub(r"\s+", " ", query).strip().lower().rstrip("?!. ")
+
+
+def query_hash(query: str) -> str:
+    return hashlib.sha256(normalise_query(query).encode("utf-8")).hexdigest()
+
+
+def _to_vector(embedding: List[float]) -> str:
+    return "[" + ",".join(str(value) for value in embedding) + "]"
+
+
+def _from_vector(text: str) -> List[float]:
+    return [float(value) for value in text.strip("[]").split(",")]
+
+
+def _normalise(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+class _OrganisationAnswers:
+    def __init__(self, dimension: int) -> None:
+        """
+        Normalised question embeddings of one organisation's cached answers, one matrix row per key.
+
+        Rows are filled in place and a dropped row is replaced by the last one, so a lookup is a
+        single matrix-vector product over the used rows.
+
+        Args:
+            dimension (int): Length of the embeddings.
+        """
+        self.dimension = dimension
+        self.matrix = np.zeros((8, dimension), dtype=np.float32)
+        self.stored_at = np.zeros(8, dtype=np.float64)
+        self.keys: List[str] = []
+        self.rows: "OrderedDict[str, int]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def put(self, key: str, embedding: List[float], stored_at: float) -> None:
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == self.matrix.shape[0]:
+                self.matrix = np.concatenate([self.matrix, np.zeros_like(self.matrix)])
+                self.stored_at = np.concatenate([self.stored_at, np.zeros_like(self.stored_at)])
+            self.keys.append(key)
+        self.rows[key] = row
+        self.rows.move_to_end(key)
+        self.matrix[row] = _normalise(embedding)
+        self.stored_at[row] = stored_at
+
+    def touch(self, key: str) -> None:
+        if key in self.rows:
+            self.rows.move_to_end(key)
+
+    def drop(self, key: str) -> None:
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        last = len(self.keys) - 1
+        if row != last:
+            moved = self.keys[last]
+            self.keys[row] = moved
+            self.rows[moved] = row
+            self.matrix[row] = self.matrix[last]
+            self.stored_at[row] = self.stored_at[last]
+        self.keys.pop()
+
+    def least_recent(self) -> str:
+        return next(iter(self.rows))
+
+    def nearest(self, embedding: List[float], not_before: float) -> Tuple[Optional[str], float]:
+        used = len(self.keys)
+        if not used:
+            return None, -1.0
+        similarities = self.matrix[:used] @ _normalise(embedding)
+        similarities[self.stored_at[:used] < not_before] = -1.0
+        best = int(np.argmax(similarities))
+        if similarities[best] <= -1.0:
+            return None, -1.0
+        return self.keys[best], float(similarities[best])
+
+
+class AnswerCache:
+    def __init__(
+                self,
+                embeddings: Embeddings,
+                backend: str = ANSWER_CACHE_BACKEND,
+                threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD,
+                max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                max_entries_per_organisation: int = ANSWER_CACHE_MAX_ENTRIES_PER_ORGANISATION,
+                ttl_seconds: int = ANSWER_CACHE_TTL_SECONDS,
+            ) -> None:
+        """
+        Per-organisation cache of chatbot answers.
+
+        A question is looked up by the hash of its normalised text first and, failing that, by
+        cosine similarity of its embedding against the organisation's cached questions. An
+        in-process LRU sits in front of the ``answer_cache`` Postgres table.
+
+        Args:
+            embeddings (Embeddings): Embeddings used for the similarity lookup, shared with retrieval.
+            backend (str): "postgres" for LRU + table, "memory" for the LRU only.
+            threshold (float): Minimum cosine similarity for a semantic hit.
+            max_entries (int): Size of the in-process LRU.
+            max_entries_per_organisation (int): Share of the LRU one organisation may take.
+            ttl_seconds (int): Age after which cached answers are ignored and pruned.
+        """
+        self.embeddings = embeddings
+        self.backend = backend
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_entries_per_organisation = max_entries_per_organisation
+        self.ttl_seconds = ttl_seconds
+        self._lru: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self._organisations: Dict[str, _OrganisationAnswers] = {}
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self._miss_ms_total = 0.0
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            "entries": len(self._lru),
+            "average_miss_ms": round(self._miss_ms_total / self.misses, 1) if self.misses else 0.0,
+            "saved_ms": round(self.saved_ms, 1),
+        }
+
+    def record_hit(self, elapsed_ms: float) -> None:
+        """Credit a hit with the average cost of a miss minus what the hit itself took."""
+        if self.misses:
+            self.saved_ms += max(self._miss_ms_total / self.misses - elapsed_ms, 0.0)
+
+    def record_miss(self, elapsed_ms: float) -> None:
+        self.misses += 1
+        self._miss_ms_total += elapsed_ms
+
+    def _memory_get(self, organisation_id: str, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._lru.get((organisation_id, key))
+            if entry is None:
+                return None
+            answer, stored_at = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                self._memory_drop(organisation_id, key)
+                return None
+            self._lru.move_to_end((organisation_id, key))
+            self._organisations[organisation_id].touch(key)
+            return answer
+
+    def _memory_nearest(self, organisation_id: str, embedding: List[float]) -> Tuple[Optional[str], float]:
+        with self._lock:
+            answers = self._organisations.get(organisation_id)
+            if answers is None or answers.dimension != len(embedding):
+                return None, -1.0
+            key, similarity = answers.nearest(embedding, time.time() - self.ttl_seconds)
+            if key is None:
+                return None, -1.0
+            return self._lru[(organisation_id, key)][0], similarity
+
+    def _memory_put(self, organisation_id: str, key: str, answer: str, embedding: List[float]) -> None:
+        with self._lock:
+            answers = self._organisations.get(organisation_id)
+            if answers is None or answers.dimension != len(embedding):
+                # New organisation, or the embedding model changed under a running worker.
+                self._memory_invalidate_locked(organisation_id)
+                answers = self._organisations[organisation_id] = _OrganisationAnswers(len(embedding))
+            stored_at = time.time()
+            self._lru[(organisation_id, key)] = (answer, stored_at)
+            self._lru.move_to_end((organisation_id, key))
+            answers.put(key, embedding, stored_at)
+            while len(answers) > self.max_entries_per_organisation:
+                self._memory_drop(organisation_id, answers.least_recent())
+            while len(self._lru) > self.max_entries:
+                evicted_organisation, evicted_key = next(iter(self._lru))
+                self._memory_drop(evicted_organisation, evicted_key)
+
+    def _memory_drop(self, organisation_id: str, key: str) -> None:
+        self._lru.pop((organisation_id, key), None)
+        answers = self._organisations.get(organisation_id)
+        if answers is not None:
+            answers.drop(key)
+            if not len(answers):
+                del self._organisations[organisation_id]
+
+    def _memory_invalidate_locked(self, organisation_id: str) -> None:
+        answers = self._organisations.pop(organisation_id, None)
+        for key in answers.keys if answers is not None else ():
+            self._lru.pop((organisation_id, key), None)
+
+    def _memory_invalidate(self, organisation_id: str) -> None:
+        with self._lock:
+            self._memory_invalidate_locked(organisation_id)
+
+    def on_organisation_changed(self, organisation_id: Optional[str]) -> None:
+        """OrganisationChangeListener callback: drop this worker's answers of a changed organisation, or all of them for None."""
+        if organisation_id is None:
+            with self._lock:
+                self._lru.clear()
+                self._organisations.clear()
+        else:
+            self._memory_invalidate(organisation_id)
+
+    def _semantic_hit(self, organisation_id: str, key: str, answer: Optional[str], similarity: float, embedding: List[float]) -> Optional[str]:
+        if answer is None or similarity < self.threshold:
+            return None
+        self.semantic_hits += 1
+        self._memory_put(organisation_id, key, answer, embedding)
+        return answer
+
+    def lookup(self, organisation_id: str, query: str) -> Optional[str]:
+        """Return a cached answer for the question, or None. Misses are counted by record_miss."""
+        key = query_hash(query)
+        answer = self._memory_get(organisation_id, key)
+        if answer is None and self.backend == "postgres":
+            answer = self._database_get_exact(organisation_id, key)
+        if answer is not None:
+            self.exact_hits += 1
+            return answer
+
+        embedding = self.embeddings.embed_query(query)
+        answer, similarity = self._memory_nearest(organisation_id, embedding)
+        if (answer is None or similarity < self.threshold) and self.backend == "postgres":
+            answer, similarity = self._database_nearest(organisation_id, embedding)
+        return self._semantic_hit(organisation_id, key, answer, similarity, embedding)
+
+    async def alookup(self, organisation_id: str, query: str) -> Optional[str]:
+        """Return a cached answer for the question, or None. Misses are counted by record_miss."""
+        key = query_hash(query)
+        answer = self._memory_get(organisation_id, key)
+        if answer is None and self.backend == "postgres":
+            answer = await self._adatabase_get_exact(organisation_id, key)
+        if answer is not None:
+            self.exact_hits += 1
+            return answer
+
+        embedding = await self.embeddings.aembed_query(query)
+        answer, similarity = self._memory_nearest(organisation_id, embedding)
+        if (answer is None or similarity < self.threshold) and self.backend == "postgres":
+            answer, similarity = await self._adatabase_nearest(organisation_id, embedding)
+        return self._semantic_hit(organisation_id, key, answer, similarity, embedding)
+
+    def _prune_due(self) -> bool:
+        """Expired rows are only filtered on read, so every ANSWER_CACHE_PRUNE_EVERY writes they are deleted."""
+        with self._lock:
+            self._writes_since_prune += 1
+            if self._writes_since_prune < ANSWER_CACHE_PRUNE_EVERY:
+                return False
+            self._writes_since_prune = 0
+            return True
+
+    def store(self, organisation_id: str, query: str, answer: str) -> None:
+        if not answer:
+            return
+        key = query_hash(query)
+        embedding = self.embeddings.embed_query(query)
+        self._memory_put(organisation_id, key, answer, embedding)
+        if self.backend == "postgres":
+            self._database_execute(UPSERT_ANSWER_QUERY, (organisation_id, key, normalise_query(query), _to_vector(embedding), answer))
+            if self._prune_due():
+                self._database_execute(PRUNE_EXPIRED_QUERY, (self.ttl_seconds,))
+                self._database_execute(PRUNE_OVERFLOW_QUERY, (ANSWER_CACHE_MAX_ROWS,))
+
+    async def astore(self, organisation_id: str, query: str, answer: str) -> None:
+        if not answer:
+            return
+        key = query_hash(query)
+        embedding = await self.embeddings.aembed_query(query)
+        self._memory_put(organisation_id, key, answer, embedding)
+        if self.backend == "postgres":
+            await self._adatabase_execute(UPSERT_ANSWER_QUERY, (organisation_id, key, normalise_query(query), _to_vector(embedding), answer))
+            if self._prune_due():
+                await self._adatabase_execute(PRUNE_EXPIRED_QUERY, (self.ttl_seconds,))
+                await self._adatabase_execute(PRUNE_OVERFLOW_QUERY, (ANSWER_CACHE_MAX_ROWS,))
+
+    def invalidate(self, organisation_id: str) -> None:
+        """Forget every cached answer of an organisation, e.g. after its data changed, in every worker."""
+        self._memory_invalidate(organisation_id)
+        if self.backend == "postgres":
+            self._database_execute(DELETE_ORGANISATION_ANSWERS_QUERY, (organisation_id,))
+        notify_organisation_changed(organisation_id)
+
+    async def ainvalidate(self, organisation_id: str) -> None:
+        """Forget every cached answer of an organisation, e.g. after its data changed, in every worker."""
+        self._memory_invalidate(organisation_id)
+        if self.backend == "postgres":
+            await self._adatabase_execute(DELETE_ORGANISATION_ANSWERS_QUERY, (organisation_id,))
+        await anotify_organisation_changed(organisation_id)
+
+    def _database_get_exact(self, organisation_id: str, key: str) -> Optional[str]:
+        row = self._database_fetchone(SELECT_EXACT_QUERY, (organisation_id, key, self.ttl_seconds))
+        if row is None:
+            return None
+        self._memory_put(organisation_id, key, row[0], _from_vector(row[1]))
+        return row[0]
+
+    async def _adatabase_get_exact(self, organisation_id: str, key: str) -> Optional[str]:
+        row = await self._adatabase_fetchone(SELECT_EXACT_QUERY, (organisation_id, key, self.ttl_seconds))
+        if row is None:
+            return None
+        self._memory_put(organisation_id, key, row[0], _from_vector(row[1]))
+        return row[0]
+
+    def _database_nearest(self, organisation_id: str, embedding: List[float]) -> Tuple[Optional[str], float]:
+        vector = _to_vector(embedding)
+        row = self._database_fetchone(SELECT_NEAREST_QUERY, (vector, organisation_id, self.ttl_seconds, vector))
+        return (row[1], row[3]) if row else (None, -1.0)
+
+    async def _adatabase_nearest(self, organisation_id: str, embedding: List[float]) -> Tuple[Optional[str], float]:
+        vector = _to_vector(embedding)
+        row = await self._adatabase_fetchone(SELECT_NEAREST_QUERY, (vector, organisation_id, self.ttl_seconds, vector))
+        return (row[1], row[3]) if row else (None, -1.0)
+
+    def _database_fetchone(self, query: str, params: tuple) -> Optional[tuple]:
+        try:
+            with get_connection_pool().connection() as db:
+                return db.execute(query, params).fetchone()
+        except Exception as e:
+            LOGGER.warning("Answer cache lookup failed, treating it as a miss: %s", e)
+            return None
+
+    async def _adatabase_fetchone(self, query: str, params: tuple) -> Optional[tuple]:
+        try:
+            pool = await get_async_connection_pool()
+            async with pool.connection() as db:
+                cursor = await db.execute(query, params)
+                return await cursor.fetchone()
+        except Exception as e:
+            LOGGER.warning("Answer cache lookup failed, treating it as a miss: %s", e)
+            return None
+
+    def _database_execute(self, query: str, params: tuple) -> None:
+        try:
+            with get_connection_pool().connection() as db:
+                db.execute(query, params)
+        except Exception as e:
+            LOGGER.warning("Answer cache write failed: %s", e)
+
+    async def _adatabase_execute(self, query: str, params: tuple) -> None:
+        try:
+            pool = await get_async_connection_pool()
+            async with pool.connection() as db:
+                await db.execute(query, params)
+        except Exception as e:
+            LOGGER.warning("Answer cache write failed: %s", e)
@@ -0,0 +1,68 @@
+import os
+from dotenv import load_dotenv
+from typing import List, Optional, Sequence, Tuple
+from langchain_core.documents import Document
+from src.organisation_embedding_creation.token_counter import count_tokens, truncate_tokens
+
+load_dotenv()
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+# Below this many remaining tokens a chunk is dropped rather than truncated.
+CONTEXT_MIN_CHUNK_TOKENS = int(os.getenv("CONTEXT_MIN_CHUNK_TOKENS", 50))
+# Longest prefix/suffix shared by two chunks that is removed as splitter overlap.
+CONTEXT_MAX_OVERLAP_CHARS = int(os.getenv("CONTEXT_MAX_OVERLAP_CHARS", 400))
+CONTEXT_MIN_OVERLAP_CHARS = 20
+CONTEXT_SEPARATOR = "\n---\n"
+
+
+def _strip_overlap(text: str, selected: Sequence[str]) -> Optional[str]:
+    """Drop the parts of ``text`` already present in ``selected``; None if nothing new is left."""
+    for previous in selected:
+        if text in previous:
+            return None
+        if previous in text:
+            continue
+        longest = min(len(text), len(previous), CONTEXT_MAX_OVERLAP_CHARS)
+        for size in range(longest, CONTEXT_MIN_OVERLAP_CHARS - 1, -1):
+            if previous.endswith(text[:size]):
+                text = text[size:]
+                break
+            if previous.startswith(text[-size:]):
+                text = text[:-size]
+                break
+    text = text.strip()
+    return text or None
+
+
+def build_context(docs: Sequence[Document], token_budget: int = CONTEXT_TOKEN_BUDGET) -> Tuple[str, int]:
+    """
+    Serialise retrieved chunks into the ``{context}`` of the prompt.
+
+    Only the page content is kept. Chunks are taken in retrieval order, duplicates and the overlap the
+    text splitter repeats between neighbouring chunks are removed, and chunks are added until
+    ``token_budget`` is spent; the chunk that crosses the budget is truncated.
+
+    Args:
+        docs (Sequence[Document]): Retrieved chunks, most relevant first.
+        token_budget (int): Maximum number of context tokens.
+
+    Returns:
+        Tuple[str, int]: The context text and its token count.
+    """
+    selected: List[str] = []
+    used = 0
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR)
+    for doc in docs:
+        text = _strip_overlap(doc.page_content.strip(), selected)
+        if text is None:
+            continue
+        remaining = token_budget - used - (separator_tokens if selected else 0)
+        if remaining < CONTEXT_MIN_CHUNK_TOKENS:
+            break
+        tokens = count_tokens(text)
+        if tokens > remaining:
+            text = truncate_tokens(text, remaining)
+            tokens = count_tokens(text)
+        selected.append(text)
+        used += tokens + (separator_tokens if len(selected) > 1 else 0)
+    return CONTEXT_SEPARATOR.join(selected), used
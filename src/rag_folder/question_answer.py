@@ -1,23 +1,32 @@
 import os
-import uuid
+import time
+import asyncio
 import logging
-from typing import Dict
+import itertools
+from collections import Counter
+from typing import AsyncIterator, Optional, Tuple
 from dotenv import load_dotenv
-from typing_extensions import TypedDict
 from langchain_openai import ChatOpenAI
-from langgraph.graph import END, StateGraph
 from langchain_openai import OpenAIEmbeddings
-from src.organisation_prompts.prompts import *
-from langchain.globals import set_verbose, set_debug
+from src.organisation_prompts.prompts import ACT_PROMPT
 from langchain.schema import HumanMessage, AIMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from src.memory_management.organisations_chat_history import ChatHistory
-from src.database.organisation_vector_database import VectorStorePostgresVector
-from src.database.organisation_retrieval_history import OrganiationHistoryManager
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, PromptTemplate, HumanMessagePromptTemplate
+from src.database.hybrid_search import HYBRID_KEYWORD_FAST_PATH, HybridSearch
+from src.database.hot_vector_index import HOT_INDEX_ENABLED, get_hot_index
+from src.database.organisation_vector_database import VectorStorePostgresVector, organisation_filter
+from src.organisation_embedding_creation.embedding_cache import CachedEmbeddings
+from src.rag_folder.answer_cache import ANSWER_CACHE_ENABLED, AnswerCache, query_hash
+from src.rag_folder.single_flight import SingleFlight
+from src.rag_folder.context_builder import CONTEXT_TOKEN_BUDGET, build_context
+from src.organisation_embedding_creation.token_counter import count_tokens
+from src.model_scheduling.model_scheduler import (
+    BACKGROUND, INTERACTIVE, MODEL_COMPLETION_TOKEN_ESTIMATE, ScheduledEmbeddings, get_model_scheduler,
+    retry_delay, set_scheduling_organisation,
+)
+from src.monitoring.metrics import LLMMetricsCallback, chatbot_stage, observe_chatbot_stage, observe_context_tokens, record_coalesced_request
+from src.memory_management.organisations_chat_history import AsyncChatHistory, ChatHistory, HISTORY_SUMMARY_ENABLED, aupdate_rolling_summary
+from src.database.organisation_retrieval_history import AsyncOrganiationHistoryManager, OrganiationHistoryManager
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
 load_dotenv()
 
@@ -25,80 +34,424 @@ OPENAI_API_KEY=os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL_NAME = os.getenv("OPENAI_MODEL_NAME")
 OPENAI_TEMPERATURE = int(os.getenv("OPENAI_TEMPERATURE", 0))
 DIMENSION = int(os.getenv("DIMENSION", 768))
+EMBEDDING_MODEL_NAME = "text-embedding-3-large"
+# "mmr" is the plain PGVector MMR retriever, "hybrid" fuses full-text and vector search.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "mmr")
+# Organisations whose chunks all fit in the context budget skip retrieval and send everything.
+FULL_CONTEXT_ENABLED = os.getenv("FULL_CONTEXT_ENABLED", "true").lower() == "true"
+# Identical questions of one organisation arriving while the first is still being answered share its answer.
+REQUEST_COALESCING_ENABLED = os.getenv("REQUEST_COALESCING_ENABLED", "true").lower() == "true"
 LOGGER = logging.getLogger(__name__)
 
-# set_debug(True)
-# set_verbose(True)
-
 
 class ChatBot:
     def __init__(self, temperature: float = 0.7):
-        self.chat_model = ChatOpenAI(openai_api_key=OPENAI_API_KEY, model=OPENAI_MODEL_NAME, temperature=OPENAI_TEMPERATURE)
-        self.embedding_model = OpenAIEmbeddings(
-                                    model="text-embedding-3-large",
-                                    api_key=OPENAI_API_KEY,
-                                    dimensions=DIMENSION,
+        # Every model call goes through the process-wide scheduler, which also does the retries.
+        self.scheduler = get_model_scheduler()
+        self.chat_model = ChatOpenAI(openai_api_key=OPENAI_API_KEY, model=OPENAI_MODEL_NAME, temperature=OPENAI_TEMPERATURE, stream_usage=True, max_retries=0)
+        self.embedding_model = CachedEmbeddings(
+                                    ScheduledEmbeddings(
+                                        OpenAIEmbeddings(
+                                            model=EMBEDDING_MODEL_NAME,
+                                            api_key=OPENAI_API_KEY,
+                                            dimensions=DIMENSION,
+                                            max_retries=0,
+                                        ),
+                                        INTERACTIVE,
+                                        self.scheduler,
+                                    ),
+                                    model=EMBEDDING_MODEL_NAME,
+                                    dimension=DIMENSION,
                                 )
         self.chat_model_json = self.chat_model.bind(response_format={"type": "json_object"})
+        self.vector_store = VectorStorePostgresVector("organisation_embeddings", self.embedding_model)
+        self.hybrid_search = HybridSearch("organisation_embeddings")
+        self.hot_index = get_hot_index("organisation_embeddings")
+        self.answer_cache = AnswerCache(self.embedding_model)
+        self.act_prompt = ChatPromptTemplate.from_messages(
+                        [
+                            (
+                                "system",
+                                ACT_PROMPT,
+                            ),
+                            MessagesPlaceholder(variable_name="chat_history"),
+                            ("human", "{question}"),
+                        ]
+                    )
+        self.rag_chain = self.act_prompt | self.chat_model_json | JsonOutputParser()
+        self._background_tasks = set()
+        self._summaries_in_flight = set()
+        self.single_flight = SingleFlight()
+        # Bumped whenever this worker writes an organisation's history or the organisation changes,
+        # so only requests that would see the same history and data are coalesced.
+        self._history_versions: Counter = Counter()
+        self._history_epoch = 0
 
+    def _build_context(self, data: dict, filtered_docs) -> Tuple[str, int]:
+        """The prompt context and the tokens to reserve for the chat call in the model scheduler."""
+        with chatbot_stage("context_build", data['organisation_id']):
+            context, tokens = build_context(filtered_docs)
+        observe_context_tokens(tokens, data['organisation_id'])
+        return context, tokens + count_tokens(data['user_query']) + MODEL_COMPLETION_TOKEN_ESTIMATE
+
+    def _coalescing_key(self, data: dict) -> tuple:
+        organisation_id = data['organisation_id']
+        return (organisation_id, query_hash(data['user_query']), self._history_epoch, self._history_versions[organisation_id])
+
+    def _bump_history_version(self, organisation_id: str) -> None:
+        self._history_versions[organisation_id] += 1
+
+    def on_organisation_changed(self, organisation_id: Optional[str]) -> None:
+        """OrganisationChangeListener callback: stop coalescing with requests started before the change."""
+        if organisation_id is None:
+            self._history_epoch += 1
+            self._history_versions.clear()
+        else:
+            self._bump_history_version(organisation_id)
+
+    def _coalesced_response(self, data: dict, response: dict, coalesced: bool) -> dict:
+        if not coalesced:
+            return response
+        record_coalesced_request(data['organisation_id'])
+        return {**response, 'question': data['user_query']}
 
     def _vectorstore_retriever(self, organisation_id):
         try:
-            vector_store = VectorStorePostgresVector("organisation_embeddings", self.embedding_model)
-            return vector_store.get_or_create_collection().as_retriever(
+            return self.vector_store.get_or_create_collection().as_retriever(
                                                                 search_type="mmr",
-                                                                search_kwargs={"metadata.id": str(organisation_id)},
+                                                                search_kwargs={"filter": organisation_filter(organisation_id)},
                                                             )
         except Exception:
             return None
 
+    async def _avectorstore_retriever(self, organisation_id):
+        try:
+            return (await self.vector_store.aget_or_create_collection()).as_retriever(
+                                                                search_type="mmr",
+                                                                search_kwargs={"filter": organisation_filter(organisation_id)},
+                                                            )
+        except Exception:
+            return None
+
+    def _hot_organisation(self, organisation_id: str):
+        if not HOT_INDEX_ENABLED:
+            return None
+        with chatbot_stage("hot_index", organisation_id):
+            return self.hot_index.get(organisation_id)
+
+    async def _ahot_organisation(self, organisation_id: str):
+        if not HOT_INDEX_ENABLED:
+            return None
+        with chatbot_stage("hot_index", organisation_id):
+            return await self.hot_index.aget(organisation_id)
+
+    def _retrieve_context(self, data: dict):
+        # Small organisations are answered from the in-process index; the hybrid search only reads
+        # its keyword candidates from Postgres for them.
+        hot = self._hot_organisation(data['organisation_id'])
+        if FULL_CONTEXT_ENABLED:
+            with chatbot_stage("full_context", data['organisation_id']):
+                if hot is not None:
+                    docs = hot.full_context(CONTEXT_TOKEN_BUDGET)
+                else:
+                    docs = self.vector_store.get_full_context(data['organisation_id'], CONTEXT_TOKEN_BUDGET)
+            if docs is not None:
+                return docs
+        if RETRIEVAL_MODE == "hybrid" and HYBRID_KEYWORD_FAST_PATH:
+            with chatbot_stage("keyword_search", data['organisation_id']):
+                docs = self.hybrid_search.keyword_fast_path(data['organisation_id'], data['user_query'])
+            if docs is not None:
+                return docs
+        with chatbot_stage("query_embedding", data['organisation_id']):
+            embedding = self.embedding_model.embed_query(data['user_query'])
+        with chatbot_stage("retrieval", data['organisation_id']):
+            if RETRIEVAL_MODE == "hybrid" and hot is not None:
+                return self.hybrid_search.search_hot(data['organisation_id'], data['user_query'], embedding, hot)
+            if RETRIEVAL_MODE == "hybrid":
+                return self.hybrid_search.search(data['organisation_id'], data['user_query'], embedding)
+            if hot is not None:
+                return hot.max_marginal_relevance_search(embedding)
+            retriever = self._vectorstore_retriever(data['organisation_id'])
+            return retriever.invoke(data['user_query'])
+
     def get_response(self, data: dict) -> str:
         """
         Get a response from the chatbot.
 
+        Concurrent identical questions of an organisation are answered by one computation; only
+        that one is written to the chat history.
+
         :param data['user_query']: The message input from the user.
         :return: The chatbot's response in JSON Format.
         """
-        history_db_manager = OrganiationHistoryManager()
-        history_db_manager.connect()
+        if not REQUEST_COALESCING_ENABLED:
+            return self._compute_response(data)
+        response, coalesced = self.single_flight.do(self._coalescing_key(data), lambda: self._compute_response(data))
+        return self._coalesced_response(data, response, coalesced)
+
+    def _seed_session(self, data: dict, chat_history) -> None:
+        with chatbot_stage("session_check", data['organisation_id']):
+            session_exists = OrganiationHistoryManager().check_organisation_in_session(data['organisation_id'])
+        if not session_exists:
+            chat_history.add_messages([
+                                    HumanMessage(name=data['organisation_id'], content="oragnisation_data"),
+                                    AIMessage(name=data['organisation_id'], content="oragnisation_data"),
+                                ])
+
+    def _compute_response(self, data: dict) -> dict:
+        # The history is read and written with short-lived pooled connections; none is held while
+        # the context is retrieved or the answer generated.
+        started = time.perf_counter()
+        set_scheduling_organisation(data['organisation_id'])
         chat_history = ChatHistory(data['organisation_id'])
-        chat_history_object = chat_history.session_based_chat_history()
-        organisation_id = uuid.UUID(data['organisation_id'].replace('-', '').ljust(32, '0'))
-        if not history_db_manager.check_organisation_in_session(data['organisation_id']):
-            chat_history_object.add_user_message(HumanMessage(
-                                                    name=data['organisation_id'],
-                                                    content="oragnisation_data",
-                                                ))
-            chat_history_object.add_ai_message(AIMessage(
-                                                    name=data['organisation_id'],
-                                                    content="oragnisation_data",
-                                                ))
-        retriever = self._vectorstore_retriever(data['organisation_id'])
-        documents = retriever.get_relevant_documents(data['user_query'])
-        filtered_docs = [doc for doc in documents if doc.id == str(data['organisation_id'])]
-
-        act_prompt = ACT_PROMPT
-        act_prompt = ChatPromptTemplate.from_messages(
-                        [
-                            (
-                                "system",
-                                act_prompt,
-                            ),
-                            MessagesPlaceholder(variable_name="chat_history"),
-                            ("human", "{question}"),
-                        ]
-                    )
-        rag_chain = act_prompt | self.chat_model_json | JsonOutputParser()
-
-        chain_with_message_history = RunnableWithMessageHistory(
-                                rag_chain,
-                                lambda session_id: chat_history_object,
-                                input_messages_key="question",
-                                history_messages_key="chat_history",
-                            )
-        generation = chain_with_message_history.invoke(
-                {"question": data['user_query'], "context": filtered_docs},
-                {"configurable": {"session_id": data['organisation_id']}},
-            )
-
-        return {'message': 'Query processed successfully', 'status': 200, 'question': data["user_query"], 'answer': generation.get('answer')}
+        try:
+            self._seed_session(data, chat_history)
+            with chatbot_stage("answer_cache", data['organisation_id']):
+                cached_answer = self.answer_cache.lookup(data['organisation_id'], data['user_query']) if ANSWER_CACHE_ENABLED else None
+            if cached_answer is not None:
+                chat_history.add_messages([
+                                        HumanMessage(content=data['user_query']),
+                                        AIMessage(content=cached_answer),
+                                    ])
+                self.answer_cache.record_hit((time.perf_counter() - started) * 1000)
+                return {'message': 'Query processed successfully', 'status': 200, 'question': data["user_query"], 'answer': cached_answer}
+
+            filtered_docs = self._retrieve_context(data)
+            history_messages = chat_history.get_messages()
+            context, tokens = self._build_context(data, filtered_docs)
+            generation = self.scheduler.run(
+                    lambda: self.rag_chain.invoke(
+                        {"question": data['user_query'], "context": context, "chat_history": history_messages},
+                        {"callbacks": [LLMMetricsCallback(data['organisation_id'])]},
+                    ),
+                    data['organisation_id'],
+                    INTERACTIVE,
+                    tokens,
+                )
+            chat_history.add_messages([
+                                    HumanMessage(content=data['user_query']),
+                                    AIMessage(content=generation.get('answer') or ""),
+                                ])
+            if ANSWER_CACHE_ENABLED:
+                self.answer_cache.store(data['organisation_id'], data['user_query'], generation.get('answer'))
+                self.answer_cache.record_miss((time.perf_counter() - started) * 1000)
+
+            return {'message': 'Query processed successfully', 'status': 200, 'question': data["user_query"], 'answer': generation.get('answer')}
+        finally:
+            self._bump_history_version(data['organisation_id'])
+            observe_chatbot_stage("total", data['organisation_id'], time.perf_counter() - started)
+
+    def _schedule_history_summary(self, organisation_id: str) -> None:
+        """Refresh the rolling history summary in the background, off the request path."""
+        if not HISTORY_SUMMARY_ENABLED or organisation_id in self._summaries_in_flight:
+            return
+        self._summaries_in_flight.add(organisation_id)
+
+        async def summarise() -> None:
+            try:
+                await self.scheduler.arun(lambda: aupdate_rolling_summary(organisation_id, self.chat_model), organisation_id, BACKGROUND)
+            except Exception as e:
+                LOGGER.warning("Failed to update history summary for organisation %s: %s", organisation_id, e)
+            finally:
+                self._summaries_in_flight.discard(organisation_id)
+
+        task = asyncio.create_task(summarise())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _aseed_session(self, data: dict, chat_history) -> None:
+        """Seed a new session; the lookup and the write each borrow a pooled connection briefly."""
+        with chatbot_stage("session_check", data['organisation_id']):
+            session_exists = await AsyncOrganiationHistoryManager().check_organisation_in_session(data['organisation_id'])
+        if not session_exists:
+            await chat_history.aadd_messages([
+                                        HumanMessage(name=data['organisation_id'], content="oragnisation_data"),
+                                        AIMessage(name=data['organisation_id'], content="oragnisation_data"),
+                                    ])
+
+    async def _aretrieve_context(self, data: dict):
+        hot = await self._ahot_organisation(data['organisation_id'])
+        if FULL_CONTEXT_ENABLED:
+            with chatbot_stage("full_context", data['organisation_id']):
+                if hot is not None:
+                    docs = hot.full_context(CONTEXT_TOKEN_BUDGET)
+                else:
+                    docs = await self.vector_store.aget_full_context(data['organisation_id'], CONTEXT_TOKEN_BUDGET)
+            if docs is not None:
+                return docs
+        if RETRIEVAL_MODE == "hybrid" and HYBRID_KEYWORD_FAST_PATH:
+            with chatbot_stage("keyword_search", data['organisation_id']):
+                docs = await self.hybrid_search.akeyword_fast_path(data['organisation_id'], data['user_query'])
+            if docs is not None:
+                return docs
+        # The query is embedded up front so its cost is measured on its own; the retriever then
+        # finds the vector in the CachedEmbeddings LRU.
+        with chatbot_stage("query_embedding", data['organisation_id']):
+            embedding = await self.embedding_model.aembed_query(data['user_query'])
+        with chatbot_stage("retrieval", data['organisation_id']):
+            if RETRIEVAL_MODE == "hybrid" and hot is not None:
+                return await self.hybrid_search.asearch_hot(data['organisation_id'], data['user_query'], embedding, hot)
+            if RETRIEVAL_MODE == "hybrid":
+                return await self.hybrid_search.asearch(data['organisation_id'], data['user_query'], embedding)
+            if hot is not None:
+                return hot.max_marginal_relevance_search(embedding)
+            retriever = await self._avectorstore_retriever(data['organisation_id'])
+            return await retriever.ainvoke(data['user_query'])
+
+    async def _alookup_cached_answer(self, data: dict, chat_history):
+        """Return a cached answer and record the exchange in the history, or None on a miss."""
+        if not ANSWER_CACHE_ENABLED:
+            return None
+        with chatbot_stage("answer_cache", data['organisation_id']):
+            cached_answer = await self.answer_cache.alookup(data['organisation_id'], data['user_query'])
+        if cached_answer is not None:
+            await chat_history.aadd_messages([
+                                                HumanMessage(content=data['user_query']),
+                                                AIMessage(content=cached_answer),
+                                            ])
+        return cached_answer
+
+    async def _astore_answer(self, data: dict, answer, started: float) -> None:
+        if ANSWER_CACHE_ENABLED:
+            await self.answer_cache.astore(data['organisation_id'], data['user_query'], answer)
+            self.answer_cache.record_miss((time.perf_counter() - started) * 1000)
+
+    async def aget_response(self, data: dict) -> str:
+        """
+        Get a response from the chatbot without blocking the event loop.
+
+        Concurrent identical questions of an organisation are answered by one computation; only
+        that one is written to the chat history.
+
+        :param data['user_query']: The message input from the user.
+        :return: The chatbot's response in JSON Format.
+        """
+        if not REQUEST_COALESCING_ENABLED:
+            return await self._acompute_response(data)
+        response, coalesced = await self.single_flight.ado(self._coalescing_key(data), lambda: self._acompute_response(data))
+        return self._coalesced_response(data, response, coalesced)
+
+    async def _acompute_response(self, data: dict) -> dict:
+        # The history is read and written with short-lived pooled connections; none is held while
+        # the context is retrieved or the answer generated.
+        started = time.perf_counter()
+        set_scheduling_organisation(data['organisation_id'])
+        chat_history = AsyncChatHistory(data['organisation_id'])
+        try:
+            await self._aseed_session(data, chat_history)
+            cached_answer = await self._alookup_cached_answer(data, chat_history)
+            if cached_answer is not None:
+                self.answer_cache.record_hit((time.perf_counter() - started) * 1000)
+                return {'message': 'Query processed successfully', 'status': 200, 'question': data["user_query"], 'answer': cached_answer}
+            filtered_docs = await self._aretrieve_context(data)
+            history_messages = await chat_history.aget_messages()
+            context, tokens = self._build_context(data, filtered_docs)
+            generation = await self.scheduler.arun(
+                    lambda: self.rag_chain.ainvoke(
+                        {"question": data['user_query'], "context": context, "chat_history": history_messages},
+                        {"callbacks": [LLMMetricsCallback(data['organisation_id'])]},
+                    ),
+                    data['organisation_id'],
+                    INTERACTIVE,
+                    tokens,
+                )
+            await chat_history.aadd_messages([
+                                        HumanMessage(content=data['user_query']),
+                                        AIMessage(content=generation.get('answer') or ""),
+                                    ])
+
+            await self._astore_answer(data, generation.get('answer'), started)
+            self._schedule_history_summary(data['organisation_id'])
+            return {'message': 'Query processed successfully', 'status': 200, 'question': data["user_query"], 'answer': generation.get('answer')}
+        finally:
+            self._bump_history_version(data['organisation_id'])
+            observe_chatbot_stage("total", data['organisation_id'], time.perf_counter() - started)
+
+    async def _astream_generation(self, organisation_id: str, inputs: dict, tokens: int) -> AsyncIterator[dict]:
+        """Stream the chain in a model scheduler slot, retrying like ``ModelScheduler.arun`` until the first chunk arrived."""
+        for attempt in itertools.count():
+            streamed = False
+            try:
+                async with self.scheduler.aslot(organisation_id, INTERACTIVE, tokens):
+                    async for partial in self.rag_chain.astream(inputs, {"callbacks": [LLMMetricsCallback(organisation_id)]}):
+                        streamed = True
+                        yield partial
+                return
+            except Exception as e:
+                if streamed or not self.scheduler.should_retry(e, attempt):
+                    raise
+                delay = retry_delay(attempt, e)
+            await asyncio.sleep(delay)
+
+    async def astream_response(self, data: dict) -> AsyncIterator[dict]:
+        """
+        Stream the chatbot's answer as it is generated.
+
+        Yields ``{"type": "token", "content": ...}`` events carrying the newly generated part of the
+        ``answer`` field, followed by one ``{"type": "done", ...}`` event once the answer has been
+        written to the message store. A cached answer arrives as a single token event.
+
+        :param data['user_query']: The message input from the user.
+        """
+        started = time.perf_counter()
+        first_token_at = None
+        answer = ""
+        set_scheduling_organisation(data['organisation_id'])
+        chat_history = AsyncChatHistory(data['organisation_id'])
+        try:
+            await self._aseed_session(data, chat_history)
+            cached_answer = await self._alookup_cached_answer(data, chat_history)
+            if cached_answer is not None:
+                finished = time.perf_counter()
+                self.answer_cache.record_hit((finished - started) * 1000)
+                yield {'type': 'token', 'content': cached_answer}
+                yield {
+                    'type': 'done',
+                    'message': 'Query processed successfully',
+                    'status': 200,
+                    'question': data['user_query'],
+                    'answer': cached_answer,
+                    'cached': True,
+                    'time_to_first_token_ms': round((finished - started) * 1000, 1),
+                    'total_time_ms': round((finished - started) * 1000, 1),
+                }
+                return
+            filtered_docs = await self._aretrieve_context(data)
+            history_messages = await chat_history.aget_messages()
+            context, tokens = self._build_context(data, filtered_docs)
+
+            async for partial in self._astream_generation(
+                    data['organisation_id'],
+                    {"question": data['user_query'], "context": context, "chat_history": history_messages},
+                    tokens,
+                ):
+                current = partial.get('answer') if isinstance(partial, dict) else None
+                if not isinstance(current, str) or len(current) <= len(answer):
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    LOGGER.info("Time to first token for organisation %s: %.1fms", data['organisation_id'], (first_token_at - started) * 1000)
+                delta = current[len(answer):]
+                answer = current
+                yield {'type': 'token', 'content': delta}
+
+            await chat_history.aadd_messages([
+                                        HumanMessage(content=data['user_query']),
+                                        AIMessage(content=answer),
+                                    ])
+            await self._astore_answer(data, answer, started)
+            self._schedule_history_summary(data['organisation_id'])
+            finished = time.perf_counter()
+            yield {
+                'type': 'done',
+                'message': 'Query processed successfully',
+                'status': 200,
+                'question': data['user_query'],
+                'answer': answer,
+                'cached': False,
+                'time_to_first_token_ms': round((first_token_at - started) * 1000, 1) if first_token_at else None,
+                'total_time_ms': round((finished - started) * 1000, 1),
+            }
+        finally:
+            self._bump_history_version(data['organisation_id'])
+            observe_chatbot_stage("total", data['organisation_id'], time.perf_counter() - started)
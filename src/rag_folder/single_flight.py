@@ -0,0 +1,101 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Any = None
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        """
+        Runs one computation per key at a time; callers asking for a key that is already in flight
+        wait for that computation and share its result (or its exception) instead of starting their own.
+        """
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, call: Callable[[], T]) -> Tuple[T, bool]:
+        """
+        Run ``call`` unless a call for ``key`` is in flight in another thread.
+
+        Args:
+            key (Hashable): Identifies interchangeable computations.
+            call (Callable): The computation.
+
+        Returns:
+            Tuple[T, bool]: The result and whether it was shared from another caller's computation.
+        """
+        with self._lock:
+            shared = self._calls.get(key)
+            if shared is None:
+                shared = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+        if not leader:
+            shared.done.wait()
+            if shared.error is not None:
+                raise shared.error
+            return shared.result, True
+        try:
+            shared.result = call()
+            return shared.result, False
+        except BaseException as e:
+            shared.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            shared.done.set()
+
+    async def ado(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Async version of ``do`` for callers on one event loop. The computation runs in its own task,
+        so it completes for the remaining callers when the one that started it is cancelled.
+
+        Args:
+            key (Hashable): Identifies interchangeable computations.
+            call (Callable): Returns the awaitable computation.
+
+        Returns:
+            Tuple[T, bool]: The result and whether it was shared from another caller's computation.
+        """
+        task = self._tasks.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(call())
+        self._tasks[key] = task
+        self.leaders += 1
+
+        def forget(done: asyncio.Task) -> None:
+            if self._tasks.get(key) is done:
+                del self._tasks[key]
+            if not done.cancelled():
+                # Nobody may be waiting any more; retrieve the exception to keep asyncio quiet.
+                done.exception()
+
+        task.add_done_callback(forget)
+        return await asyncio.shield(task), False
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._calls) + len(self._tasks),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,107 @@
+"""Concurrent identical chatbot questions share one model call.
+
+The chat model is FakeChatOpenAI, the chat history lives in memory and retrieval is stubbed out,
+so no database or OpenAI account is needed.
+"""
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import pytest
+
+# Only used where the environment does not configure them; nothing connects to the database.
+for name, value in {
+    "DBHOST": "127.0.0.1",
+    "DBPORT": "5432",
+    "DBUSER": "postgres",
+    "DBPW": "postgres",
+    "DBNAME": "postgres",
+    "OPENAI_API_KEY": "sk-coalescing-check",
+    "OPENAI_MODEL_NAME": "gpt-4o-mini",
+}.items():
+    os.environ.setdefault(name, value)
+
+import src.rag_folder.question_answer as question_answer  # noqa: E402
+from benchmarks.fake_models import (  # noqa: E402
+    AsyncInMemoryChatHistory, AsyncInMemoryHistoryManager, FakeChatOpenAI, FakeOpenAIEmbeddings,
+    InMemoryChatHistory, InMemoryHistoryManager,
+)
+
+REQUESTS = 20
+LLM_LATENCY = 0.2
+
+
+@pytest.fixture
+def chatbot(monkeypatch):
+    monkeypatch.setattr(question_answer, "REQUEST_COALESCING_ENABLED", True)
+    monkeypatch.setattr(question_answer, "ANSWER_CACHE_ENABLED", False)
+    monkeypatch.setattr(question_answer, "HISTORY_SUMMARY_ENABLED", False)
+    monkeypatch.setattr(question_answer, "ChatOpenAI", lambda **kwargs: FakeChatOpenAI(latency=LLM_LATENCY))
+    monkeypatch.setattr(question_answer, "OpenAIEmbeddings", lambda **kwargs: FakeOpenAIEmbeddings(dimensions=question_answer.DIMENSION))
+    monkeypatch.setattr(question_answer, "OrganiationHistoryManager", InMemoryHistoryManager)
+    monkeypatch.setattr(question_answer, "AsyncOrganiationHistoryManager", AsyncInMemoryHistoryManager)
+    monkeypatch.setattr(question_answer, "ChatHistory", InMemoryChatHistory)
+    monkeypatch.setattr(question_answer, "AsyncChatHistory", AsyncInMemoryChatHistory)
+    monkeypatch.setattr(InMemoryChatHistory, "histories", {})
+    chatbot = question_answer.ChatBot()
+
+    async def aretrieve_context(data: dict) -> List:
+        return []
+
+    chatbot._retrieve_context = lambda data: []
+    chatbot._aretrieve_context = aretrieve_context
+    return chatbot
+
+
+async def async_burst(chatbot, organisation_id: str, query: str) -> List[dict]:
+    return await asyncio.gather(*(
+        chatbot.aget_response({"organisation_id": organisation_id, "user_query": query})
+        for _ in range(REQUESTS)
+    ))
+
+
+def test_async_identical_questions_make_one_model_call(chatbot):
+    responses = asyncio.run(async_burst(chatbot, "1", "What are your opening hours?"))
+
+    assert chatbot.chat_model.calls == 1
+    assert len({response["answer"] for response in responses}) == 1
+
+
+def test_threaded_identical_questions_make_one_model_call(chatbot):
+    with ThreadPoolExecutor(max_workers=REQUESTS) as executor:
+        responses = list(executor.map(
+            lambda index: chatbot.get_response({"organisation_id": "1", "user_query": "what are your   opening hours" + "?" * (index % 2)}),
+            range(REQUESTS),
+        ))
+
+    assert chatbot.chat_model.calls == 1
+    assert len({response["answer"] for response in responses}) == 1
+
+
+def test_distinct_questions_and_organisations_are_not_coalesced(chatbot):
+    async def bursts():
+        await asyncio.gather(
+            async_burst(chatbot, "1", "Do you ship abroad?"),
+            async_burst(chatbot, "1", "How do I reset my password?"),
+            async_burst(chatbot, "2", "Do you ship abroad?"),
+        )
+
+    asyncio.run(bursts())
+
+    assert chatbot.chat_model.calls == 3
+
+
+def test_different_history_version_is_not_coalesced(chatbot):
+    async def bursts():
+        first = asyncio.ensure_future(async_burst(chatbot, "1", "Do you ship abroad?"))
+        # The first burst is still waiting for the model when the organisation changes.
+        await asyncio.sleep(LLM_LATENCY / 4)
+        chatbot.on_organisation_changed("1")
+        second = asyncio.ensure_future(async_burst(chatbot, "1", "Do you ship abroad?"))
+        return await first, await second
+
+    first, second = asyncio.run(bursts())
+
+    assert chatbot.chat_model.calls == 2
+    assert len({response["answer"] for response in first}) == 1
+    assert len({response["answer"] for response in second}) == 1
@@ -0,0 +1,93 @@
+"""Cold-start budget of the API: ``import chat_model_api`` plus the lifespan startup.
+
+Each run uses a fresh interpreter. The pools and the migrations are stubbed, so the test measures
+the app's own startup work and needs neither a database nor an OpenAI account.
+"""
+import os
+import sys
+import json
+import statistics
+import subprocess
+from typing import Dict, List
+
+RUNS = int(os.getenv("STARTUP_BUDGET_RUNS", 3))
+IMPORT_BUDGET = float(os.getenv("STARTUP_IMPORT_BUDGET", 3.0))
+STARTUP_BUDGET = float(os.getenv("STARTUP_BUDGET", 5.0))
+
+STARTUP_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import chat_model_api
+imported = time.perf_counter() - started
+import asyncio
+
+async def noop():
+    pass
+
+chat_model_api.run_startup_migrations = lambda: None
+chat_model_api.open_pools = lambda: None
+chat_model_api.close_pools = lambda: None
+chat_model_api.open_async_pools = noop
+chat_model_api.close_async_pools = noop
+
+async def main():
+    app = chat_model_api.app
+    async with app.router.lifespan_context(app):
+        return time.perf_counter() - started
+
+print(json.dumps({"import": imported, "startup": asyncio.run(main())}))
+"""
+
+# Only used where the environment does not configure them; the app has to be importable, nothing more.
+DEFAULT_ENV = {
+    "DBHOST": "127.0.0.1",
+    "DBPORT": "5432",
+    "DBUSER": "postgres",
+    "DBPW": "postgres",
+    "DBNAME": "postgres",
+    "OPENAI_API_KEY": "sk-startup-check",
+    "OPENAI_MODEL_NAME": "gpt-4o-mini",
+    "ORGANISATION_EVENTS_ENABLED": "false",
+}
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _environment() -> Dict[str, str]:
+    return {**DEFAULT_ENV, **os.environ}
+
+
+def _run(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=_environment(), capture_output=True, text=True, timeout=300)
+
+
+def slowest_imports(top: int = 15) -> List[str]:
+    """Cumulative ``-X importtime`` of the slowest imports of chat_model_api, to explain a failure."""
+    rows = []
+    for line in _run("-X", "importtime", "-c", "import chat_model_api").stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            rows.append((int(cumulative), name.rstrip()))
+    rows.sort(reverse=True)
+    return [f"{cumulative / 1000:9.1f}ms {name}" for cumulative, name in rows[:top]]
+
+
+def measure_startup() -> Dict[str, float]:
+    completed = _run("-c", STARTUP_SCRIPT)
+    assert completed.returncode == 0, f"Startup failed:\n{completed.stderr[-4000:]}"
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def test_startup_within_budget():
+    # The first run also compiles bytecode; it is left out of the median.
+    samples = [measure_startup() for _ in range(RUNS + 1)][1:]
+    imported = statistics.median(sample["import"] for sample in samples)
+    started = statistics.median(sample["startup"] for sample in samples)
+
+    failures = []
+    if imported > IMPORT_BUDGET:
+        failures.append(f"import took {imported:.2f}s, budget {IMPORT_BUDGET}s")
+    if started > STARTUP_BUDGET:
+        failures.append(f"startup took {started:.2f}s, budget {STARTUP_BUDGET}s")
+    assert not failures, "\n".join(failures + slowest_imports())
@@ -0,0 +1,64 @@
+"""Memory bound of stream_organisation_upload, with the database and the embedding model faked."""
+import asyncio
+import tracemalloc
+from datetime import datetime
+from types import SimpleNamespace
+from typing import AsyncIterator, List
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+import src.organisation_ingestion.streaming_ingestion as streaming_ingestion
+from src.organisation_embedding_creation.embedding_generation import CHUNK_OVERLAP, CHUNK_SIZE
+
+UPLOAD_BYTES = 16 * 1024 * 1024
+NETWORK_CHUNK_BYTES = 64 * 1024
+# Mostly one STREAM_READ_BLOCK_SIZE block being decoded and split into lines; independent of UPLOAD_BYTES.
+PEAK_MEMORY_BOUND = 10 * 1024 * 1024
+
+
+async def synthetic_upload(total: int) -> AsyncIterator[bytes]:
+    line = b"Opening hours are 9am to 5pm, Monday to Friday, except on public holidays.\n"
+    block = line * (NETWORK_CHUNK_BYTES // len(line))
+    sent = 0
+    while sent < total:
+        yield block
+        sent += len(block)
+
+
+class CountingVectorStore:
+    def __init__(self) -> None:
+        self.documents = 0
+        self.characters = 0
+
+    async def astore_doc_stream(self, organisation_id: str, doc_batches) -> dict:
+        async for batch in doc_batches:
+            self.documents += len(batch)
+            self.characters += sum(len(document.page_content) for document in batch)
+        return {"status": True, "ai_embeddings_status": "Completed", "ai_embeddings_reason": "Embeddings Generated Successfully"}
+
+
+def test_streaming_upload_memory_is_bounded(monkeypatch):
+    async def store_and_claim(file, organisation_id):
+        return 1, datetime.now()
+
+    async def release(organisation_id, claimed_at, status, reason):
+        return status
+
+    monkeypatch.setattr(streaming_ingestion, "_store_and_claim", store_and_claim)
+    monkeypatch.setattr(streaming_ingestion, "_release", release)
+    vector_store = CountingVectorStore()
+    embedding_creator = SimpleNamespace(
+        text_splitter=RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP),
+        vector_store=vector_store,
+        hot_index=SimpleNamespace(invalidate=lambda organisation_id: None),
+    )
+
+    tracemalloc.start()
+    try:
+        result = asyncio.run(streaming_ingestion.stream_organisation_upload(synthetic_upload(UPLOAD_BYTES), embedding_creator))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert result["status"] is True
+    assert result["bytes"] >= UPLOAD_BYTES
+    assert vector_store.characters >= UPLOAD_BYTES * 0.9
+    assert peak < PEAK_MEMORY_BOUND, f"peak {peak / 2**20:.1f} MiB for a {UPLOAD_BYTES / 2**20:.0f} MiB upload"